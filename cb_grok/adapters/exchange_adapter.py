@@ -1,10 +1,22 @@
 import ccxt
+import json
+import os
+import threading
 import pandas as pd
 import time
+from cb_grok.utils.utils import timeframe_to_milliseconds
+from cb_grok.utils.metrics_exporter import ORDER_ROUND_TRIP, record_cache
+
+# Метаданные рынков меняются редко: кэш на диске действует сутки
+MARKETS_CACHE_FOLDER = "library/markets"
+MARKETS_CACHE_TTL = 24 * 60 * 60
 
 class ExchangeAdapter:
-    def __init__(self, exchange_name='binance', api_key=None, api_secret=None):
-        if exchange_name == 'binance':
+    def __init__(self, exchange_name='binance', api_key=None, api_secret=None, client=None):
+        """:param client: Готовый ccxt-совместимый клиент (например, MockExchange для нагрузочного теста)."""
+        if client is not None:
+            self.exchange = client
+        elif exchange_name == 'binance':
             self.exchange = ccxt.binance({
                 'apiKey': api_key,
                 'secret': api_secret,
@@ -20,6 +32,38 @@ class ExchangeAdapter:
             raise ValueError(f"Неподдерживаемая биржа: {exchange_name}")
         self.exchange_name = exchange_name
 
+    def load_markets(self, ttl=MARKETS_CACHE_TTL, folder=MARKETS_CACHE_FOLDER, reload=False):
+        """
+        Загрузка метаданных рынков и валют с кэшем на диске.
+
+        Если файл кэша моложе ttl секунд, рынки устанавливаются из него без запроса к бирже; иначе
+        загружаются через ccxt и сохраняются. Последующие вызовы ccxt (fetch_ohlcv, create_order)
+        используют уже загруженные рынки и не вызывают load_markets повторно.
+
+        :param ttl: Время жизни кэша в секундах.
+        :param folder: Папка кэша.
+        :param reload: Загрузить с биржи, игнорируя кэш.
+        :return: Словарь рынков.
+        """
+        path = os.path.join(folder, f"{self.exchange_name}.json")
+        if not reload and os.path.exists(path) and time.time() - os.path.getmtime(path) < ttl:
+            with open(path, 'r') as f:
+                cached = json.load(f)
+            self.exchange.set_markets(cached["markets"], cached.get("currencies"))
+            record_cache("markets", True)
+            return self.exchange.markets
+
+        record_cache("markets", False)
+        markets = self.exchange.load_markets(reload=True)
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        # Запись через временный файл, чтобы параллельные процессы не прочитали файл наполовину
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'w') as f:
+            json.dump({"markets": markets, "currencies": self.exchange.currencies}, f, default=str)
+        os.replace(temporary_path, path)
+        return markets
+
     def fetch_ohlcv(self, symbol, timeframe='1m', limit=1000, total_limit=5000):
         all_data = []
         max_per_request = 1000 if self.exchange_name == 'bybit' else limit
@@ -35,21 +79,38 @@ class ExchangeAdapter:
             except Exception as e:
                 print(f"Ошибка при загрузке данных: {e}")
                 break
+        # Страницы загружаются от новых к старым: сортируем и убираем перекрытия, чтобы оставить последние свечи
+        all_data = sorted({candle[0]: candle for candle in all_data}.values(), key=lambda candle: candle[0])
         all_data = all_data[-total_limit:]
         df = pd.DataFrame(all_data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
         df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
         df.set_index('timestamp', inplace=True)
         return df
 
+    def fetch_ohlcv_since(self, symbol, timeframe, since, limit=1000):
+        """
+        Загрузка всех свечей начиная с момента since (мс) до текущего, постранично вперед.
+
+        В отличие от fetch_ohlcv ошибки биржи не подавляются: вызывающий код (дозагрузка пропусков
+        в live_trading) должен знать, что история неполная.
+        """
+        all_data = []
+        timeframe_ms = self._timeframe_to_milliseconds(timeframe)
+        while True:
+            ohlcv = [candle for candle in self.exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=limit)
+                     if candle[0] >= since]
+            if not ohlcv:
+                break
+            all_data.extend(ohlcv)
+            since = ohlcv[-1][0] + timeframe_ms
+            time.sleep(self.exchange.rateLimit / 1000)
+        df = pd.DataFrame(all_data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+        df.set_index('timestamp', inplace=True)
+        return df[~df.index.duplicated(keep='last')]
+
     def _timeframe_to_milliseconds(self, timeframe):
-        if timeframe == '1m':
-            return 60 * 1000
-        elif timeframe == '1h':
-            return 3600 * 1000
-        elif timeframe == '1d':
-            return 86400 * 1000
-        else:
-            raise ValueError(f"Неподдерживаемый таймфрейм: {timeframe}")
+        return timeframe_to_milliseconds(timeframe)
 
     def create_order(self, symbol, side, amount, price=None, stop_loss=None, take_profit=None):
         params = {}
@@ -62,7 +123,46 @@ class ExchangeAdapter:
             if self.exchange_name == 'binance':
                 params['takeProfitPrice'] = take_profit
         order_type = 'limit' if price else 'market'
-        return self.exchange.create_order(symbol, order_type, side, amount, price, params)
+        with ORDER_ROUND_TRIP.labels(self.exchange_name, side).time():
+            return self.exchange.create_order(symbol, order_type, side, amount, price, params)
 
     def fetch_balance(self):
-        return self.exchange.fetch_balance()
\ No newline at end of file
+        return self.exchange.fetch_balance()
+
+
+_adapters = {}
+_adapters_lock = threading.Lock()
+
+
+def get_exchange_adapter(exchange_name='binance', api_key=None, api_secret=None, markets_ttl=MARKETS_CACHE_TTL):
+    """
+    Общий ExchangeAdapter для биржи и учетных данных.
+
+    Адаптер создается один раз на процесс: клиент ccxt держит HTTP-сессию с keep-alive, а рынки
+    загружаются из кэша на диске (ExchangeAdapter.load_markets), поэтому повторные запуски и первый запрос
+    не платят за load_markets и новое соединение.
+
+    :param exchange_name: Название биржи.
+    :param api_key: API-ключ.
+    :param api_secret: API-секрет.
+    :param markets_ttl: Время жизни кэша рынков в секундах.
+    :return: ExchangeAdapter.
+    """
+    key = (exchange_name, api_key, api_secret)
+    with _adapters_lock:
+        adapter = _adapters.get(key)
+        if adapter is None:
+            adapter = ExchangeAdapter(exchange_name, api_key, api_secret)
+            try:
+                adapter.load_markets(ttl=markets_ttl)
+            except Exception as e:
+                # Без рынков ccxt загрузит их сам при первом запросе
+                print(f"Ошибка при загрузке рынков {exchange_name}: {e}")
+            _adapters[key] = adapter
+    return adapter
+
+
+def clear_exchange_adapters():
+    """Очищает пул адаптеров (например, после смены ключей)."""
+    with _adapters_lock:
+        _adapters.clear()
@@ -0,0 +1,211 @@
+import json
+import time
+from datetime import datetime, timezone
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+# Декодеры JSON в порядке предпочтения; orjson и ujson необязательны
+JSON_BACKENDS = {
+    "orjson": orjson.loads if orjson else None,
+    "ujson": ujson.loads if ujson else None,
+    "json": json.loads,
+}
+
+
+def get_json_loads(backend=None):
+    """
+    Функция разбора JSON.
+
+    :param backend: 'orjson', 'ujson', 'json' или None — самый быстрый из установленных.
+    :return: Функция loads.
+    """
+    if backend is None:
+        return next(loads for loads in JSON_BACKENDS.values() if loads is not None)
+    if backend not in JSON_BACKENDS:
+        raise ValueError(f"Неизвестный декодер JSON: {backend}. Используйте {', '.join(JSON_BACKENDS)}")
+    if JSON_BACKENDS[backend] is None:
+        raise ImportError(f"Декодер JSON {backend} не установлен")
+    return JSON_BACKENDS[backend]
+
+
+class Candle:
+    """Свеча потока: время открытия в мс (UTC), OHLCV и признак закрытия свечи."""
+
+    __slots__ = ("timestamp", "open", "high", "low", "close", "volume", "closed")
+
+    def __init__(self, timestamp, open, high, low, close, volume, closed=True):
+        self.timestamp = timestamp
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.closed = closed
+
+    @property
+    def time(self):
+        return pd.Timestamp(self.timestamp, unit='ms')
+
+    def values(self):
+        return [self.open, self.high, self.low, self.close, self.volume]
+
+    def to_frame(self):
+        """Однострочный DataFrame в формате буфера live_trading (индекс timestamp)."""
+        return pd.DataFrame([self.values()], columns=['open', 'high', 'low', 'close', 'volume'],
+                            index=pd.DatetimeIndex([self.time], name='timestamp'))
+
+    def __repr__(self):
+        return (f"Candle({self.time}, o={self.open}, h={self.high}, l={self.low}, c={self.close}, "
+                f"v={self.volume}, closed={self.closed})")
+
+
+def _iso_to_ms(value):
+    """Время симулятора: ISO-строка без зоны (UTC) или число в мс."""
+    if isinstance(value, (int, float)):
+        return int(value)
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+
+def decode_binance(data):
+    """Событие kline Binance ({'e': 'kline', 'k': {...}}); 'x' — признак закрытия свечи."""
+    kline = data.get('k')
+    if kline is None:
+        return []
+    return [Candle(kline['t'], float(kline['o']), float(kline['h']), float(kline['l']), float(kline['c']),
+                   float(kline['v']), kline['x'])]
+
+
+def decode_bybit(data):
+    """Сообщение топика kline Bybit v5; в одном сообщении может быть несколько свечей, 'confirm' — закрытие."""
+    if not data.get('topic', '').startswith('kline'):
+        return []
+    return [Candle(int(kline['start']), float(kline['open']), float(kline['high']), float(kline['low']),
+                   float(kline['close']), float(kline['volume']), kline.get('confirm', True))
+            for kline in data['data']]
+
+
+def decode_simulator(data):
+    """Сообщение Simulator: {'open', 'high', 'low', 'close', 'volume', 'timestamp'}; свечи всегда закрыты."""
+    if 'timestamp' not in data:
+        return []
+    return [Candle(_iso_to_ms(data['timestamp']), float(data['open']), float(data['high']), float(data['low']),
+                   float(data['close']), float(data['volume']), data.get('closed', True))]
+
+
+DECODERS = {
+    "binance": decode_binance,
+    "bybit": decode_bybit,
+    "simulator": decode_simulator,
+}
+
+
+class KlineDecoder:
+    """
+    Разбор сообщений WebSocket одного формата в записи Candle без промежуточных DataFrame.
+
+    Служебные сообщения (подтверждение подписки, pong) дают пустой список.
+    """
+
+    def __init__(self, source, json_backend=None):
+        """
+        :param source: Формат сообщений: 'binance', 'bybit' или 'simulator'.
+        :param json_backend: Декодер JSON (см. get_json_loads).
+        """
+        if source not in DECODERS:
+            raise ValueError(f"Неизвестный формат сообщений: {source}. Используйте {', '.join(DECODERS)}")
+        self.source = source
+        self._decode = DECODERS[source]
+        self._loads = get_json_loads(json_backend)
+
+    def decode(self, message):
+        """
+        :param message: Сообщение WebSocket (str или bytes).
+        :return: Список свечей.
+        """
+        return self._decode(self._loads(message))
+
+
+SAMPLE_MESSAGES = {
+    "binance": json.dumps({
+        "e": "kline", "E": 1700000060000, "s": "BNBUSDT",
+        "k": {"t": 1700000000000, "T": 1700003599999, "s": "BNBUSDT", "i": "1h", "f": 100, "L": 200,
+              "o": "245.10000000", "c": "245.80000000", "h": "246.20000000", "l": "244.90000000",
+              "v": "1520.33000000", "n": 100, "x": True, "q": "373221.10", "V": "760.1", "Q": "186610.2", "B": "0"}}),
+    "bybit": json.dumps({
+        "topic": "kline.60.BNBUSDT", "type": "snapshot", "ts": 1700000060000,
+        "data": [{"start": 1700000000000, "end": 1700003599999, "interval": "60", "open": "245.1",
+                  "close": "245.8", "high": "246.2", "low": "244.9", "volume": "1520.33",
+                  "turnover": "373221.1", "confirm": False, "timestamp": 1700000060000}]}),
+    "simulator": json.dumps({"open": 245.1, "high": 246.2, "low": 244.9, "close": 245.8, "volume": 1520.33,
+                             "timestamp": "2023-11-14T22:13:20"}),
+}
+
+
+def _legacy_frame(source, data):
+    """Прежний разбор live_trading: однострочный DataFrame на каждое сообщение (для сравнения)."""
+    if source == "binance":
+        kline = data['k']
+        row = {'open': float(kline['o']), 'high': float(kline['h']), 'low': float(kline['l']),
+               'close': float(kline['c']), 'volume': float(kline['v']),
+               'timestamp': pd.to_datetime(kline['t'], unit='ms')}
+    elif source == "bybit":
+        kline = data['data'][0]
+        row = {'open': float(kline['open']), 'high': float(kline['high']), 'low': float(kline['low']),
+               'close': float(kline['close']), 'volume': float(kline['volume']),
+               'timestamp': pd.to_datetime(kline['start'], unit='ms')}
+    else:
+        row = {'open': float(data['open']), 'high': float(data['high']), 'low': float(data['low']),
+               'close': float(data['close']), 'volume': float(data['volume']),
+               'timestamp': pd.to_datetime(data['timestamp'])}
+    df = pd.DataFrame([row])
+    df.set_index('timestamp', inplace=True)
+    return df
+
+
+def benchmark(n_messages=100_000, sources=None, backends=None):
+    """
+    Микробенчмарк разбора: сообщений в секунду для каждого формата и декодера JSON, а также прежнего
+    разбора через DataFrame (backend 'pandas', на n_messages / 100 сообщениях).
+
+    :return: Список словарей {'source', 'backend', 'messages_per_second'}.
+    """
+    sources = sources or list(DECODERS)
+    backends = backends or [name for name, loads in JSON_BACKENDS.items() if loads is not None]
+    results = []
+    for source in sources:
+        message = SAMPLE_MESSAGES[source]
+        for backend in backends:
+            decode = KlineDecoder(source, backend).decode
+            start = time.perf_counter()
+            for _ in range(n_messages):
+                decode(message)
+            elapsed = time.perf_counter() - start
+            results.append({"source": source, "backend": backend, "messages_per_second": n_messages / elapsed})
+        legacy_messages = max(1, n_messages // 100)
+        start = time.perf_counter()
+        for _ in range(legacy_messages):
+            _legacy_frame(source, json.loads(message))
+        elapsed = time.perf_counter() - start
+        results.append({"source": source, "backend": "pandas", "messages_per_second": legacy_messages / elapsed})
+    return results
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Бенчмарк разбора сообщений kline")
+    parser.add_argument("--n_messages", type=int, default=100_000, help="Количество сообщений на прогон")
+
+    args = parser.parse_args()
+    for result in benchmark(args.n_messages):
+        print(f"{result['source']:<10} {result['backend']:<7} {result['messages_per_second']:>12,.0f} сообщений/с")
@@ -0,0 +1,220 @@
+import itertools
+import threading
+import time
+import ccxt
+import numpy as np
+import pandas as pd
+
+
+class MockExchange:
+    """
+    Биржа в памяти с интерфейсом клиента ccxt для офлайн-тестов live_trading.
+
+    Свечи открываются по мере воспроизведения (advance): fetch_ohlcv возвращает только свечи, уже
+    «наступившие» на бирже. Рыночные ордера исполняются по последней цене с проскальзыванием и комиссией,
+    лимитные — сразу, если цена пересекает лимит, иначе ждут в книге до свечи, чей диапазон high/low
+    достигает лимита. Приватные запросы (create_order, fetch_balance, ...) выполняются с задержкой latency,
+    блокируя вызывающий поток так же, как синхронный клиент ccxt. Запросы можно выполнять из нескольких потоков
+    (live_trading отправляет ордера через asyncio.to_thread): задержки идут параллельно, а изменения книги
+    и баланса — под блокировкой.
+    """
+
+    def __init__(self, candles: dict, balance: dict = None, latency=0.0, fee: float = 0.001,
+                 slippage: float = 0.0, quote: str = "USDT"):
+        """
+        :param candles: Словарь символ -> DataFrame OHLCV с индексом timestamp.
+        :param balance: Начальный баланс по валютам (по умолчанию 10000 quote).
+        :param latency: Задержка приватного запроса в секундах (число или функция без аргументов).
+        :param fee: Комиссия тейкера.
+        :param slippage: Проскальзывание рыночного ордера.
+        :param quote: Валюта котировки.
+        """
+        self.id = "mock"
+        self.rateLimit = 0
+        self.latency = latency
+        self.fee = fee
+        self.slippage = slippage
+        self.quote = quote
+        self._timestamps = {symbol: data.index.as_unit('ms').asi8 for symbol, data in candles.items()}
+        self._ohlcv = {symbol: data[['open', 'high', 'low', 'close', 'volume']].to_numpy(dtype=np.float64)
+                       for symbol, data in candles.items()}
+        self._revealed = {symbol: 0 for symbol in candles}
+        self.balance = dict(balance or {quote: 10000.0})
+        self.orders = {}
+        self._order_ids = itertools.count(1)
+        self.markets = {}
+        self.calls = {"create_order": 0, "fetch_balance": 0, "fetch_ohlcv": 0}
+        self._lock = threading.RLock()
+
+    def _delay(self):
+        latency = self.latency() if callable(self.latency) else self.latency
+        if latency:
+            time.sleep(latency)
+
+    def _check_symbol(self, symbol):
+        if symbol not in self._ohlcv:
+            raise ccxt.BadSymbol(f"mock does not have market symbol {symbol}")
+
+    def load_markets(self, reload=False):
+        if not self.markets or reload:
+            self.markets = {symbol: {"symbol": symbol, "base": symbol.split('/')[0], "quote": self.quote,
+                                     "active": True, "precision": {"amount": 8, "price": 8}}
+                            for symbol in self._ohlcv}
+        return self.markets
+
+    def advance(self, symbol, timestamp):
+        """
+        Открывает свечи символа до timestamp (мс) включительно и исполняет лимитные ордера.
+
+        :return: Последняя открытая свеча [timestamp, open, high, low, close, volume] или None.
+        """
+        with self._lock:
+            self._check_symbol(symbol)
+            start = self._revealed[symbol]
+            end = int(np.searchsorted(self._timestamps[symbol], timestamp, side='right'))
+            self._revealed[symbol] = max(start, end)
+            for row in self._ohlcv[symbol][start:end]:
+                self._match_resting(symbol, row[1], row[2])
+            return self.last_candle(symbol)
+
+    def last_candle(self, symbol):
+        revealed = self._revealed[symbol]
+        if revealed == 0:
+            return None
+        return [int(self._timestamps[symbol][revealed - 1])] + self._ohlcv[symbol][revealed - 1].tolist()
+
+    def last_price(self, symbol):
+        candle = self.last_candle(symbol)
+        if candle is None:
+            raise ccxt.ExchangeError(f"no trades for {symbol} yet")
+        return candle[4]
+
+    def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None, params={}):
+        self._check_symbol(symbol)
+        self.calls["fetch_ohlcv"] += 1
+        timestamps = self._timestamps[symbol][:self._revealed[symbol]]
+        limit = limit or 500
+        if since is None:
+            start = max(0, len(timestamps) - limit)
+        else:
+            start = int(np.searchsorted(timestamps, since, side='left'))
+        end = min(len(timestamps), start + limit)
+        return [[int(timestamps[i])] + self._ohlcv[symbol][i].tolist() for i in range(start, end)]
+
+    def fetch_balance(self, params={}):
+        self._delay()
+        with self._lock:
+            self.calls["fetch_balance"] += 1
+            used = {currency: 0.0 for currency in self.balance}
+            for order in self.orders.values():
+                if order["status"] == "open":
+                    base, quote = order["symbol"].split('/')
+                    if order["side"] == "buy":
+                        used[quote] = used.get(quote, 0.0) + order["amount"] * order["price"]
+                    else:
+                        used[base] = used.get(base, 0.0) + order["amount"]
+            total = dict(self.balance)
+            free = {currency: total.get(currency, 0.0) - used.get(currency, 0.0) for currency in total}
+            result = {currency: {"free": free[currency], "used": used.get(currency, 0.0), "total": total[currency]}
+                      for currency in total}
+            result.update({"free": free, "used": used, "total": total})
+            return result
+
+    def _fill(self, order, price):
+        base, quote = order["symbol"].split('/')
+        amount = order["amount"]
+        cost = amount * price
+        if order["side"] == "buy":
+            if self.balance.get(quote, 0.0) < cost * (1 - 1e-9):
+                raise ccxt.InsufficientFunds(f"mock: {quote} balance {self.balance.get(quote, 0.0)} < {cost}")
+            self.balance[quote] = self.balance.get(quote, 0.0) - cost
+            self.balance[base] = self.balance.get(base, 0.0) + amount * (1 - self.fee)
+        else:
+            if self.balance.get(base, 0.0) < amount * (1 - 1e-9):
+                raise ccxt.InsufficientFunds(f"mock: {base} balance {self.balance.get(base, 0.0)} < {amount}")
+            self.balance[base] = max(0.0, self.balance.get(base, 0.0) - amount)
+            self.balance[quote] = self.balance.get(quote, 0.0) + cost * (1 - self.fee)
+        order.update({"status": "closed", "filled": amount, "remaining": 0.0, "average": price, "cost": cost,
+                      "fee": {"cost": cost * self.fee, "currency": quote if order["side"] == "sell" else base,
+                              "rate": self.fee}})
+
+    def _match_resting(self, symbol, high, low):
+        for order in list(self.orders.values()):
+            if order["status"] != "open" or order["symbol"] != symbol:
+                continue
+            if (order["side"] == "buy" and low <= order["price"]) or (order["side"] == "sell" and high >= order["price"]):
+                try:
+                    self._fill(order, order["price"])
+                except ccxt.InsufficientFunds:
+                    order["status"] = "rejected"
+
+    def create_order(self, symbol, type, side, amount, price=None, params={}):
+        """Параметры stop_loss/take_profit принимаются для совместимости, но не исполняются."""
+        self._delay()
+        with self._lock:
+            self._check_symbol(symbol)
+            self.calls["create_order"] += 1
+            if amount is None or amount <= 0:
+                raise ccxt.InvalidOrder(f"mock: invalid amount {amount}")
+            if type == 'limit' and price is None:
+                raise ccxt.InvalidOrder("mock: limit order requires price")
+            last = self.last_price(symbol)
+            order = {"id": str(next(self._order_ids)), "clientOrderId": params.get("clientOrderId"),
+                     "timestamp": int(time.time() * 1000), "symbol": symbol, "type": type, "side": side,
+                     "amount": float(amount), "price": price, "filled": 0.0, "remaining": float(amount),
+                     "status": "open", "average": None, "cost": 0.0, "fee": None, "info": {"params": dict(params)}}
+            if type == 'market':
+                order["price"] = last * (1 + self.slippage if side == 'buy' else 1 - self.slippage)
+                self._fill(order, order["price"])
+            elif (side == 'buy' and price >= last) or (side == 'sell' and price <= last):
+                self._fill(order, last)
+            self.orders[order["id"]] = order
+            return dict(order)
+
+    def fetch_order(self, id, symbol=None, params={}):
+        self._delay()
+        with self._lock:
+            if id not in self.orders:
+                raise ccxt.OrderNotFound(f"mock: order {id} not found")
+            return dict(self.orders[id])
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params={}):
+        self._delay()
+        with self._lock:
+            return [dict(order) for order in self.orders.values()
+                    if order["status"] == "open" and (symbol is None or order["symbol"] == symbol)]
+
+    def cancel_order(self, id, symbol=None, params={}):
+        self._delay()
+        with self._lock:
+            order = self.orders.get(id)
+            if order is None or order["status"] != "open":
+                raise ccxt.OrderNotFound(f"mock: open order {id} not found")
+            order["status"] = "canceled"
+            return dict(order)
+
+
+def synthetic_candles(symbols, n_candles, timeframe_ms=3_600_000, end=None, seed=None):
+    """
+    Синтетические свечи (геометрическое броуновское движение) для каждого символа.
+
+    :param end: Время открытия последней свечи в мс (по умолчанию — сутки назад, чтобы все свечи были закрыты).
+    :return: Словарь символ -> DataFrame OHLCV.
+    """
+    rng = np.random.default_rng(seed)
+    end = end if end is not None else (int(time.time() * 1000) // timeframe_ms - 24) * timeframe_ms
+    index = pd.to_datetime(end - timeframe_ms * np.arange(n_candles)[::-1], unit='ms')
+    index.name = 'timestamp'
+    candles = {}
+    for symbol in symbols:
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n_candles)))
+        open_prices = np.concatenate(([close[0]], close[:-1]))
+        spread = np.abs(rng.normal(0, 0.004, n_candles))
+        candles[symbol] = pd.DataFrame({
+            'open': open_prices,
+            'high': np.maximum(open_prices, close) * (1 + spread),
+            'low': np.minimum(open_prices, close) * (1 - spread),
+            'close': close,
+            'volume': rng.uniform(100, 1000, n_candles),
+        }, index=index)
+    return candles
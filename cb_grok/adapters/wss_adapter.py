@@ -1,8 +1,106 @@
 import asyncio
+import random
+import time
 import websockets
 import json
-import pandas as pd
-from cb_grok.adapters.exchange_adapter import ExchangeAdapter
+from websockets.exceptions import ConnectionClosed, ConnectionClosedOK, InvalidStatus
+from cb_grok.adapters.exchange_adapter import get_exchange_adapter
+from cb_grok.adapters.kline_decoder import Candle, KlineDecoder
+from cb_grok.utils.metrics_exporter import WS_RECONNECTS
+
+
+class ConnectionStats:
+    """Статистика соединения: переподключения и время от обрыва до возобновления решений."""
+
+    def __init__(self):
+        self.connects = 0
+        self.reconnects = 0
+        self.outage_started = None
+        self.outages = []
+
+    def disconnected(self):
+        if self.outage_started is None:
+            self.outage_started = time.monotonic()
+
+    def resumed(self):
+        """Отмечает возобновление обработки; возвращает длительность простоя в секундах или None."""
+        if self.outage_started is None:
+            return None
+        outage = time.monotonic() - self.outage_started
+        self.outage_started = None
+        self.outages.append(outage)
+        return outage
+
+    @property
+    def last_outage(self):
+        return self.outages[-1] if self.outages else None
+
+    @property
+    def max_outage(self):
+        return max(self.outages) if self.outages else None
+
+
+async def supervised_messages(ws_url, on_connect=None, stats=None, reconnect=True, backoff_base=1.0,
+                              backoff_max=60.0, max_retries=None, logger=None):
+    """
+    Сообщения WebSocket с автоматическим переподключением.
+
+    При обрыве соединения или ошибке подключения повторяет попытки с экспоненциальной задержкой
+    (backoff_base * 2^n, не более backoff_max, со случайным разбросом) и после подключения заново вызывает
+    on_connect (подписка на топики). Корректное закрытие сервером (ConnectionClosedOK) завершает поток,
+    если reconnect=False, иначе тоже приводит к переподключению.
+
+    :param ws_url: URL WebSocket.
+    :param on_connect: Корутина on_connect(websocket), вызываемая после каждого подключения.
+    :param stats: ConnectionStats для учета переподключений и простоя.
+    :param reconnect: Переподключаться ли после обрыва.
+    :param backoff_base: Начальная задержка перед переподключением в секундах.
+    :param backoff_max: Максимальная задержка в секундах.
+    :param max_retries: Максимальное число попыток подряд (None — без ограничения).
+    :param logger: Объект для логирования.
+    """
+    stats = stats if stats is not None else ConnectionStats()
+    attempt = 0
+    while True:
+        try:
+            async with websockets.connect(ws_url) as websocket:
+                stats.connects += 1
+                if stats.connects > 1:
+                    stats.reconnects += 1
+                    WS_RECONNECTS.labels(ws_url).inc()
+                    if logger:
+                        logger.info(f"Переподключено к {ws_url} (переподключений: {stats.reconnects})")
+                if on_connect is not None:
+                    await on_connect(websocket)
+                async for message in websocket:
+                    # Задержка сбрасывается только после первого сообщения: сервер, который принимает
+                    # подключение и сразу его закрывает, не приводит к частым переподключениям
+                    attempt = 0
+                    yield message
+            if not reconnect:
+                return
+            stats.disconnected()
+            if logger:
+                logger.warning(f"Соединение с {ws_url} закрыто сервером")
+        except ConnectionClosedOK:
+            if not reconnect:
+                return
+            stats.disconnected()
+            if logger:
+                logger.warning(f"Соединение с {ws_url} закрыто сервером")
+        except (ConnectionClosed, InvalidStatus, OSError, asyncio.TimeoutError) as e:
+            if not reconnect:
+                raise
+            stats.disconnected()
+            if logger:
+                logger.warning(f"Обрыв соединения с {ws_url}: {e!r}")
+        if max_retries is not None and attempt >= max_retries:
+            raise ConnectionError(f"Не удалось переподключиться к {ws_url} за {max_retries} попыток")
+        delay = min(backoff_max, backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+        attempt += 1
+        if logger:
+            logger.info(f"Повторное подключение к {ws_url} через {delay:.1f} с (попытка {attempt})")
+        await asyncio.sleep(delay)
 
 class WSSAdapter:
     def __init__(self, exchange_name='binance'):
@@ -10,7 +108,8 @@ class WSSAdapter:
         self.ws_url = f"wss://stream.{exchange_name}.com:9443/ws"
 
     async def connect(self, symbol, timeframe):
-        """Подключение к WebSocket биржи для получения данных в реальном времени."""
+        """Подключение к WebSocket биржи для получения свечей (Candle) в реальном времени."""
+        decoder = KlineDecoder(self.exchange_name)
         async with websockets.connect(self.ws_url) as websocket:
             subscribe_msg = {
                 "method": "SUBSCRIBE",
@@ -20,25 +119,14 @@ class WSSAdapter:
             await websocket.send(json.dumps(subscribe_msg))
             while True:
                 response = await websocket.recv()
-                data = json.loads(response)
-                if 'k' in data:
-                    kline = data['k']
-                    df = pd.DataFrame([{
-                        'timestamp': pd.to_datetime(kline['t'], unit='ms'),
-                        'open': float(kline['o']),
-                        'high': float(kline['h']),
-                        'low': float(kline['l']),
-                        'close': float(kline['c']),
-                        'volume': float(kline['v'])
-                    }])
-                    df.set_index('timestamp', inplace=True)
-                    yield df
+                for candle in decoder.decode(response):
+                    yield candle
 
     async def simulate(self, symbol, timeframe, limit=1000):
         """Имитация данных за последние 1000 часов с интервалом в 1 час."""
-        adapter = ExchangeAdapter(self.exchange_name)
+        adapter = get_exchange_adapter(self.exchange_name)
         data = adapter.fetch_ohlcv(symbol, timeframe, limit=limit)
-        for _, row in data.iterrows():
-            df = pd.DataFrame([row])
-            yield df
-            await asyncio.sleep(1)  # Задержка 1 секунда для имитации реального времени
\ No newline at end of file
+        timestamps = data.index.as_unit('ms').asi8
+        for timestamp, row in zip(timestamps, data.itertuples(index=False)):
+            yield Candle(int(timestamp), row.open, row.high, row.low, row.close, row.volume)
+            await asyncio.sleep(1)  # Задержка 1 секунда для имитации реального времени
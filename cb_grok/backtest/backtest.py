@@ -1,8 +1,10 @@
 import pandas as pd
 import numpy as np
+from cb_grok.backtest.metrics import compute_metrics
 
 def run_backtest(data: pd.DataFrame, initial_capital: float, commission: float, stop_loss_multiplier: float = 1.5,
-                 take_profit_multiplier: float = 3.0, slippage_percent: float = 0.001, spread: float = 0.0002):
+                 take_profit_multiplier: float = 3.0, slippage_percent: float = 0.001, spread: float = 0.0002,
+                 timeframe: str = None, minute_data: pd.DataFrame = None):
     """
     Выполняет бэктест с учетом проскальзывания и спреда.
 
@@ -13,8 +15,16 @@ def run_backtest(data: pd.DataFrame, initial_capital: float, commission: float,
     :param take_profit_multiplier: Множитель ATR для тейк-профита.
     :param slippage_percent: Процент проскальзывания.
     :param spread: Спред (в процентах).
+    :param timeframe: Таймфрейм данных для аннуализации метрик (без него Sharpe аннуализируется по 252 периодам).
+    :param minute_data: Минутные свечи символа; если заданы, стоп-лосс и тейк-профит проверяются внутри бара
+                        (см. run_backtest_intrabar).
     :return: Кортеж (backtest_data, orders, metrics, num_orders).
     """
+    if minute_data is not None:
+        from cb_grok.backtest.intrabar import run_backtest_intrabar
+        return run_backtest_intrabar(data, minute_data, initial_capital, commission, stop_loss_multiplier,
+                                     take_profit_multiplier, slippage_percent, spread, timeframe)
+
     required_columns = ['signal', 'open', 'close', 'atr']
     for col in required_columns:
         if col not in data.columns:
@@ -26,6 +36,7 @@ def run_backtest(data: pd.DataFrame, initial_capital: float, commission: float,
     stop_loss = 0
     take_profit = 0
     orders = []
+    bars_in_position = 0
 
     for i in range(len(data) - 1):
         signal = data['signal'].iloc[i]
@@ -61,6 +72,7 @@ def run_backtest(data: pd.DataFrame, initial_capital: float, commission: float,
             assets = 0
 
         data.loc[data.index[i + 1], 'portfolio_value'] = capital + assets * data['close'].iloc[i + 1]
+        bars_in_position += assets > 0
 
     if assets > 0:
         last_price = data['close'].iloc[-1] * (1 - slippage_percent - spread)
@@ -71,20 +83,170 @@ def run_backtest(data: pd.DataFrame, initial_capital: float, commission: float,
     final_value = capital
     equity_series = data['portfolio_value'].dropna()
     if len(equity_series) > 1:
-        returns = equity_series.pct_change().dropna()
-        total_return = (final_value - initial_capital) / initial_capital * 100
-        max_drawdown = ((equity_series.cummax() - equity_series) / equity_series.cummax()).max() * 100
-        sharpe_ratio = returns.mean() / returns.std() * np.sqrt(252) if returns.std() != 0 else 0
+        metrics = compute_metrics(equity_series.to_numpy(), initial_capital, final_value, orders, commission,
+                                  timeframe, bars_in_position / len(equity_series))
     else:
-        total_return = 0
-        max_drawdown = 0
-        sharpe_ratio = 0
-
-    metrics = {
-        "final_value": final_value,
-        "total_return_percent": total_return,
-        "max_drawdown_percent": max_drawdown,
-        "sharpe_ratio": sharpe_ratio
-    }
+        metrics = {
+            "final_value": final_value,
+            "total_return_percent": 0,
+            "max_drawdown_percent": 0,
+            "sharpe_ratio": 0
+        }
     num_orders = len(orders)
-    return data, orders, metrics, num_orders
\ No newline at end of file
+    return data, orders, metrics, num_orders
+
+class BacktestState:
+    """Состояние бэктеста, переносимое между порциями данных в simulate_arrays."""
+
+    def __init__(self, initial_capital: float):
+        self.initial_capital = initial_capital
+        self.capital = initial_capital
+        self.assets = 0.0
+        self.stop_loss = 0.0
+        self.take_profit = 0.0
+        self.orders = []
+        self.num_orders = 0
+        self.bars_in_position = 0
+        # Последний бар предыдущей порции: (timestamp, open, close, atr, signal)
+        self.last_bar = None
+
+
+def _order_time(timestamp_ms):
+    return pd.Timestamp(int(timestamp_ms), unit='ms').isoformat()
+
+
+def simulate_arrays(state: BacktestState, timestamps: np.ndarray, open_prices: np.ndarray, close_prices: np.ndarray,
+                    atr: np.ndarray, signals: np.ndarray, commission: float, stop_loss_multiplier: float = 1.5,
+                    take_profit_multiplier: float = 3.0, slippage_percent: float = 0.001, spread: float = 0.0002,
+                    keep_orders: bool = True) -> np.ndarray:
+    """
+    Логика run_backtest на массивах NumPy с переносом состояния между порциями данных.
+
+    :param state: Состояние бэктеста (BacktestState), обновляется на месте.
+    :param timestamps: Метки времени в миллисекундах (int64).
+    :param open_prices: Цены открытия.
+    :param close_prices: Цены закрытия.
+    :param atr: Значения ATR.
+    :param signals: Сигналы 1/0/-1.
+    :param commission: Комиссия за сделку.
+    :param stop_loss_multiplier: Множитель ATR для стоп-лосса.
+    :param take_profit_multiplier: Множитель ATR для тейк-профита.
+    :param slippage_percent: Процент проскальзывания.
+    :param spread: Спред (в процентах).
+    :param keep_orders: Сохранять ли ордера в state.orders (иначе только счётчик).
+    :return: Стоимость портфеля на каждом баре порции (для самого первого бара истории значения нет).
+    """
+    columns = [np.asarray(timestamps, dtype=np.int64).tolist(), np.asarray(open_prices, dtype=np.float64).tolist(),
+               np.asarray(close_prices, dtype=np.float64).tolist(), np.asarray(atr, dtype=np.float64).tolist(),
+               np.asarray(signals).astype(np.int64).tolist()]
+    if state.last_bar is not None:
+        for column, value in zip(columns, state.last_bar):
+            column.insert(0, value)
+    ts, opens, closes, atrs, sigs = columns
+    if not ts:
+        return np.empty(0)
+
+    cost = slippage_percent + spread
+    capital, assets = state.capital, state.assets
+    stop_loss, take_profit = state.stop_loss, state.take_profit
+    orders = state.orders
+    num_orders = state.num_orders
+    bars_in_position = state.bars_in_position
+    equity = np.empty(len(ts) - 1)
+
+    for i in range(len(ts) - 1):
+        signal = sigs[i]
+        next_open_price = opens[i + 1] * (1 + cost if signal == 1 else 1 - cost)
+
+        if assets > 0:
+            current_price = closes[i]
+            reason = "stop_loss" if current_price <= stop_loss else "take_profit" if current_price >= take_profit else None
+            if reason:
+                sell_price = next_open_price * (1 - cost)
+                capital = assets * sell_price * (1 - commission)
+                if keep_orders:
+                    orders.append({"action": "sell", "amount": assets, "price": sell_price,
+                                   "timestamp": _order_time(ts[i + 1]), "reason": reason})
+                num_orders += 1
+                assets = 0
+
+        if signal == 1 and capital > 0:
+            buy_price = next_open_price * (1 + cost)
+            assets = capital / buy_price * (1 - commission)
+            capital = 0
+            stop_loss = buy_price - atrs[i] * stop_loss_multiplier
+            take_profit = buy_price + atrs[i] * take_profit_multiplier
+            if keep_orders:
+                orders.append({"action": "buy", "amount": assets, "price": buy_price,
+                               "timestamp": _order_time(ts[i + 1])})
+            num_orders += 1
+        elif signal == -1 and assets > 0:
+            sell_price = next_open_price * (1 - cost)
+            capital = assets * sell_price * (1 - commission)
+            if keep_orders:
+                orders.append({"action": "sell", "amount": assets, "price": sell_price,
+                               "timestamp": _order_time(ts[i + 1]), "reason": "signal"})
+            num_orders += 1
+            assets = 0
+
+        equity[i] = capital + assets * closes[i + 1]
+        bars_in_position += assets > 0
+
+    state.capital, state.assets = capital, assets
+    state.stop_loss, state.take_profit = stop_loss, take_profit
+    state.num_orders = num_orders
+    state.bars_in_position = bars_in_position
+    state.last_bar = (ts[-1], opens[-1], closes[-1], atrs[-1], sigs[-1])
+    return equity
+
+
+def close_position(state: BacktestState, commission: float, slippage_percent: float = 0.001, spread: float = 0.0002,
+                   keep_orders: bool = True) -> float:
+    """Закрывает позицию по последней цене, как в конце run_backtest. Возвращает итоговый капитал."""
+    if state.assets > 0 and state.last_bar is not None:
+        timestamp, _, close, _, _ = state.last_bar
+        last_price = close * (1 - slippage_percent - spread)
+        state.capital = state.assets * last_price * (1 - commission)
+        if keep_orders:
+            state.orders.append({"action": "sell", "amount": state.assets, "price": last_price,
+                                 "timestamp": _order_time(timestamp), "reason": "end_of_backtest"})
+        state.num_orders += 1
+        state.assets = 0
+    return state.capital
+
+
+def run_backtest_arrays(data, signals: np.ndarray, atr: np.ndarray, initial_capital: float, commission: float,
+                        stop_loss_multiplier: float = 1.5, take_profit_multiplier: float = 3.0,
+                        slippage_percent: float = 0.001, spread: float = 0.0002, timeframe: str = None):
+    """
+    run_backtest без записи в данные: сигналы и ATR передаются отдельными массивами (moving_average_arrays).
+
+    :param data: OHLCVDataset или DataFrame с колонками 'open', 'close' и индексом времени.
+    :param signals: Сигналы 1/0/-1.
+    :param atr: Значения ATR.
+    :param initial_capital: Начальный капитал.
+    :param commission: Комиссия за сделку.
+    :param stop_loss_multiplier: Множитель ATR для стоп-лосса.
+    :param take_profit_multiplier: Множитель ATR для тейк-профита.
+    :param slippage_percent: Процент проскальзывания.
+    :param spread: Спред (в процентах).
+    :param timeframe: Таймфрейм данных для аннуализации метрик.
+    :return: Кортеж (equity, orders, metrics, num_orders): equity — стоимость портфеля со второго бара,
+             остальное как в run_backtest.
+    """
+    state = BacktestState(initial_capital)
+    timestamps = data.index.values.astype('datetime64[ms]').astype(np.int64)
+    equity = simulate_arrays(state, timestamps, data['open'], data['close'], atr, signals, commission,
+                             stop_loss_multiplier, take_profit_multiplier, slippage_percent, spread)
+    final_value = close_position(state, commission, slippage_percent, spread)
+    if len(equity) > 1:
+        metrics = compute_metrics(equity, initial_capital, final_value, state.orders, commission, timeframe,
+                                  state.bars_in_position / len(equity))
+    else:
+        metrics = {
+            "final_value": final_value,
+            "total_return_percent": 0,
+            "max_drawdown_percent": 0,
+            "sharpe_ratio": 0
+        }
+    return equity, state.orders, metrics, len(state.orders)
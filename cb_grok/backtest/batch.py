@@ -0,0 +1,106 @@
+import numpy as np
+
+
+def _rows(values, n_runs):
+    """Приводит вход к виду, где values[i] — значение бара i для всех прогонов (скаляр или вектор)."""
+    values = np.asarray(values)
+    if values.ndim == 1:
+        return values
+    if values.shape[0] != n_runs:
+        raise ValueError(f"Матрица должна иметь {n_runs} строк (по одной на прогон), получено {values.shape[0]}")
+    return np.ascontiguousarray(values.T)
+
+
+def batch_backtest(open_prices, close_prices, atr, signals, commission=0.00075, stop_loss_multiplier=1.5,
+                   take_profit_multiplier=3.0, slippage_percent=0.001, spread=0.0002, initial_capital=1.0,
+                   n_runs: int = None):
+    """
+    Логика run_backtest сразу для многих прогонов: цикл по барам, векторные операции по прогонам.
+
+    Ценовые ряды и сигналы задаются одним рядом (общим для всех прогонов) или матрицей (прогон x бар),
+    параметры исполнения — числом или вектором по прогонам. Так одна стратегия оценивается при многих
+    сценариях издержек, а разные ценовые пути или наборы параметров — за один проход.
+
+    :param open_prices: Цены открытия.
+    :param close_prices: Цены закрытия.
+    :param atr: Значения ATR.
+    :param signals: Сигналы 1/0/-1.
+    :param commission: Комиссия за сделку.
+    :param stop_loss_multiplier: Множитель ATR для стоп-лосса.
+    :param take_profit_multiplier: Множитель ATR для тейк-профита.
+    :param slippage_percent: Процент проскальзывания.
+    :param spread: Спред (в процентах).
+    :param initial_capital: Начальный капитал.
+    :param n_runs: Количество прогонов (по умолчанию определяется по размерам входов).
+    :return: Словарь: 'equity' (прогон x бар, без первого бара, как portfolio_value в run_backtest),
+             'final_value', 'num_orders', 'trade_returns' и 'trade_runs' (номер прогона каждой сделки).
+    """
+    inputs = [open_prices, close_prices, atr, signals]
+    params = [commission, stop_loss_multiplier, take_profit_multiplier, slippage_percent, spread, initial_capital]
+    if n_runs is None:
+        n_runs = max([np.shape(x)[0] for x in inputs if np.ndim(x) == 2] +
+                     [np.size(p) for p in params if np.ndim(p) == 1] + [1])
+    n_bars = np.shape(close_prices)[-1]
+    opens, closes, atrs, sigs = (_rows(x, n_runs) for x in inputs)
+    commission, stop_mult, take_mult, slippage, spread, initial_capital = (
+        np.broadcast_to(np.asarray(p, dtype=np.float64), (n_runs,)) for p in params)
+    cost = slippage + spread
+
+    capital = initial_capital.copy()
+    assets = np.zeros(n_runs)
+    entry_price = np.zeros(n_runs)
+    stop_loss = np.zeros(n_runs)
+    take_profit = np.zeros(n_runs)
+    num_orders = np.zeros(n_runs, dtype=np.int64)
+    equity = np.empty((max(n_bars - 1, 0), n_runs))
+    trade_runs = []
+    trade_returns = []
+
+    def close_trades(mask, sell_price):
+        trade_runs.append(np.flatnonzero(mask))
+        trade_returns.append(sell_price / entry_price[mask] * (1 - commission[mask]) ** 2 - 1)
+        capital[mask] = assets[mask] * sell_price * (1 - commission[mask])
+        assets[mask] = 0.0
+        num_orders[mask] += 1
+
+    for i in range(n_bars - 1):
+        signal = sigs[i]
+        buy_signal = signal == 1
+        next_open = opens[i + 1] * np.where(buy_signal, 1 + cost, 1 - cost)
+
+        held = assets > 0
+        if held.any():
+            close = closes[i]
+            exits = held & ((close <= stop_loss) | (close >= take_profit))
+            if exits.any():
+                close_trades(exits, (next_open * (1 - cost))[exits])
+
+        buys = buy_signal & (capital > 0)
+        if np.any(buys):
+            buy_price = (next_open * (1 + cost))[buys]
+            bar_atr = np.broadcast_to(atrs[i], (n_runs,))[buys]
+            assets[buys] = capital[buys] / buy_price * (1 - commission[buys])
+            capital[buys] = 0.0
+            entry_price[buys] = buy_price
+            stop_loss[buys] = buy_price - bar_atr * stop_mult[buys]
+            take_profit[buys] = buy_price + bar_atr * take_mult[buys]
+            num_orders[buys] += 1
+        # Покупка и продажа по сигналу взаимоисключающие для каждого прогона, как if/elif в run_backtest
+        sells = (signal == -1) & (assets > 0)
+        if np.any(sells):
+            close_trades(sells, (next_open * (1 - cost))[sells])
+
+        equity[i] = capital + assets * closes[i + 1]
+
+    # Закрытие позиции в конце бэктеста
+    held = assets > 0
+    if n_bars and held.any():
+        close_trades(held, (np.broadcast_to(closes[n_bars - 1], (n_runs,)) * (1 - cost))[held])
+
+    return {
+        "equity": equity.T,
+        "final_value": capital,
+        "num_orders": num_orders,
+        "trade_returns": np.concatenate(trade_returns) if trade_returns else np.empty(0),
+        "trade_runs": np.concatenate(trade_runs) if trade_runs else np.empty(0, dtype=np.int64),
+    }
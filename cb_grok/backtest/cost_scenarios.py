@@ -0,0 +1,151 @@
+import glob
+import itertools
+import os
+import numpy as np
+import pandas as pd
+from cb_grok.backtest.batch import batch_backtest
+from cb_grok.backtest.metrics import batch_equity_metrics, batch_trade_metrics
+
+COST_COLUMNS = ["commission", "slippage_percent", "spread"]
+# Комиссии по умолчанию: без комиссии, уровни мейкера и VIP, тейкер со скидкой и обычный тейкер
+DEFAULT_COMMISSIONS = (0.0, 0.0002, 0.0004, 0.00075, 0.001)
+# Множители проскальзывания и спреда относительно базовых значений run_backtest (стресс-сценарии)
+DEFAULT_STRESS = (0.0, 1.0, 2.0, 5.0)
+
+
+def cost_grid(commissions=DEFAULT_COMMISSIONS, slippages=None, spreads=None, stress=DEFAULT_STRESS,
+              slippage_percent=0.001, spread=0.0002):
+    """
+    Сценарии издержек: все сочетания комиссий с проскальзыванием и спредом.
+
+    Если slippages и spreads не заданы, проскальзывание и спред масштабируются вместе множителями stress
+    от базовых slippage_percent и spread; иначе берется полное произведение списков.
+
+    :return: DataFrame с колонками 'scenario', 'commission', 'slippage_percent', 'spread'.
+    """
+    if slippages is None and spreads is None:
+        rows = [(commission, slippage_percent * k, spread * k) for commission, k in itertools.product(commissions, stress)]
+    else:
+        rows = list(itertools.product(commissions, slippages or [slippage_percent], spreads or [spread]))
+    scenarios = pd.DataFrame(rows, columns=COST_COLUMNS)
+    scenarios.insert(0, "scenario", [f"c{c:g}_s{s:g}_sp{sp:g}" for c, s, sp in rows])
+    return scenarios
+
+
+def evaluate_cost_scenarios(strategy_data, scenarios, initial_capital, stop_loss_multiplier,
+                            take_profit_multiplier, timeframe=None):
+    """
+    Метрики одной стратегии при многих сценариях издержек за один проход.
+
+    Сигналы и ATR от издержек не зависят, поэтому стратегия рассчитывается один раз, а все сценарии
+    моделируются одним вызовом batch_backtest с векторами комиссии, проскальзывания и спреда (по прогону
+    на сценарий) — по тем же правилам, что run_backtest.
+
+    :param strategy_data: DataFrame moving_average_strategy (колонки 'open', 'close', 'atr', 'signal').
+    :param scenarios: DataFrame (или список словарей) с колонками 'commission', 'slippage_percent', 'spread'
+                      и, например, 'scenario' с названием.
+    :param initial_capital: Начальный капитал.
+    :param stop_loss_multiplier: Множитель ATR для стоп-лосса.
+    :param take_profit_multiplier: Множитель ATR для тейк-профита.
+    :param timeframe: Таймфрейм для аннуализации.
+    :return: Копия scenarios с колонками метрик.
+    """
+    scenarios = pd.DataFrame(scenarios).reset_index(drop=True)
+    missing = [column for column in COST_COLUMNS if column not in scenarios.columns]
+    if missing:
+        raise ValueError(f"В сценариях нет колонок: {missing}")
+    n_runs = len(scenarios)
+    commission, slippage, spread = (scenarios[column].to_numpy(dtype=np.float64) for column in COST_COLUMNS)
+    open_prices, close, atr = (strategy_data[column].to_numpy(dtype=np.float64) for column in ['open', 'close', 'atr'])
+
+    result = batch_backtest(open_prices, close, atr, strategy_data['signal'].to_numpy(), commission,
+                            stop_loss_multiplier, take_profit_multiplier, slippage, spread, initial_capital, n_runs)
+    metrics = batch_equity_metrics(result["equity"], initial_capital, result["final_value"], timeframe)
+    trades = batch_trade_metrics(result["trade_returns"], result["trade_runs"], n_runs)
+
+    report = scenarios.copy()
+    for column in ["final_value", "total_return_percent", "max_drawdown_percent", "sharpe_ratio", "sortino_ratio"]:
+        report[column] = metrics[column]
+    for column in ["win_rate", "average_trade_percent", "profit_factor"]:
+        report[column] = trades[column]
+    report["num_orders"] = result["num_orders"]
+    return report
+
+
+def run_cost_scenarios(filenames=None, initial_capital=10000, scenarios=None, folder="library/cost_scenarios",
+                       logger=None):
+    """
+    Сценарии издержек для сохраненных моделей library/best_models_params.
+
+    Данные загружаются один раз на символ, таймфрейм и глубину истории. Итоговая таблица (строка на модель
+    и сценарий) сохраняется в folder/cost_scenarios.csv.
+
+    :param filenames: Имена файлов моделей (по умолчанию все модели).
+    :param initial_capital: Начальный капитал.
+    :param scenarios: Сценарии издержек (по умолчанию cost_grid()).
+    :param folder: Папка отчета.
+    :param logger: Объект для логирования.
+    :return: DataFrame с колонками 'model', 'symbol', 'timeframe', сценария и метрик.
+    """
+    from cb_grok.adapters.exchange_adapter import get_exchange_adapter
+    from cb_grok.run_model import load_model, strategy_params_from_model
+    from cb_grok.strategies.moving_average_strategy import moving_average_strategy
+
+    if filenames is None:
+        filenames = sorted(os.path.basename(path) for path in glob.glob("library/best_models_params/*.json"))
+    scenarios = cost_grid() if scenarios is None else pd.DataFrame(scenarios)
+    adapter = get_exchange_adapter()
+    history = {}
+    reports = []
+    for filename in filenames:
+        model_params = load_model(filename)
+        key = (model_params["symbol"], model_params["timeframe"], model_params["limit"])
+        if key not in history:
+            history[key] = adapter.fetch_ohlcv(*key)
+        try:
+            strategy_data = moving_average_strategy(history[key], **strategy_params_from_model(model_params),
+                                                    debug=False)
+        except ValueError as e:
+            if logger:
+                logger.warning(f"Модель {filename} пропущена: {e}")
+            continue
+        report = evaluate_cost_scenarios(strategy_data, scenarios, initial_capital,
+                                         model_params["stop_loss_multiplier"], model_params["take_profit_multiplier"],
+                                         model_params["timeframe"])
+        report.insert(0, "timeframe", model_params["timeframe"])
+        report.insert(0, "symbol", model_params["symbol"])
+        report.insert(0, "model", filename)
+        reports.append(report)
+        if logger:
+            logger.info(f"Сценарии издержек {filename}: доходность от {report['total_return_percent'].min():.2f}% "
+                        f"до {report['total_return_percent'].max():.2f}% в {len(report)} сценариях")
+    result = pd.concat(reports, ignore_index=True) if reports else pd.DataFrame()
+
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    result.to_csv(os.path.join(folder, "cost_scenarios.csv"), index=False)
+    if logger:
+        logger.info(f"Сценарии издержек сохранены в {os.path.join(folder, 'cost_scenarios.csv')}")
+    return result
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Метрики сохраненных моделей при разных комиссиях, проскальзывании и спреде")
+    parser.add_argument("--models", default=None, help="Файлы моделей через запятую (по умолчанию все)")
+    parser.add_argument("--initial_capital", type=float, default=10000, help="Начальный капитал")
+    parser.add_argument("--scenarios", default=None,
+                        help="CSV со сценариями (колонки commission, slippage_percent, spread и, например, scenario)")
+    parser.add_argument("--commissions", default=None, help="Комиссии сетки через запятую")
+    parser.add_argument("--stress", default=None, help="Множители проскальзывания и спреда через запятую")
+
+    args = parser.parse_args()
+    if args.scenarios:
+        scenario_table = pd.read_csv(args.scenarios)
+    else:
+        scenario_table = cost_grid(
+            [float(x) for x in args.commissions.split(',')] if args.commissions else DEFAULT_COMMISSIONS,
+            stress=[float(x) for x in args.stress.split(',')] if args.stress else DEFAULT_STRESS)
+    table = run_cost_scenarios(args.models.split(',') if args.models else None, args.initial_capital, scenario_table)
+    if len(table):
+        print(table.pivot_table(index="model", columns="scenario", values="total_return_percent").round(2).to_string())
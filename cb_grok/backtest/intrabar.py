@@ -0,0 +1,192 @@
+import numpy as np
+import pandas as pd
+from cb_grok.backtest.backtest import _order_time
+from cb_grok.backtest.metrics import compute_metrics
+from cb_grok.utils.utils import timeframe_to_milliseconds
+
+# Размер порции минутных свечей при поиске первого касания: длинные удержания не сравниваются целиком,
+# если уровень достигнут в начале
+TOUCH_CHUNK = 4096
+
+
+def _timestamps_ms(index) -> np.ndarray:
+    return index.values.astype('datetime64[ms]').astype(np.int64)
+
+
+def bar_minute_bounds(bar_timestamps: np.ndarray, minute_timestamps: np.ndarray, bar_ms: int):
+    """
+    Границы минутных свечей каждого бара: минуты start[i]:end[i] лежат внутри бара i.
+
+    :param bar_timestamps: Время открытия баров в миллисекундах (по возрастанию).
+    :param minute_timestamps: Время открытия минутных свечей в миллисекундах (по возрастанию).
+    :param bar_ms: Длина бара в миллисекундах.
+    :return: Кортеж массивов (start, end).
+    """
+    start = np.searchsorted(minute_timestamps, bar_timestamps, side='left')
+    end = np.searchsorted(minute_timestamps, bar_timestamps + bar_ms, side='left')
+    return start, end
+
+
+def first_touch(minute_open: np.ndarray, minute_high: np.ndarray, minute_low: np.ndarray, start: int, end: int,
+                stop_loss: float, take_profit: float):
+    """
+    Первая минута в [start, end), в которой low достиг стоп-лосса или high — тейк-профита.
+
+    Поиск векторный, порциями по TOUCH_CHUNK минут. Цена исполнения — уровень, а при гэпе (минута открылась
+    за уровнем) — цена открытия минуты. Если в одной минуте достигнуты оба уровня и открытие между ними,
+    порядок касаний внутри минуты неизвестен, и выбирается стоп-лосс (консервативная оценка).
+
+    :return: Кортеж (индекс минуты или -1, цена исполнения, причина 'stop_loss' или 'take_profit',
+             признак неоднозначной минуты).
+    """
+    for chunk_start in range(start, end, TOUCH_CHUNK):
+        chunk_end = min(end, chunk_start + TOUCH_CHUNK)
+        hit_stop = minute_low[chunk_start:chunk_end] <= stop_loss
+        hit_take = minute_high[chunk_start:chunk_end] >= take_profit
+        touched = hit_stop | hit_take
+        k = int(touched.argmax())
+        if not touched[k]:
+            continue
+        index = chunk_start + k
+        open_price = minute_open[index]
+        if hit_stop[k] and hit_take[k]:
+            if open_price >= take_profit:
+                return index, open_price, "take_profit", False
+            return index, min(open_price, stop_loss), "stop_loss", open_price > stop_loss
+        if hit_stop[k]:
+            return index, min(open_price, stop_loss), "stop_loss", False
+        return index, max(open_price, take_profit), "take_profit", False
+    return -1, 0.0, None, False
+
+
+def run_backtest_intrabar(data: pd.DataFrame, minute_data: pd.DataFrame, initial_capital: float, commission: float,
+                          stop_loss_multiplier: float = 1.5, take_profit_multiplier: float = 3.0,
+                          slippage_percent: float = 0.001, spread: float = 0.0002, timeframe: str = None):
+    """
+    run_backtest со стоп-лоссом и тейк-профитом по минутным свечам внутри бара.
+
+    Сигналы, входы и выходы по сигналу те же, что в run_backtest, но уровни проверяются не по закрытию бара
+    с выходом на открытии следующего, а по high/low минутных свечей: позиция закрывается в минуту первого
+    касания по цене уровня (см. first_touch). Уровни постоянны, пока позиция открыта, поэтому при входе
+    один векторный поиск охватывает все минуты до бара ближайшего сигнала продажи — цикл по минутам не нужен,
+    а индексы минут каждого бара считаются один раз (bar_minute_bounds). Для баров без минутных свечей
+    (история 1m короче) остается проверка по закрытию бара.
+
+    :param data: DataFrame с колонками 'signal', 'open', 'close', 'atr'.
+    :param minute_data: Минутные свечи того же символа (колонки 'open', 'high', 'low').
+    :param initial_capital: Начальный капитал.
+    :param commission: Комиссия за сделку.
+    :param stop_loss_multiplier: Множитель ATR для стоп-лосса.
+    :param take_profit_multiplier: Множитель ATR для тейк-профита.
+    :param slippage_percent: Процент проскальзывания.
+    :param spread: Спред (в процентах).
+    :param timeframe: Таймфрейм баров (по умолчанию определяется по шагу индекса).
+    :return: Кортеж (backtest_data, orders, metrics, num_orders), как в run_backtest; metrics дополнительно
+             содержит 'intrabar_exits' и 'ambiguous_exits' (минуты, где достигнуты оба уровня).
+    """
+    required_columns = ['signal', 'open', 'close', 'atr']
+    for col in required_columns:
+        if col not in data.columns:
+            raise ValueError(f"Отсутствует обязательная колонка: {col}")
+
+    ts = _timestamps_ms(data.index)
+    n = len(ts)
+    bar_ms = timeframe_to_milliseconds(timeframe) if timeframe else int(np.median(np.diff(ts))) if n > 1 else 0
+    minute_ts = _timestamps_ms(minute_data.index)
+    minute_open = minute_data['open'].to_numpy(dtype=np.float64)
+    minute_high = minute_data['high'].to_numpy(dtype=np.float64)
+    minute_low = minute_data['low'].to_numpy(dtype=np.float64)
+    start, end = bar_minute_bounds(ts, minute_ts, bar_ms)
+    covered = (end > start).tolist()
+
+    signals = data['signal'].to_numpy().astype(np.int64)
+    # Бар ближайшего сигнала продажи не раньше данного (или последний бар): до него позиция не закрывается сигналом
+    sell_bar = np.where(signals == -1, np.arange(n), n - 1)
+    next_sell = np.minimum.accumulate(sell_bar[::-1])[::-1] if n else sell_bar
+
+    opens = data['open'].to_numpy(dtype=np.float64).tolist()
+    closes = data['close'].to_numpy(dtype=np.float64).tolist()
+    atrs = data['atr'].to_numpy(dtype=np.float64).tolist()
+    sigs = signals.tolist()
+    cost = slippage_percent + spread
+
+    capital = initial_capital
+    assets = 0
+    stop_loss = 0
+    take_profit = 0
+    orders = []
+    bars_in_position = 0
+    intrabar_exits = 0
+    ambiguous_exits = 0
+    exit_bar = -1
+    exit_minute, exit_price, exit_reason = -1, 0.0, None
+    equity = np.empty(max(n - 1, 0))
+
+    for i in range(n - 1):
+        signal = sigs[i]
+        next_open_price = opens[i + 1] * (1 + cost if signal == 1 else 1 - cost)
+
+        if assets > 0 and not covered[i]:
+            current_price = closes[i]
+            reason = "stop_loss" if current_price <= stop_loss else "take_profit" if current_price >= take_profit else None
+            if reason:
+                sell_price = next_open_price * (1 - cost)
+                capital = assets * sell_price * (1 - commission)
+                orders.append({"action": "sell", "amount": assets, "price": sell_price,
+                               "timestamp": _order_time(ts[i + 1]), "reason": reason})
+                assets = 0
+
+        if signal == 1 and capital > 0:
+            buy_price = next_open_price * (1 + cost)
+            assets = capital / buy_price * (1 - commission)
+            capital = 0
+            stop_loss = buy_price - atrs[i] * stop_loss_multiplier
+            take_profit = buy_price + atrs[i] * take_profit_multiplier
+            orders.append({"action": "buy", "amount": assets, "price": buy_price, "timestamp": _order_time(ts[i + 1])})
+            # Первое касание уровней за все удержание до бара сигнала продажи
+            exit_minute, exit_price, exit_reason, ambiguous = first_touch(
+                minute_open, minute_high, minute_low, start[i + 1], end[next_sell[i + 1]], stop_loss, take_profit)
+            exit_bar = -1
+            if exit_minute >= 0:
+                exit_bar = int(np.searchsorted(ts, minute_ts[exit_minute], side='right')) - 1
+                ambiguous_exits += ambiguous
+        elif signal == -1 and assets > 0:
+            sell_price = next_open_price * (1 - cost)
+            capital = assets * sell_price * (1 - commission)
+            orders.append({"action": "sell", "amount": assets, "price": sell_price, "timestamp": _order_time(ts[i + 1]),
+                           "reason": "signal"})
+            assets = 0
+
+        if assets > 0 and exit_bar == i + 1:
+            sell_price = exit_price * (1 - cost)
+            capital = assets * sell_price * (1 - commission)
+            orders.append({"action": "sell", "amount": assets, "price": sell_price,
+                           "timestamp": _order_time(minute_ts[exit_minute]), "reason": exit_reason})
+            intrabar_exits += 1
+            assets = 0
+
+        equity[i] = capital + assets * closes[i + 1]
+        bars_in_position += assets > 0
+
+    if assets > 0:
+        last_price = closes[-1] * (1 - cost)
+        capital = assets * last_price * (1 - commission)
+        orders.append({"action": "sell", "amount": assets, "price": last_price, "timestamp": _order_time(ts[-1]),
+                       "reason": "end_of_backtest"})
+        assets = 0
+
+    final_value = capital
+    data['portfolio_value'] = np.r_[np.nan, equity] if n else np.empty(0)
+    if len(equity) > 1:
+        metrics = compute_metrics(equity, initial_capital, final_value, orders, commission, timeframe,
+                                  bars_in_position / len(equity))
+    else:
+        metrics = {
+            "final_value": final_value,
+            "total_return_percent": 0,
+            "max_drawdown_percent": 0,
+            "sharpe_ratio": 0
+        }
+    metrics["intrabar_exits"] = intrabar_exits
+    metrics["ambiguous_exits"] = ambiguous_exits
+    return data, orders, metrics, len(orders)
@@ -0,0 +1,149 @@
+import numpy as np
+from cb_grok.utils.utils import timeframe_to_minutes
+
+# Криптовалютный рынок торгуется круглосуточно без выходных
+MINUTES_PER_YEAR = 365 * 24 * 60
+# Прежняя аннуализация run_backtest (торговые дни фондового рынка), если таймфрейм не указан
+DEFAULT_PERIODS_PER_YEAR = 252
+
+
+def periods_per_year(timeframe=None) -> float:
+    """
+    Количество баров таймфрейма в году для аннуализации.
+
+    :param timeframe: Таймфрейм ('1m', '1h', '4h', ...). Без таймфрейма возвращается 252.
+    :return: Количество баров в году.
+    """
+    if timeframe is None:
+        return DEFAULT_PERIODS_PER_YEAR
+    return MINUTES_PER_YEAR / timeframe_to_minutes(timeframe)
+
+
+def batch_equity_metrics(equity: np.ndarray, initial_capital: float, final_value=None, timeframe=None) -> dict:
+    """
+    Метрики по кривым капитала сразу для многих прогонов.
+
+    :param equity: Матрица стоимости портфеля (прогон x бар) или одна кривая.
+    :param initial_capital: Начальный капитал (число или вектор по прогонам).
+    :param final_value: Итоговый капитал после закрытия позиции (по умолчанию — последнее значение кривой).
+    :param timeframe: Таймфрейм для аннуализации.
+    :return: Словарь массивов по прогонам: 'final_value', 'total_return_percent', 'annualized_return_percent',
+             'max_drawdown_percent', 'max_drawdown_duration' (в барах), 'sharpe_ratio', 'sortino_ratio',
+             'calmar_ratio'.
+    """
+    equity = np.atleast_2d(np.asarray(equity, dtype=np.float64))
+    n_runs, n_bars = equity.shape
+    initial_capital = np.broadcast_to(np.asarray(initial_capital, dtype=np.float64), (n_runs,))
+    if final_value is None:
+        final_value = equity[:, -1] if n_bars else initial_capital
+    final_value = np.broadcast_to(np.asarray(final_value, dtype=np.float64), (n_runs,))
+    annualization = periods_per_year(timeframe)
+    metrics = {
+        "final_value": final_value.copy(),
+        "total_return_percent": (final_value - initial_capital) / initial_capital * 100,
+        "annualized_return_percent": np.zeros(n_runs),
+        "max_drawdown_percent": np.zeros(n_runs),
+        "max_drawdown_duration": np.zeros(n_runs, dtype=np.int64),
+        "sharpe_ratio": np.zeros(n_runs),
+        "sortino_ratio": np.zeros(n_runs),
+        "calmar_ratio": np.zeros(n_runs),
+    }
+    if n_bars < 2:
+        return metrics
+
+    peak = np.maximum.accumulate(equity, axis=1)
+    drawdown = (peak - equity) / peak
+    metrics["max_drawdown_percent"] = drawdown.max(axis=1) * 100
+    # Длительность просадки — число баров с момента последнего максимума
+    bars = np.arange(n_bars)
+    last_peak = np.maximum.accumulate(np.where(equity >= peak, bars, 0), axis=1)
+    metrics["max_drawdown_duration"] = (bars - last_peak).max(axis=1)
+
+    returns = equity[:, 1:] / equity[:, :-1] - 1
+    mean = returns.mean(axis=1)
+    std = returns.std(axis=1, ddof=1) if returns.shape[1] > 1 else np.zeros(n_runs)
+    downside = np.sqrt((np.minimum(returns, 0) ** 2).mean(axis=1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        metrics["sharpe_ratio"] = np.where(std != 0, mean / std * np.sqrt(annualization), 0.0)
+        metrics["sortino_ratio"] = np.where(downside != 0, mean / downside * np.sqrt(annualization), 0.0)
+        growth = np.where(final_value > 0, final_value / initial_capital, 0.0)
+        annualized = (growth ** (annualization / (n_bars - 1)) - 1) * 100
+        metrics["annualized_return_percent"] = annualized
+        metrics["calmar_ratio"] = np.where(metrics["max_drawdown_percent"] != 0,
+                                           annualized / metrics["max_drawdown_percent"], 0.0)
+    return metrics
+
+
+def orders_to_trades(orders: list):
+    """
+    Сопоставляет покупки и последующие продажи из списка ордеров run_backtest.
+
+    :param orders: Список ордеров.
+    :return: Кортеж массивов (entry_prices, exit_prices).
+    """
+    entries, exits = [], []
+    entry_price = None
+    for order in orders:
+        if order["action"] == "buy":
+            entry_price = order["price"]
+        elif entry_price is not None:
+            entries.append(entry_price)
+            exits.append(order["price"])
+            entry_price = None
+    return np.array(entries, dtype=np.float64), np.array(exits, dtype=np.float64)
+
+
+def trade_returns(entry_prices: np.ndarray, exit_prices: np.ndarray, commission: float) -> np.ndarray:
+    """Доходность сделок с учетом комиссии на входе и выходе (позиция на весь капитал, как в run_backtest)."""
+    return exit_prices / entry_prices * (1 - commission) ** 2 - 1
+
+
+def batch_trade_metrics(returns: np.ndarray, run_ids=None, n_runs: int = 1) -> dict:
+    """
+    Метрики сделок для многих прогонов с разным числом сделок.
+
+    :param returns: Доходности всех сделок всех прогонов одним массивом.
+    :param run_ids: Номер прогона для каждой сделки (по умолчанию все сделки одного прогона).
+    :param n_runs: Количество прогонов.
+    :return: Словарь массивов по прогонам: 'num_trades', 'win_rate', 'average_trade_percent', 'profit_factor'.
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    run_ids = np.zeros(len(returns), dtype=np.int64) if run_ids is None else np.asarray(run_ids)
+    count = np.bincount(run_ids, minlength=n_runs)
+    wins = np.bincount(run_ids, weights=returns > 0, minlength=n_runs)
+    total = np.bincount(run_ids, weights=returns, minlength=n_runs)
+    gains = np.bincount(run_ids, weights=np.maximum(returns, 0), minlength=n_runs)
+    losses = np.bincount(run_ids, weights=np.maximum(-returns, 0), minlength=n_runs)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            "num_trades": count,
+            "win_rate": np.where(count > 0, wins / count, 0.0),
+            "average_trade_percent": np.where(count > 0, total / count * 100, 0.0),
+            # Без убыточных сделок profit factor бесконечен
+            "profit_factor": np.where(losses > 0, gains / losses, np.where(gains > 0, np.inf, 0.0)),
+        }
+
+
+def compute_metrics(equity: np.ndarray, initial_capital: float, final_value: float = None, orders: list = None,
+                    commission: float = 0.0, timeframe=None, exposure: float = None) -> dict:
+    """
+    Полный набор метрик одного прогона по кривой капитала и ордерам.
+
+    :param equity: Кривая стоимости портфеля.
+    :param initial_capital: Начальный капитал.
+    :param final_value: Итоговый капитал после закрытия позиции.
+    :param orders: Список ордеров run_backtest.
+    :param commission: Комиссия за сделку (для доходности сделок).
+    :param timeframe: Таймфрейм для аннуализации.
+    :param exposure: Доля баров с открытой позицией.
+    :return: Словарь метрик.
+    """
+    equity_metrics = batch_equity_metrics(equity, initial_capital, final_value, timeframe)
+    metrics = {key: value[0].item() for key, value in equity_metrics.items()}
+    if orders is not None:
+        entry_prices, exit_prices = orders_to_trades(orders)
+        trades = batch_trade_metrics(trade_returns(entry_prices, exit_prices, commission))
+        metrics.update({key: value[0].item() for key, value in trades.items()})
+    if exposure is not None:
+        metrics["exposure_percent"] = exposure * 100
+    return metrics
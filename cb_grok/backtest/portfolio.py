@@ -0,0 +1,196 @@
+import numpy as np
+import pandas as pd
+from cb_grok.backtest.metrics import compute_metrics
+
+SIZING_RULES = ('equal', 'fixed_fraction', 'atr_risk')
+
+
+def align_strategy_frames(frames: dict) -> dict:
+    """
+    Выравнивает результаты стратегий нескольких символов по общей временной оси.
+
+    :param frames: Словарь {symbol: DataFrame с колонками 'signal', 'open', 'close', 'atr'}.
+    :return: Словарь с матрицами (символ x бар) 'open', 'close', 'atr', 'signal', списком 'symbols' и 'index'.
+    """
+    symbols = list(frames)
+    index = frames[symbols[0]].index
+    for symbol in symbols[1:]:
+        index = index.union(frames[symbol].index)
+
+    matrices = {'symbols': symbols, 'index': index}
+    for column in ['open', 'close', 'atr']:
+        # Цены протягиваются вперёд на пропусках, до листинга остаются NaN
+        matrices[column] = np.vstack([frames[s][column].reindex(index).ffill().to_numpy(dtype=np.float64)
+                                      for s in symbols])
+    matrices['signal'] = np.vstack([frames[s]['signal'].reindex(index).fillna(0).to_numpy(dtype=np.int8)
+                                    for s in symbols])
+    return matrices
+
+
+def _per_symbol(value, n_symbols):
+    return np.broadcast_to(np.asarray(value, dtype=np.float64), (n_symbols,)).copy()
+
+
+def run_portfolio_backtest(open_prices: np.ndarray, close_prices: np.ndarray, atr: np.ndarray, signals: np.ndarray,
+                           initial_capital: float, commission: float, stop_loss_multiplier=1.5,
+                           take_profit_multiplier=3.0, slippage_percent: float = 0.001, spread: float = 0.0002,
+                           sizing: str = 'equal', max_positions: int = None, fraction: float = 0.1,
+                           symbols=None, index=None, timeframe: str = None):
+    """
+    Выполняет бэктест портфеля символов с общим капиталом.
+
+    Правила входа, выхода и исполнения совпадают с run_backtest (вход и выход по open следующего бара,
+    стоп-лосс и тейк-профит по ATR), а цикл идёт по барам с векторными операциями по всем символам сразу.
+    Для одного символа с sizing='equal' результат совпадает с run_backtest.
+
+    :param open_prices: Матрица цен открытия (символ x бар).
+    :param close_prices: Матрица цен закрытия (символ x бар).
+    :param atr: Матрица ATR (символ x бар).
+    :param signals: Матрица сигналов 1/0/-1 (символ x бар).
+    :param initial_capital: Начальный капитал.
+    :param commission: Комиссия за сделку.
+    :param stop_loss_multiplier: Множитель ATR для стоп-лосса (число или вектор по символам).
+    :param take_profit_multiplier: Множитель ATR для тейк-профита (число или вектор по символам).
+    :param slippage_percent: Процент проскальзывания.
+    :param spread: Спред (в процентах).
+    :param sizing: Правило размера позиции: 'equal' — доля капитала 1/max_positions,
+                   'fixed_fraction' — доля fraction от капитала, 'atr_risk' — риск fraction капитала до стоп-лосса.
+    :param max_positions: Максимальное число одновременно открытых позиций (по умолчанию — число символов).
+    :param fraction: Доля капитала для 'fixed_fraction' и 'atr_risk'.
+    :param symbols: Имена символов для атрибуции.
+    :param index: Временная ось для кривой капитала.
+    :param timeframe: Таймфрейм баров для аннуализации метрик.
+    :return: Кортеж (equity, attribution, metrics): кривая капитала портфеля, DataFrame атрибуции по символам
+             и словарь метрик портфеля.
+    """
+    if sizing not in SIZING_RULES:
+        raise ValueError(f"Неизвестное правило размера позиции: {sizing}. Используйте {', '.join(SIZING_RULES)}")
+    open_prices = np.asarray(open_prices, dtype=np.float64)
+    close_prices = np.asarray(close_prices, dtype=np.float64)
+    atr = np.asarray(atr, dtype=np.float64)
+    signals = np.asarray(signals)
+    if not (open_prices.shape == close_prices.shape == atr.shape == signals.shape):
+        raise ValueError("Матрицы open, close, atr и signal должны иметь одинаковую форму (символ x бар)")
+
+    n_symbols, n_bars = close_prices.shape
+    max_positions = max_positions or n_symbols
+    symbols = list(symbols) if symbols is not None else [str(i) for i in range(n_symbols)]
+    stop_mult = _per_symbol(stop_loss_multiplier, n_symbols)
+    take_mult = _per_symbol(take_profit_multiplier, n_symbols)
+    cost = slippage_percent + spread
+
+    # Цена исполнения на open следующего бара, как в run_backtest. Матрицы транспонируются (бар x символ),
+    # чтобы в цикле по барам читались непрерывные строки
+    next_open = np.ascontiguousarray((open_prices[:, 1:] * np.where(signals[:, :-1] == 1, 1 + cost, 1 - cost)).T)
+    close_rows = np.ascontiguousarray(close_prices.T)
+    closes = np.nan_to_num(close_rows)
+    atr_rows = np.ascontiguousarray(np.nan_to_num(atr.T))
+    buy_rows = np.ascontiguousarray((signals == 1).T)
+    buy_rows[:-1] &= ~np.isnan(next_open)
+    sell_rows = np.ascontiguousarray((signals == -1).T)
+    has_buy = buy_rows.any(axis=1)
+
+    cash = float(initial_capital)
+    assets = np.zeros(n_symbols)
+    cost_basis = np.zeros(n_symbols)
+    stop_loss = np.zeros(n_symbols)
+    take_profit = np.zeros(n_symbols)
+    realized = np.zeros(n_symbols)
+    fees = np.zeros(n_symbols)
+    num_trades = np.zeros(n_symbols, dtype=np.int64)
+    num_wins = np.zeros(n_symbols, dtype=np.int64)
+    exits_by_reason = {'stop_loss': 0, 'take_profit': 0, 'signal': 0, 'end_of_backtest': 0}
+    assets_history = np.zeros((n_bars, n_symbols))
+    cash_history = np.full(n_bars, cash)
+    open_positions = 0
+
+    for i in range(n_bars - 1):
+        if open_positions:
+            close = close_rows[i]
+            held = assets > 0
+            exits = held & ((close <= stop_loss) | (close >= take_profit) | sell_rows[i])
+            if exits.any():
+                idx = np.flatnonzero(exits)
+                hit_stop = close[idx] <= stop_loss[idx]
+                hit_take = ~hit_stop & (close[idx] >= take_profit[idx])
+                gross = assets[idx] * next_open[i, idx] * (1 - cost)
+                proceeds = gross * (1 - commission)
+                pnl = proceeds - cost_basis[idx]
+                cash += proceeds.sum()
+                realized[idx] += pnl
+                fees[idx] += gross * commission
+                num_trades[idx] += 1
+                num_wins[idx] += pnl > 0
+                assets[idx] = 0.0
+                open_positions -= len(idx)
+                exits_by_reason['stop_loss'] += int(hit_stop.sum())
+                exits_by_reason['take_profit'] += int(hit_take.sum())
+                exits_by_reason['signal'] += int(len(idx) - hit_stop.sum() - hit_take.sum())
+
+        if has_buy[i] and cash > 0 and open_positions < max_positions:
+            entries = buy_rows[i] & (assets == 0)
+            if entries.any():
+                candidates = np.flatnonzero(entries)[:max_positions - open_positions]
+                buy_price = next_open[i, candidates] * (1 + cost)
+                equity = cash + assets @ closes[i]
+                if sizing == 'equal':
+                    desired = np.full(len(candidates), equity / max_positions)
+                elif sizing == 'fixed_fraction':
+                    desired = np.full(len(candidates), equity * fraction)
+                else:
+                    risk_per_unit = atr_rows[i, candidates] * stop_mult[candidates]
+                    # Без валидного ATR риск до стоп-лосса не определён, и позиция не открывается
+                    with np.errstate(divide='ignore', invalid='ignore'):
+                        desired = np.where(risk_per_unit > 0, equity * fraction / risk_per_unit * buy_price, 0.0)
+                desired = np.minimum(desired, cash)
+                # Если кандидатов больше, чем свободного капитала, делим его пропорционально
+                total = desired.sum()
+                if total > cash:
+                    desired *= cash / total
+                assets[candidates] = desired / buy_price * (1 - commission)
+                cost_basis[candidates] = desired
+                fees[candidates] += desired * commission
+                cash -= desired.sum()
+                stop_loss[candidates] = buy_price - atr_rows[i, candidates] * stop_mult[candidates]
+                take_profit[candidates] = buy_price + atr_rows[i, candidates] * take_mult[candidates]
+                open_positions = int((assets > 0).sum())
+
+        if open_positions:
+            assets_history[i + 1] = assets
+        cash_history[i + 1] = cash
+
+    equity = cash_history + (assets_history * closes).sum(axis=1)
+
+    # Закрытие оставшихся позиций в конце бэктеста
+    held = assets > 0
+    if held.any():
+        gross = assets[held] * closes[-1, held] * (1 - cost)
+        proceeds = gross * (1 - commission)
+        pnl = proceeds - cost_basis[held]
+        cash += proceeds.sum()
+        realized[held] += pnl
+        fees[held] += gross * commission
+        num_trades[held] += 1
+        num_wins[held] += pnl > 0
+        exits_by_reason['end_of_backtest'] += int(held.sum())
+
+    exposure = (assets_history[1:] > 0).mean(axis=0) if n_bars > 1 else np.zeros(n_symbols)
+    attribution = pd.DataFrame({
+        "symbol": symbols,
+        "pnl": realized,
+        "contribution_percent": realized / initial_capital * 100,
+        "fees": fees,
+        "num_trades": num_trades,
+        "win_rate": np.divide(num_wins, num_trades, out=np.zeros(n_symbols), where=num_trades > 0),
+        "exposure": exposure,
+    })
+
+    equity_series = pd.Series(equity[1:], index=index[1:] if index is not None else None, name='portfolio_value')
+    if len(equity_series) > 1:
+        metrics = compute_metrics(equity_series.to_numpy(), initial_capital, cash, timeframe=timeframe,
+                                  exposure=float((assets_history[1:] > 0).any(axis=1).mean()))
+    else:
+        metrics = {"final_value": cash, "total_return_percent": 0, "max_drawdown_percent": 0, "sharpe_ratio": 0}
+    metrics["num_trades"] = int(num_trades.sum())
+    metrics["exits_by_reason"] = exits_by_reason
+    return equity_series, attribution, metrics
@@ -0,0 +1,244 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from cb_grok.backtest.batch import batch_backtest
+from cb_grok.backtest.metrics import batch_equity_metrics, periods_per_year
+from cb_grok.strategies.moving_average_strategy import StreamingMovingAverageStrategy
+
+REPORT_METRICS = ["sharpe_ratio", "max_drawdown_percent", "final_value"]
+
+
+def block_bootstrap_indices(n_items: int, n_samples: int, block_size: int, rng, start: int = 0) -> np.ndarray:
+    """
+    Индексы moving block bootstrap: каждая выборка склеивается из случайных блоков подряд идущих элементов.
+
+    :param n_items: Длина исходного ряда.
+    :param n_samples: Количество выборок.
+    :param block_size: Длина блока (сохраняет автокорреляцию внутри блока).
+    :param rng: Генератор случайных чисел NumPy.
+    :param start: Первый допустимый индекс.
+    :return: Матрица индексов (выборка x элемент) длиной n_items - start.
+    """
+    length = n_items - start
+    block_size = max(1, min(block_size, length))
+    n_blocks = -(-length // block_size)
+    starts = rng.integers(start, n_items - block_size + 1, size=(n_samples, n_blocks))
+    indices = starts[:, :, None] + np.arange(block_size)
+    return indices.reshape(n_samples, -1)[:, :length]
+
+
+def bootstrap_price_paths(open_prices, high, low, close, indices):
+    """
+    Строит синтетические ценовые пути из баров исходного ряда в порядке indices.
+
+    Бар j исходного ряда переносится целиком и масштабируется так, чтобы его движение от предыдущего
+    закрытия сохранилось: соотношения open/high/low/close внутри бара остаются прежними.
+
+    :param indices: Матрица индексов баров (путь x бар) из диапазона 1..n-1.
+    :return: Кортеж матриц (open, high, low, close) размера (путь x n).
+    """
+    growth = np.cumprod(close[indices] / close[indices - 1], axis=1)
+    path_close = close[0] * growth
+    previous_close = np.hstack([np.full((len(indices), 1), close[0]), path_close[:, :-1]])
+    scale = previous_close / close[indices - 1]
+    first = np.ones((len(indices), 1))
+    return (np.hstack([first * open_prices[0], open_prices[indices] * scale]),
+            np.hstack([first * high[0], high[indices] * scale]),
+            np.hstack([first * low[0], low[indices] * scale]),
+            np.hstack([first * close[0], path_close]))
+
+
+def perturb_costs(slippage_percent, spread, n, rng, cost_range=(0.5, 2.0)):
+    """Случайные множители проскальзывания и спреда в диапазоне cost_range."""
+    return (slippage_percent * rng.uniform(*cost_range, n), spread * rng.uniform(*cost_range, n))
+
+
+def _paths_worker(task):
+    """Прогон пакета синтетических путей в отдельном процессе."""
+    (prices, strategy_params, execution, n_paths, block_size, cost_range, timeframe, seed) = task
+    rng = np.random.default_rng(seed)
+    open_prices, high, low, close = prices
+    indices = block_bootstrap_indices(len(close), n_paths, block_size, rng, start=1)
+    path_open, path_high, path_low, path_close = bootstrap_price_paths(open_prices, high, low, close, indices)
+    signals = np.empty(path_close.shape, dtype=np.int8)
+    atr = np.empty(path_close.shape)
+    for k in range(n_paths):
+        strategy = StreamingMovingAverageStrategy(**strategy_params)
+        signals[k], atr[k] = strategy.update(path_high[k], path_low[k], path_close[k])
+    slippage, spread = perturb_costs(execution["slippage_percent"], execution["spread"], n_paths, rng, cost_range)
+    result = batch_backtest(path_open, path_close, atr, signals, execution["commission"],
+                            execution["stop_loss_multiplier"], execution["take_profit_multiplier"], slippage, spread,
+                            execution["initial_capital"])
+    metrics = batch_equity_metrics(result["equity"], execution["initial_capital"], result["final_value"], timeframe)
+    return {key: metrics[key] for key in REPORT_METRICS}
+
+
+def confidence_intervals(samples: dict, initial_capital: float, confidence: float = 0.95) -> dict:
+    """Доверительные интервалы (перцентили) метрик по выборкам Monte Carlo."""
+    tail = (1 - confidence) / 2 * 100
+    report = {}
+    for key, values in samples.items():
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            continue
+        lower, median, upper = np.percentile(values, [tail, 50, 100 - tail])
+        report[key] = {"mean": float(values.mean()), "lower": float(lower), "median": float(median),
+                       "upper": float(upper)}
+    if "final_value" in samples:
+        report["probability_of_loss"] = float((np.asarray(samples["final_value"]) < initial_capital).mean())
+    return report
+
+
+def analyze_robustness(strategy_data, strategy_params, initial_capital, commission, stop_loss_multiplier,
+                       take_profit_multiplier, slippage_percent=0.001, spread=0.0002, timeframe=None,
+                       n_simulations=1000, block_size=24, cost_range=(0.5, 2.0), confidence=0.95,
+                       n_workers=None, batch_size=100, seed=None, logger=None):
+    """
+    Оценка устойчивости модели методами Monte Carlo и bootstrap.
+
+    Анализы:
+    - 'trades': перестановка сделок с возвращением — чувствительность к порядку и составу сделок;
+    - 'returns': block bootstrap доходностей стратегии по барам;
+    - 'costs': та же история со случайными проскальзыванием и спредом (cost_range от базовых);
+    - 'paths': block bootstrap баров рынка, пересчет индикаторов, сигналов и бэктеста на каждом
+      синтетическом пути со случайными издержками; распределяется по пулу процессов.
+    Все прогоны идут через пакетный путь на массивах (batch_backtest, batch_equity_metrics).
+
+    :param strategy_data: DataFrame moving_average_strategy (колонки 'open', 'high', 'low', 'close', 'atr', 'signal').
+    :param strategy_params: Параметры moving_average_strategy (для пересчета на синтетических путях).
+    :param initial_capital: Начальный капитал.
+    :param commission: Комиссия за сделку.
+    :param stop_loss_multiplier: Множитель ATR для стоп-лосса.
+    :param take_profit_multiplier: Множитель ATR для тейк-профита.
+    :param slippage_percent: Базовый процент проскальзывания.
+    :param spread: Базовый спред.
+    :param timeframe: Таймфрейм для аннуализации.
+    :param n_simulations: Количество прогонов каждого анализа.
+    :param block_size: Длина блока bootstrap в барах.
+    :param cost_range: Диапазон множителей издержек.
+    :param confidence: Уровень доверительных интервалов.
+    :param n_workers: Количество процессов (по умолчанию — число ядер).
+    :param batch_size: Количество путей в одной задаче пула.
+    :param seed: Зерно генератора для воспроизводимости.
+    :param logger: Объект для логирования.
+    :return: Словарь с базовыми метриками и доверительными интервалами каждого анализа.
+    """
+    open_prices, high, low, close, atr = (strategy_data[c].to_numpy(dtype=np.float64)
+                                          for c in ['open', 'high', 'low', 'close', 'atr'])
+    signals = strategy_data['signal'].to_numpy()
+    seed_sequence = np.random.SeedSequence(seed)
+    rng = np.random.default_rng(seed_sequence.spawn(1)[0])
+    execution = dict(initial_capital=initial_capital, commission=commission,
+                     stop_loss_multiplier=stop_loss_multiplier, take_profit_multiplier=take_profit_multiplier,
+                     slippage_percent=slippage_percent, spread=spread)
+
+    base = batch_backtest(open_prices, close, atr, signals, commission, stop_loss_multiplier, take_profit_multiplier,
+                          slippage_percent, spread, initial_capital)
+    base_metrics = batch_equity_metrics(base["equity"], initial_capital, base["final_value"], timeframe)
+    report = {"base": {key: float(base_metrics[key][0]) for key in REPORT_METRICS},
+              "n_simulations": n_simulations, "block_size": block_size, "confidence": confidence}
+
+    # Перестановка сделок: кривая капитала по сделкам
+    trades = base["trade_returns"]
+    if len(trades) > 1:
+        sampled = trades[rng.integers(0, len(trades), size=(n_simulations, len(trades)))]
+        trade_equity = initial_capital * np.cumprod(1 + sampled, axis=1)
+        trades_per_year = len(trades) / (len(close) / periods_per_year(timeframe))
+        trade_metrics = batch_equity_metrics(np.hstack([np.full((n_simulations, 1), float(initial_capital)),
+                                                        trade_equity]), initial_capital)
+        std = sampled.std(axis=1, ddof=1)
+        trade_metrics["sharpe_ratio"] = np.where(std > 0, sampled.mean(axis=1) / np.where(std > 0, std, 1)
+                                                 * np.sqrt(trades_per_year), 0.0)
+        report["trades"] = confidence_intervals({k: trade_metrics[k] for k in REPORT_METRICS}, initial_capital,
+                                                confidence)
+
+    # Block bootstrap доходностей стратегии по барам
+    equity = np.concatenate(([initial_capital], base["equity"][0]))
+    returns = equity[1:] / equity[:-1] - 1
+    if len(returns) > 1:
+        indices = block_bootstrap_indices(len(returns), n_simulations, block_size, rng)
+        boot_equity = initial_capital * np.cumprod(1 + returns[indices], axis=1)
+        boot_metrics = batch_equity_metrics(boot_equity, initial_capital, timeframe=timeframe)
+        report["returns"] = confidence_intervals({k: boot_metrics[k] for k in REPORT_METRICS}, initial_capital,
+                                                 confidence)
+
+    # Случайные издержки на исходной истории
+    slippage, spreads = perturb_costs(slippage_percent, spread, n_simulations, rng, cost_range)
+    costs = batch_backtest(open_prices, close, atr, signals, commission, stop_loss_multiplier, take_profit_multiplier,
+                           slippage, spreads, initial_capital)
+    cost_metrics = batch_equity_metrics(costs["equity"], initial_capital, costs["final_value"], timeframe)
+    report["costs"] = confidence_intervals({k: cost_metrics[k] for k in REPORT_METRICS}, initial_capital, confidence)
+
+    # Синтетические пути рынка в пуле процессов
+    sizes = [min(batch_size, n_simulations - start) for start in range(0, n_simulations, batch_size)]
+    seeds = seed_sequence.spawn(len(sizes) + 1)[1:]
+    tasks = [((open_prices, high, low, close), strategy_params, execution, size, block_size, cost_range, timeframe,
+              task_seed) for size, task_seed in zip(sizes, seeds)]
+    samples = {key: [] for key in REPORT_METRICS}
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        for done, result in enumerate(executor.map(_paths_worker, tasks), start=1):
+            for key in REPORT_METRICS:
+                samples[key].append(result[key])
+            if logger:
+                logger.info(f"Синтетические пути: обработано {done} из {len(tasks)} пакетов")
+    report["paths"] = confidence_intervals({k: np.concatenate(v) for k, v in samples.items()}, initial_capital,
+                                           confidence)
+    return report
+
+
+def run_robustness(filename, initial_capital, commission, n_simulations=1000, block_size=24, n_workers=None,
+                   seed=None, folder="library/robustness", logger=None):
+    """
+    Анализ устойчивости сохраненной модели из library/best_models_params перед запуском в live.
+
+    :param filename: Имя файла модели.
+    :param initial_capital: Начальный капитал.
+    :param commission: Комиссия за сделку.
+    :param n_simulations: Количество прогонов каждого анализа.
+    :param block_size: Длина блока bootstrap в барах.
+    :param n_workers: Количество процессов.
+    :param seed: Зерно генератора.
+    :param folder: Папка для отчета (имя отчета совпадает с именем модели).
+    :param logger: Объект для логирования.
+    :return: Словарь отчета.
+    """
+    from cb_grok.adapters.exchange_adapter import get_exchange_adapter
+    from cb_grok.run_model import load_model, strategy_params_from_model
+    from cb_grok.strategies.moving_average_strategy import moving_average_strategy
+
+    model_params = load_model(filename)
+    strategy_params = strategy_params_from_model(model_params)
+    data = get_exchange_adapter().fetch_ohlcv(model_params["symbol"], model_params["timeframe"], model_params["limit"])
+    strategy_data = moving_average_strategy(data, **strategy_params, debug=False)
+    report = analyze_robustness(strategy_data, strategy_params, initial_capital, commission,
+                                model_params["stop_loss_multiplier"], model_params["take_profit_multiplier"],
+                                timeframe=model_params["timeframe"], n_simulations=n_simulations,
+                                block_size=block_size, n_workers=n_workers, seed=seed, logger=logger)
+    report["model"] = filename
+
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    with open(os.path.join(folder, filename), 'w') as f:
+        json.dump(report, f, indent=4)
+    if logger:
+        logger.info(f"Отчет об устойчивости сохранен в {os.path.join(folder, filename)}")
+    return report
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Анализ устойчивости модели (Monte Carlo и bootstrap)")
+    parser.add_argument("filename", type=str, help="Имя файла с параметрами модели")
+    parser.add_argument("initial_capital", type=float, help="Начальный капитал")
+    parser.add_argument("commission", type=float, help="Комиссия за сделку")
+    parser.add_argument("--n_simulations", type=int, default=1000, help="Количество прогонов каждого анализа")
+    parser.add_argument("--block_size", type=int, default=24, help="Длина блока bootstrap в барах")
+    parser.add_argument("--workers", type=int, default=None, help="Количество процессов")
+    parser.add_argument("--seed", type=int, default=None, help="Зерно генератора случайных чисел")
+
+    args = parser.parse_args()
+    report = run_robustness(args.filename, args.initial_capital, args.commission, args.n_simulations,
+                            args.block_size, args.workers, args.seed)
+    print(json.dumps(report, indent=4))
@@ -0,0 +1,337 @@
+import itertools
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from cb_grok.backtest.batch import batch_backtest
+from cb_grok.backtest.metrics import batch_equity_metrics
+from cb_grok.indicators.indicators import calculate_rsi, calculate_atr
+from cb_grok.strategies.moving_average_strategy import calculate_adx, signals_from_indicators
+
+# Периоды меняются на ±k баров, пороги и множители — на ±x% от значения модели
+PERIOD_PARAMS = ["short_period", "long_period", "rsi_period", "atr_period", "ema_short_period", "ema_long_period",
+                 "adx_period"]
+THRESHOLD_PARAMS = ["buy_rsi_threshold", "sell_rsi_threshold", "adx_threshold", "atr_threshold",
+                    "stop_loss_multiplier", "take_profit_multiplier"]
+# Параметры, которые влияют на сигналы только при включенном фильтре
+FILTER_PARAMS = {
+    "use_rsi_filter": ["rsi_period", "buy_rsi_threshold", "sell_rsi_threshold"],
+    "use_trend_filter": ["ema_short_period", "ema_long_period"],
+    "use_adx_filter": ["adx_period", "adx_threshold"],
+}
+
+
+def active_params(model_params):
+    """Числовые параметры модели, изменение которых меняет результат (параметры выключенных фильтров исключаются)."""
+    inactive = {name for flag, names in FILTER_PARAMS.items() if not model_params.get(flag, False) for name in names}
+    return [name for name in PERIOD_PARAMS + THRESHOLD_PARAMS if name in model_params and name not in inactive]
+
+
+def neighbor_grid(model_params, period_radius=2, threshold_percent=10.0, threshold_steps=2, n_neighbors=2000,
+                  params=None, seed=None):
+    """
+    Соседи параметров модели на сетке смещений.
+
+    Каждый период получает смещения -period_radius..period_radius баров, каждый порог и множитель —
+    2 * threshold_steps + 1 значений в пределах ±threshold_percent %. Если полная сетка (произведение по всем
+    параметрам) не больше n_neighbors, она берется целиком, иначе — n_neighbors случайных узлов сетки.
+    Первая строка — сама модель (все смещения нулевые).
+
+    :param model_params: Параметры модели.
+    :param period_radius: Радиус смещения периодов в барах.
+    :param threshold_percent: Максимальное относительное смещение порогов и множителей в процентах.
+    :param threshold_steps: Количество шагов смещения порогов в каждую сторону.
+    :param n_neighbors: Максимальное количество соседей.
+    :param params: Изменяемые параметры (по умолчанию active_params).
+    :param seed: Зерно генератора для выборки узлов.
+    :return: DataFrame: колонки параметров с их значениями и колонки 'offset_<параметр>' со смещением в шагах.
+    """
+    params = params or active_params(model_params)
+    offsets = {}
+    for name in params:
+        if name in PERIOD_PARAMS:
+            offsets[name] = np.arange(-period_radius, period_radius + 1)
+        else:
+            offsets[name] = np.arange(-threshold_steps, threshold_steps + 1)
+    sizes = [len(offsets[name]) for name in params]
+
+    if np.prod(sizes, dtype=float) <= n_neighbors:
+        grid = np.array(list(itertools.product(*(range(size) for size in sizes))), dtype=np.int64).reshape(-1, len(params))
+    else:
+        rng = np.random.default_rng(seed)
+        grid = np.unique(np.column_stack([rng.integers(0, size, n_neighbors) for size in sizes]), axis=0)
+    center = np.array([size // 2 for size in sizes], dtype=np.int64)
+    grid = np.vstack([center, grid[(grid != center).any(axis=1)]])[:max(n_neighbors, 1)]
+
+    neighbors = {}
+    for k, name in enumerate(params):
+        step = grid[:, k] - center[k]
+        base = model_params[name]
+        if name in PERIOD_PARAMS:
+            neighbors[name] = np.maximum(1, int(base) + step)
+        else:
+            neighbors[name] = base * (1 + threshold_percent / 100 * step / max(threshold_steps, 1))
+        neighbors[f"offset_{name}"] = step
+    return pd.DataFrame(neighbors)
+
+
+class _IndicatorCache:
+    """Индикаторы валидационного набора для каждого встретившегося периода (считаются один раз)."""
+
+    def __init__(self, data):
+        self.data = data
+        self.close = data['close']
+        self._cache = {}
+
+    def get(self, kind, period):
+        key = (kind, int(period))
+        if key not in self._cache:
+            period = int(period)
+            if kind == "ma":
+                values = self.close.rolling(window=period, min_periods=1).mean()
+            elif kind == "ema":
+                values = self.close.ewm(span=period, adjust=False, min_periods=1).mean()
+            elif kind == "rsi":
+                values = calculate_rsi(self.data[['close']].copy(), period)['rsi']
+            elif kind == "atr":
+                values = calculate_atr(self.data[['high', 'low', 'close']].copy(), period)['atr']
+            else:
+                values = calculate_adx(self.data[['high', 'low', 'close']].copy(), period)['adx']
+            self._cache[key] = values.to_numpy(dtype=np.float64)
+        return self._cache[key]
+
+
+def evaluate_neighbors(data, model_params, neighbors, initial_capital, commission, timeframe=None,
+                       slippage_percent=0.001, spread=0.0002, batch_size=1000):
+    """
+    Оценивает всех соседей на одном наборе данных одним пакетным бэктестом.
+
+    Индикаторы считаются один раз на каждый встретившийся период, сигналы — по массивам
+    (signals_from_indicators), а сделки всех соседей моделируются batch_backtest с теми же правилами,
+    что run_backtest, пакетами по batch_size соседей.
+
+    :param data: DataFrame OHLCV (например, валидационный набор).
+    :param model_params: Параметры модели (значения параметров, которых нет в neighbors).
+    :param neighbors: DataFrame neighbor_grid.
+    :param initial_capital: Начальный капитал.
+    :param commission: Комиссия.
+    :param timeframe: Таймфрейм для аннуализации.
+    :param slippage_percent: Процент проскальзывания.
+    :param spread: Спред.
+    :param batch_size: Количество соседей в одном пакетном бэктесте.
+    :return: Копия neighbors с колонками метрик ('sharpe_ratio', 'total_return_percent', 'max_drawdown_percent',
+             'num_orders', ...); соседи, которым не хватает данных для самого длинного периода, получают NaN.
+    """
+    cache = _IndicatorCache(data)
+    open_prices = data['open'].to_numpy(dtype=np.float64)
+    close = data['close'].to_numpy(dtype=np.float64)
+    n_bars = len(close)
+    rows = [dict(model_params, **row) for row in neighbors.to_dict('records')]
+    n = len(rows)
+
+    signals = np.zeros((n, n_bars), dtype=np.int8)
+    atr = np.zeros((n, n_bars))
+    valid = np.zeros(n, dtype=bool)
+    for k, params in enumerate(rows):
+        use_trend_filter = params.get("use_trend_filter", True)
+        use_rsi_filter = params.get("use_rsi_filter", True)
+        use_adx_filter = params.get("use_adx_filter", False)
+        required = max(params["long_period"], params["ema_long_period"], params["adx_period"] if use_adx_filter else 0)
+        if n_bars < required:
+            continue
+        valid[k] = True
+        atr[k] = cache.get("atr", params["atr_period"])
+        signals[k] = signals_from_indicators(
+            cache.get("ma", params["short_period"]), cache.get("ma", params["long_period"]),
+            cache.get("rsi", params["rsi_period"]) if use_rsi_filter else None,
+            cache.get("ema", params["ema_short_period"]) if use_trend_filter else None,
+            cache.get("ema", params["ema_long_period"]) if use_trend_filter else None, atr[k],
+            cache.get("adx", params["adx_period"]) if use_adx_filter else None,
+            params["buy_rsi_threshold"], params["sell_rsi_threshold"], use_trend_filter, use_rsi_filter,
+            use_adx_filter, params.get("adx_threshold", 25.0), params.get("atr_threshold", 0.0))
+
+    stop_loss = np.array([params["stop_loss_multiplier"] for params in rows], dtype=np.float64)
+    take_profit = np.array([params["take_profit_multiplier"] for params in rows], dtype=np.float64)
+    columns = ["sharpe_ratio", "sortino_ratio", "total_return_percent", "max_drawdown_percent", "final_value"]
+    metrics = {column: np.full(n, np.nan) for column in columns}
+    num_orders = np.zeros(n, dtype=np.int64)
+    for start in range(0, n, batch_size):
+        batch = slice(start, min(n, start + batch_size))
+        result = batch_backtest(open_prices, close, atr[batch], signals[batch], commission, stop_loss[batch],
+                                take_profit[batch], slippage_percent, spread, initial_capital)
+        batch_metrics = batch_equity_metrics(result["equity"], initial_capital, result["final_value"], timeframe)
+        for column in columns:
+            metrics[column][batch] = batch_metrics[column]
+        num_orders[batch] = result["num_orders"]
+
+    results = neighbors.copy()
+    for column in columns:
+        results[column] = np.where(valid, metrics[column], np.nan)
+    results["num_orders"] = np.where(valid, num_orders, 0)
+    return results
+
+
+def stability_summary(results, tolerance=0.5, min_orders=5, metric="sharpe_ratio"):
+    """
+    Оценка устойчивости по результатам соседей (первая строка — модель).
+
+    Сосед считается устойчивым, если совершил не меньше min_orders ордеров и его метрика не хуже
+    metric модели минус tolerance * |metric модели| (при tolerance=0.5 и Sharpe 2.0 — не ниже 1.0).
+    stability_score — доля устойчивых соседей: около 1 — плато, около 0 — изолированный пик.
+
+    :return: Словарь: значение модели, порог, stability_score, медиана, 10-й перцентиль и доля положительных
+             значений метрики у соседей, количество соседей.
+    """
+    center = float(results[metric].iloc[0])
+    others = results.iloc[1:]
+    values = others[metric].to_numpy(dtype=np.float64)
+    threshold = center - tolerance * abs(center)
+    stable = (others["num_orders"].to_numpy() >= min_orders) & (values >= threshold)
+    finite = values[np.isfinite(values)]
+    return {
+        "metric": metric,
+        "model_value": center,
+        "threshold": threshold,
+        "stability_score": float(stable.mean()) if len(values) else float("nan"),
+        "neighbor_median": float(np.median(finite)) if len(finite) else float("nan"),
+        "neighbor_p10": float(np.percentile(finite, 10)) if len(finite) else float("nan"),
+        "share_positive": float((finite > 0).mean()) if len(finite) else float("nan"),
+        "n_neighbors": int(len(values)),
+        "tolerance": tolerance,
+        "min_orders": min_orders,
+    }
+
+
+def _stable_column(results, tolerance, min_orders, metric):
+    summary = stability_summary(results, tolerance, min_orders, metric)
+    return (results["num_orders"] >= min_orders) & (results[metric] >= summary["threshold"])
+
+
+def sensitivity_table(results, tolerance=0.5, min_orders=5, metric="sharpe_ratio"):
+    """
+    Чувствительность по каждому параметру: среднее и медиана метрики и доля устойчивых соседей при каждом
+    смещении параметра (по всем значениям остальных параметров).
+
+    :return: DataFrame с колонками 'param', 'offset', 'value', 'mean', 'median', 'share_stable', 'count'.
+    """
+    results = results.assign(stable=_stable_column(results, tolerance, min_orders, metric))
+    frames = []
+    for column in results.columns:
+        if not column.startswith("offset_"):
+            continue
+        name = column[len("offset_"):]
+        grouped = results.groupby(column).agg(value=(name, "first"), mean=(metric, "mean"),
+                                              median=(metric, "median"), share_stable=("stable", "mean"),
+                                              count=(metric, "size")).reset_index()
+        frames.append(grouped.rename(columns={column: "offset"}).assign(param=name))
+    if not frames:
+        return pd.DataFrame(columns=["param", "offset", "value", "mean", "median", "share_stable", "count"])
+    return pd.concat(frames, ignore_index=True)[["param", "offset", "value", "mean", "median", "share_stable", "count"]]
+
+
+def heatmap_long(results, tolerance=0.5, min_orders=5, metric="sharpe_ratio"):
+    """
+    Таблица для тепловых карт: для каждой пары параметров и каждой пары смещений — среднее метрики и доля
+    устойчивых соседей (по всем значениям остальных параметров).
+
+    :return: DataFrame с колонками 'param_x', 'offset_x', 'param_y', 'offset_y', 'mean', 'share_stable', 'count'.
+    """
+    results = results.assign(stable=_stable_column(results, tolerance, min_orders, metric))
+    names = [column[len("offset_"):] for column in results.columns if column.startswith("offset_")]
+    frames = []
+    for x, y in itertools.combinations(names, 2):
+        grouped = results.groupby([f"offset_{x}", f"offset_{y}"]).agg(
+            mean=(metric, "mean"), share_stable=("stable", "mean"), count=(metric, "size")).reset_index()
+        grouped.columns = ["offset_x", "offset_y", "mean", "share_stable", "count"]
+        frames.append(grouped.assign(param_x=x, param_y=y))
+    if not frames:
+        return pd.DataFrame(columns=["param_x", "offset_x", "param_y", "offset_y", "mean", "share_stable", "count"])
+    return pd.concat(frames, ignore_index=True)[["param_x", "offset_x", "param_y", "offset_y", "mean",
+                                                "share_stable", "count"]]
+
+
+def heatmap_table(heatmap, x, y, value="mean"):
+    """Матрица тепловой карты пары параметров из heatmap_long: строки — смещения y, колонки — смещения x."""
+    pair = heatmap[(heatmap["param_x"] == x) & (heatmap["param_y"] == y)]
+    if pair.empty:
+        pair = heatmap[(heatmap["param_x"] == y) & (heatmap["param_y"] == x)].rename(
+            columns={"offset_x": "offset_y", "offset_y": "offset_x"})
+    return pair.pivot(index="offset_y", columns="offset_x", values=value)
+
+
+def run_stability(filename, initial_capital, commission, period_radius=2, threshold_percent=10.0,
+                  threshold_steps=2, n_neighbors=2000, tolerance=0.5, min_orders=5, seed=None,
+                  folder="library/stability", logger=None):
+    """
+    Карта устойчивости сохраненной модели из library/best_models_params на валидационном наборе.
+
+    В папку folder сохраняются сводка (<модель>.json), результаты всех соседей (<модель>_neighbors.csv),
+    чувствительность по параметрам (<модель>_sensitivity.csv) и таблица тепловых карт пар параметров
+    (<модель>_heatmap.csv).
+
+    :param filename: Имя файла модели.
+    :param initial_capital: Начальный капитал.
+    :param commission: Комиссия за сделку.
+    :param period_radius: Радиус смещения периодов в барах.
+    :param threshold_percent: Смещение порогов и множителей в процентах.
+    :param threshold_steps: Шагов смещения порогов в каждую сторону.
+    :param n_neighbors: Максимальное количество соседей.
+    :param tolerance: Допустимое ухудшение метрики соседа (см. stability_summary).
+    :param min_orders: Минимум ордеров устойчивого соседа.
+    :param seed: Зерно выборки соседей.
+    :param folder: Папка отчета.
+    :param logger: Объект для логирования.
+    :return: Кортеж (сводка, результаты соседей, таблица тепловых карт).
+    """
+    from cb_grok.adapters.exchange_adapter import get_exchange_adapter
+    from cb_grok.optimization.optimization import split_train_val
+    from cb_grok.run_model import load_model
+
+    model_params = load_model(filename)
+    timeframe = model_params["timeframe"]
+    _, val_data = split_train_val(get_exchange_adapter(), model_params["symbol"], timeframe, logger)
+
+    start = time.perf_counter()
+    neighbors = neighbor_grid(model_params, period_radius, threshold_percent, threshold_steps, n_neighbors, seed=seed)
+    results = evaluate_neighbors(val_data, model_params, neighbors, initial_capital, commission, timeframe)
+    summary = stability_summary(results, tolerance, min_orders)
+    summary.update({"model": filename, "params": active_params(model_params), "period_radius": period_radius,
+                    "threshold_percent": threshold_percent, "threshold_steps": threshold_steps,
+                    "seconds": time.perf_counter() - start})
+    sensitivity = sensitivity_table(results, tolerance, min_orders)
+    heatmap = heatmap_long(results, tolerance, min_orders)
+
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    name = os.path.splitext(filename)[0]
+    with open(os.path.join(folder, f"{name}.json"), 'w') as f:
+        json.dump(summary, f, indent=4)
+    results.to_csv(os.path.join(folder, f"{name}_neighbors.csv"), index=False)
+    sensitivity.to_csv(os.path.join(folder, f"{name}_sensitivity.csv"), index=False)
+    heatmap.to_csv(os.path.join(folder, f"{name}_heatmap.csv"), index=False)
+    if logger:
+        logger.info(f"Карта устойчивости {filename}: stability_score = {summary['stability_score']:.2f}, "
+                    f"{summary['n_neighbors']} соседей за {summary['seconds']:.1f} с, отчет в {folder}")
+    return summary, results, heatmap
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Карта устойчивости модели по соседним параметрам")
+    parser.add_argument("filename", type=str, help="Имя файла с параметрами модели")
+    parser.add_argument("initial_capital", type=float, help="Начальный капитал")
+    parser.add_argument("commission", type=float, help="Комиссия за сделку")
+    parser.add_argument("--period_radius", type=int, default=2, help="Смещение периодов в барах (±k)")
+    parser.add_argument("--threshold_percent", type=float, default=10.0, help="Смещение порогов и множителей (±x%%)")
+    parser.add_argument("--threshold_steps", type=int, default=2, help="Шагов смещения порогов в каждую сторону")
+    parser.add_argument("--n_neighbors", type=int, default=2000, help="Максимальное количество соседей")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Допустимое ухудшение Sharpe Ratio соседа")
+    parser.add_argument("--seed", type=int, default=None, help="Зерно выборки соседей")
+
+    args = parser.parse_args()
+    summary, results, heatmap = run_stability(args.filename, args.initial_capital, args.commission,
+                                              args.period_radius, args.threshold_percent, args.threshold_steps,
+                                              args.n_neighbors, args.tolerance, seed=args.seed)
+    print(json.dumps(summary, indent=4))
+    print(sensitivity_table(results, args.tolerance).to_string(index=False))
@@ -0,0 +1,205 @@
+import os
+import time
+import logging
+import numpy as np
+import pandas as pd
+from cb_grok.utils.utils import timeframe_to_milliseconds, timeframe_to_minutes
+from cb_grok.utils.metrics_exporter import record_cache
+
+logger = logging.getLogger(__name__)
+
+OHLCV_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+# 1970-01-01 — четверг; недельные свечи бирж начинаются с понедельника (1970-01-05)
+WEEK_OFFSET_MS = 4 * 86400 * 1000
+
+
+def resample_ohlcv(data: pd.DataFrame, timeframe: str, drop_incomplete: bool = True) -> pd.DataFrame:
+    """
+    Строит свечи старшего таймфрейма из минутных свечей без циклов по строкам.
+
+    :param data: DataFrame с колонками 'open', 'high', 'low', 'close', 'volume' и индексом timestamp (1m).
+    :param timeframe: Целевой таймфрейм (например, '5m', '15m', '4h').
+    :param drop_incomplete: Отбросить свечи, покрытые минутными данными не полностью: первую и последнюю
+                            (история начинается или заканчивается внутри интервала) и свечи с пропущенными
+                            минутами внутри истории, как в CandleAggregator.
+    :return: DataFrame того же формата для целевого таймфрейма.
+    """
+    if data.empty or timeframe == '1m':
+        return data.copy()
+
+    tf_ms = timeframe_to_milliseconds(timeframe)
+    offset = WEEK_OFFSET_MS if timeframe.endswith('w') else 0
+    timestamps = data.index.values.astype('datetime64[ms]').astype(np.int64)
+    buckets = (timestamps - offset) // tf_ms * tf_ms + offset
+
+    # Границы групп: индексы первой минутной свечи каждого интервала
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+
+    result = pd.DataFrame({
+        'open': data['open'].values[starts],
+        'high': np.maximum.reduceat(data['high'].values, starts),
+        'low': np.minimum.reduceat(data['low'].values, starts),
+        'close': data['close'].values[ends],
+        'volume': np.add.reduceat(data['volume'].values, starts),
+    }, index=pd.to_datetime(buckets[starts], unit='ms'))
+    result.index.name = 'timestamp'
+
+    if drop_incomplete:
+        # Полный интервал содержит все свои минуты; так отбрасываются и неполные первый и последний
+        # интервалы, и интервалы с пропусками внутри истории
+        complete = np.diff(np.r_[starts, len(buckets)]) == timeframe_to_minutes(timeframe)
+        missing = int((~complete[1:-1]).sum())
+        if missing:
+            logger.warning("Отброшено %d свечей %s с пропущенными минутами", missing, timeframe)
+        result = result[complete]
+    return result
+
+
+def save_candles(data: pd.DataFrame, path: str, dtype=np.float64):
+    """
+    Сохраняет свечи в каталог по колонкам (.npy), чтобы их можно было открыть через memory-map.
+
+    :param data: DataFrame с колонками OHLCV и индексом timestamp.
+    :param path: Каталог для сохранения.
+    :param dtype: Тип данных для цен и объёма (np.float64 или np.float32).
+    """
+    if not os.path.exists(path):
+        os.makedirs(path)
+    np.save(os.path.join(path, 'timestamp.npy'), data.index.values.astype('datetime64[ms]').astype(np.int64))
+    for column in OHLCV_COLUMNS:
+        np.save(os.path.join(path, f'{column}.npy'), data[column].values.astype(dtype))
+
+
+def load_candles(path: str, mmap: bool = False) -> dict:
+    """
+    Загружает свечи, сохранённые save_candles.
+
+    :param path: Каталог со свечами.
+    :param mmap: Открыть массивы через memory-map без чтения в память.
+    :return: Словарь {'timestamp': int64 ms, 'open': ..., 'volume': ...}.
+    """
+    mmap_mode = 'r' if mmap else None
+    return {column: np.load(os.path.join(path, f'{column}.npy'), mmap_mode=mmap_mode)
+            for column in ['timestamp'] + OHLCV_COLUMNS}
+
+
+def candles_to_frame(candles: dict) -> pd.DataFrame:
+    """Преобразует словарь массивов свечей в DataFrame формата ExchangeAdapter.fetch_ohlcv."""
+    df = pd.DataFrame({column: np.asarray(candles[column]) for column in OHLCV_COLUMNS},
+                      index=pd.to_datetime(np.asarray(candles['timestamp']), unit='ms'))
+    df.index.name = 'timestamp'
+    return df
+
+
+class CandleStore:
+    """
+    Хранилище минутных свечей, из которых строятся любые старшие таймфреймы.
+
+    Минутная история загружается с биржи один раз на символ, сохраняется на диск и в память,
+    а старшие таймфреймы агрегируются из неё и кэшируются. Сохраненная история дополняется свечами новее
+    последней (не чаще раза в refresh_interval секунд на символ), поэтому кэш не отстает от биржи
+    между запусками. Интерфейс fetch_ohlcv совпадает
+    с ExchangeAdapter, поэтому хранилище можно передавать в optimize_backtest как data_fetcher.
+    С dtype=np.float32 история на диске занимает вдвое меньше места.
+    """
+
+    def __init__(self, adapter, folder="library/candles", persist=True, dtype=np.float64, refresh_interval=60):
+        """
+        :param refresh_interval: Период дозагрузки новых минутных свечей в секундах (None — без дозагрузки).
+        """
+        self.adapter = adapter
+        self.exchange_name = adapter.exchange_name
+        self.folder = folder
+        self.persist = persist
+        self.dtype = dtype
+        self.refresh_interval = refresh_interval
+        self._base = {}
+        self._requested = {}
+        self._resampled = {}
+        self._refreshed = {}
+
+    def _path(self, symbol):
+        name = symbol.replace('/', '_')
+        return os.path.join(self.folder, self.exchange_name, f"{name}_1m")
+
+    def get_base(self, symbol, total_limit):
+        """
+        Возвращает минимум total_limit последних минутных свечей, загружая с биржи всю историю только
+        при нехватке, а иначе — лишь свечи новее сохраненных (см. refresh).
+
+        :param symbol: Символ торговой пары.
+        :param total_limit: Требуемое количество минутных свечей.
+        :return: DataFrame минутных свечей.
+        """
+        base = self._base.get(symbol)
+        if base is None and self.persist and os.path.exists(self._path(symbol)):
+            base = candles_to_frame(load_candles(self._path(symbol)))
+        # Если биржа уже вернула меньше запрошенного, повторная загрузка ничего не добавит
+        fetch = base is None or (len(base) < total_limit and total_limit > self._requested.get(symbol, 0))
+        record_cache("candles_1m", not fetch)
+        if fetch:
+            self._requested[symbol] = total_limit
+            base = self.adapter.fetch_ohlcv(symbol, '1m', limit=1000, total_limit=total_limit)
+            base = base[~base.index.duplicated(keep='last')].sort_index()
+            self._refreshed[symbol] = time.monotonic()
+            self._store(symbol, base)
+        elif self._refresh_due(symbol):
+            base = self.refresh(symbol, base)
+        self._base[symbol] = base
+        return base
+
+    def _refresh_due(self, symbol):
+        if self.refresh_interval is None:
+            return False
+        refreshed = self._refreshed.get(symbol)
+        return refreshed is None or time.monotonic() - refreshed >= self.refresh_interval
+
+    def refresh(self, symbol, base):
+        """
+        Дополняет минутную историю свечами с биржи начиная с последней сохраненной.
+
+        Последняя свеча загружается заново: при сохранении она могла быть еще не закрыта. При ошибке биржи
+        возвращается прежняя история, а повторная попытка будет через refresh_interval.
+
+        :param symbol: Символ торговой пары.
+        :param base: Текущая минутная история.
+        :return: DataFrame минутных свечей.
+        """
+        self._refreshed[symbol] = time.monotonic()
+        since = int(base.index[-1].value // 10**6)
+        try:
+            newer = self.adapter.fetch_ohlcv_since(symbol, '1m', since)
+        except Exception as e:
+            logger.warning("Ошибка при обновлении истории %s: %s", symbol, e)
+            return base
+        if newer.empty:
+            return base
+        base = pd.concat([base, newer])
+        base = base[~base.index.duplicated(keep='last')].sort_index()
+        self._store(symbol, base)
+        return base
+
+    def _store(self, symbol, base):
+        if self.persist:
+            save_candles(base, self._path(symbol), dtype=self.dtype)
+        # Кэш старших таймфреймов построен по старой истории
+        self._resampled = {key: value for key, value in self._resampled.items() if key[0] != symbol}
+
+    def fetch_ohlcv(self, symbol, timeframe='1m', limit=1000, total_limit=5000):
+        """
+        Возвращает total_limit последних свечей таймфрейма timeframe, построенных из минутной истории.
+
+        :param symbol: Символ торговой пары.
+        :param timeframe: Таймфрейм.
+        :param limit: Не используется, оставлен для совместимости с ExchangeAdapter.fetch_ohlcv.
+        :param total_limit: Количество свечей.
+        :return: DataFrame с колонками OHLCV и индексом timestamp.
+        """
+        base = self.get_base(symbol, total_limit * timeframe_to_minutes(timeframe))
+        key = (symbol, timeframe)
+        record_cache("candles_resampled", key in self._resampled)
+        if key not in self._resampled:
+            self._resampled[key] = resample_ohlcv(base, timeframe)
+        return self._resampled[key].iloc[-total_limit:].copy()
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+OHLCV_COLUMNS = ("open", "high", "low", "close", "volume")
+
+
+class OHLCVDataset:
+    """
+    Неизменяемый набор свечей: непрерывные массивы float64 по колонкам и индекс времени.
+
+    Массивы копируются один раз при создании (from_frame) и помечаются только для чтения, поэтому набор
+    можно без копирования передавать в каждое испытание оптимизации: стратегии (moving_average_arrays)
+    и бэктест (run_backtest_arrays) возвращают новые массивы, а не пишут в данные. Срезы (dataset[a:b],
+    between, split) — представления тех же массивов без копирования.
+
+    Доступ к колонкам как у DataFrame: dataset['close'] — массив NumPy.
+    """
+
+    __slots__ = ("index", "_columns")
+
+    def __init__(self, index: pd.DatetimeIndex, columns: dict):
+        lengths = {len(values) for values in columns.values()}
+        if lengths - {len(index)}:
+            raise ValueError(f"Длины колонок {lengths} не совпадают с длиной индекса {len(index)}")
+        self.index = index
+        self._columns = columns
+
+    @classmethod
+    def from_frame(cls, data: pd.DataFrame):
+        """
+        Набор из DataFrame OHLCV (колонки OHLCV_COLUMNS, которых нет в data, пропускаются).
+
+        :param data: DataFrame с индексом времени.
+        :return: OHLCVDataset.
+        """
+        columns = {}
+        for name in OHLCV_COLUMNS:
+            if name in data.columns:
+                values = np.array(data[name].to_numpy(dtype=np.float64), dtype=np.float64, order='C', copy=True)
+                values.flags.writeable = False
+                columns[name] = values
+        return cls(pd.DatetimeIndex(data.index), columns)
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        """Время свечей в миллисекундах (int64)."""
+        return self.index.values.astype('datetime64[ms]').astype(np.int64)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    def __getitem__(self, key):
+        """Колонка по имени или срез строк (представление без копирования)."""
+        if isinstance(key, str):
+            return self._columns[key]
+        if isinstance(key, slice):
+            if key.step not in (None, 1):
+                raise ValueError("Поддерживаются только непрерывные срезы")
+            return OHLCVDataset(self.index[key], {name: values[key] for name, values in self._columns.items()})
+        raise TypeError(f"Неподдерживаемый ключ: {key!r}")
+
+    def between(self, start=None, end=None):
+        """Свечи с временем в [start, end) (границы — всё, что принимает pd.Timestamp)."""
+        first = self.index.searchsorted(pd.Timestamp(start), side='left') if start is not None else 0
+        last = self.index.searchsorted(pd.Timestamp(end), side='left') if end is not None else len(self)
+        return self[first:last]
+
+    def split(self, date):
+        """Делит набор по дате: (свечи до date, свечи начиная с date)."""
+        position = self.index.searchsorted(pd.Timestamp(date), side='left')
+        return self[:position], self[position:]
+
+    def to_frame(self, extra: dict = None) -> pd.DataFrame:
+        """DataFrame с колонками набора и, например, массивами стратегии extra (для отчетов и отладки)."""
+        return pd.DataFrame({**self._columns, **(extra or {})}, index=self.index)
+
+    def __repr__(self):
+        if not len(self):
+            return "OHLCVDataset(0 свечей)"
+        return f"OHLCVDataset({len(self)} свечей, {self.index[0]} — {self.index[-1]}, колонки {self.columns})"
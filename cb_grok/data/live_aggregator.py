@@ -0,0 +1,83 @@
+from cb_grok.adapters.kline_decoder import Candle
+from cb_grok.data.candle_store import WEEK_OFFSET_MS
+from cb_grok.utils.utils import timeframe_to_milliseconds
+
+MINUTE_MS = 60 * 1000
+
+
+class _Bucket:
+    __slots__ = ("start", "candle", "complete", "next_minute")
+
+    def __init__(self, start, candle, complete, next_minute):
+        self.start = start
+        self.candle = candle
+        # Все минуты интервала пришли подряд с первой; next_minute — ожидаемая следующая минута
+        self.complete = complete
+        self.next_minute = next_minute
+
+
+class CandleAggregator:
+    """
+    Инкрементальное построение закрытых свечей старших таймфреймов из закрытых минутных свечей потока.
+
+    Границы интервалов совпадают с resample_ohlcv (и с биржевыми свечами). Свеча интервала выдается сразу
+    после его последней минуты и только если пришли все минуты интервала подряд. Интервал с пропуском
+    минуты (запуск посреди интервала, обрыв потока, не пришедшая последняя минута) отбрасывается целиком:
+    следующая свеча таймфрейма окажется не сразу за последней в буфере модели, и LiveModel дозагрузит
+    пропущенную свечу с биржи через REST, а не передаст модели свечу с неверными OHLCV.
+    """
+
+    def __init__(self, timeframes):
+        """
+        :param timeframes: Таймфреймы, которые нужно строить (например, ['5m', '1h', '4h']); '1m' передается как есть.
+        """
+        self.timeframes = sorted(set(timeframes), key=timeframe_to_milliseconds)
+        self._length = {timeframe: timeframe_to_milliseconds(timeframe) for timeframe in self.timeframes}
+        self._offset = {timeframe: WEEK_OFFSET_MS if timeframe.endswith('w') else 0 for timeframe in self.timeframes}
+        self._buckets = {}
+        self._last_minute = None
+
+    def _bucket_start(self, timeframe, timestamp):
+        length, offset = self._length[timeframe], self._offset[timeframe]
+        return (timestamp - offset) // length * length + offset
+
+    def update(self, candle: Candle):
+        """
+        Добавляет закрытую минутную свечу.
+
+        :param candle: Закрытая минутная свеча (незакрытые и повторные игнорируются).
+        :return: Список пар (таймфрейм, Candle) закрытых свечей в порядке возрастания таймфрейма.
+        """
+        if not candle.closed or (self._last_minute is not None and candle.timestamp <= self._last_minute):
+            return []
+        self._last_minute = candle.timestamp
+        closed = []
+        for timeframe in self.timeframes:
+            if timeframe == '1m':
+                closed.append((timeframe, candle))
+                continue
+            start = self._bucket_start(timeframe, candle.timestamp)
+            bucket = self._buckets.get(timeframe)
+            if bucket is not None and bucket.start != start:
+                # Последняя минута прошлого интервала не пришла: свеча неполная и не выдается
+                bucket = None
+            if bucket is None:
+                bucket = _Bucket(start, Candle(start, candle.open, candle.high, candle.low, candle.close,
+                                               candle.volume), candle.timestamp == start,
+                                 candle.timestamp + MINUTE_MS)
+                self._buckets[timeframe] = bucket
+            else:
+                if candle.timestamp != bucket.next_minute:
+                    # Пропуск минут внутри интервала
+                    bucket.complete = False
+                bucket.next_minute = candle.timestamp + MINUTE_MS
+                aggregated = bucket.candle
+                aggregated.high = max(aggregated.high, candle.high)
+                aggregated.low = min(aggregated.low, candle.low)
+                aggregated.close = candle.close
+                aggregated.volume += candle.volume
+            if candle.timestamp + MINUTE_MS == start + self._length[timeframe]:
+                if bucket.complete:
+                    closed.append((timeframe, bucket.candle))
+                del self._buckets[timeframe]
+        return closed
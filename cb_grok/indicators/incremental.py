@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+
+# Инкрементальные версии индикаторов из indicators.py и moving_average_strategy.py.
+# Каждый объект хранит состояние между порциями данных, поэтому результат обработки ряда по частям
+# совпадает с расчётом по всему ряду сразу (с точностью до ошибок округления float64).
+
+
+def _recursive_filter(x: np.ndarray, decay: float, initial: float) -> np.ndarray:
+    """
+    Считает y_t = decay * y_{t-1} + x_t с начальным значением y_{-1} = initial.
+
+    Используется ewm(adjust=False) из pandas: для z = (1 - decay) * y рекурсия совпадает с EMA.
+    """
+    alpha = 1.0 - decay
+    series = pd.Series(np.concatenate(([alpha * initial], x)))
+    z = series.ewm(alpha=alpha, adjust=False).mean().to_numpy()[1:]
+    return z / alpha
+
+
+class RollingMeanState:
+    """Скользящее среднее rolling(window=period, min_periods=1).mean() (calculate_moving_averages)."""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.tail = np.empty(0)
+
+    def update(self, x: np.ndarray) -> np.ndarray:
+        values = np.concatenate((self.tail, x))
+        mean = pd.Series(values).rolling(window=self.period, min_periods=1).mean().to_numpy()
+        self.tail = values[-(self.period - 1):] if self.period > 1 else np.empty(0)
+        return mean[len(values) - len(x):]
+
+
+class EMAState:
+    """EMA ewm(span=period, adjust=False, min_periods=1).mean() (calculate_emas)."""
+
+    def __init__(self, period: int):
+        self.alpha = 2.0 / (period + 1)
+        self.last = None
+
+    def update(self, x: np.ndarray) -> np.ndarray:
+        if self.last is None:
+            ema = pd.Series(x).ewm(alpha=self.alpha, adjust=False).mean().to_numpy()
+        else:
+            ema = pd.Series(np.concatenate(([self.last], x))).ewm(alpha=self.alpha, adjust=False).mean().to_numpy()[1:]
+        if len(ema):
+            self.last = ema[-1]
+        return ema
+
+
+class RMAState:
+    """
+    Сглаживание Уайлдера из pandas_ta: ewm(alpha=1/length, adjust=True, min_periods=length).mean().
+
+    Состояние — взвешенная сумма наблюдений, сумма весов и количество наблюдений. Пропуски (NaN)
+    обрабатываются как в pandas при ignore_na=False: веса затухают, значение повторяет предыдущее.
+    """
+
+    def __init__(self, length: int):
+        self.length = length
+        self.decay = 1.0 - 1.0 / length
+        self.numerator = 0.0
+        self.denominator = 0.0
+        self.count = 0
+
+    def update(self, x: np.ndarray) -> np.ndarray:
+        if len(x) == 0:
+            return np.empty(0)
+        valid = ~np.isnan(x)
+        numerator = _recursive_filter(np.where(valid, x, 0.0), self.decay, self.numerator)
+        denominator = _recursive_filter(valid.astype(np.float64), self.decay, self.denominator)
+        count = self.count + np.cumsum(valid)
+        self.numerator, self.denominator, self.count = numerator[-1], denominator[-1], int(count[-1])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(count >= self.length, numerator / denominator, np.nan)
+
+
+class RSIState:
+    """RSI как ta.rsi из pandas_ta (calculate_rsi)."""
+
+    def __init__(self, period: int):
+        self.positive = RMAState(period)
+        self.negative = RMAState(period)
+        self.prev_close = np.nan
+
+    def update(self, close: np.ndarray) -> np.ndarray:
+        diff = np.diff(np.concatenate(([self.prev_close], close)))
+        self.prev_close = close[-1] if len(close) else self.prev_close
+        positive_avg = self.positive.update(np.where(diff > 0, diff, np.where(np.isnan(diff), np.nan, 0.0)))
+        negative_avg = self.negative.update(np.where(diff < 0, diff, np.where(np.isnan(diff), np.nan, 0.0)))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return 100 * positive_avg / (positive_avg + np.abs(negative_avg))
+
+
+def _true_range(high, low, close, prev_close):
+    prev = np.concatenate(([prev_close], close[:-1]))
+    tr = np.maximum(high - low, np.maximum(np.abs(high - prev), np.abs(prev - low)))
+    return np.where(np.isnan(prev), np.nan, tr)
+
+
+class ATRState:
+    """ATR как ta.atr из pandas_ta с mamode='rma' (calculate_atr)."""
+
+    def __init__(self, period: int):
+        self.rma = RMAState(period)
+        self.prev_close = np.nan
+
+    def update(self, high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+        tr = _true_range(high, low, close, self.prev_close)
+        self.prev_close = close[-1] if len(close) else self.prev_close
+        return self.rma.update(tr)
+
+
+class ADXState:
+    """ADX как ta.adx из pandas_ta (calculate_adx)."""
+
+    def __init__(self, period: int):
+        self.atr = ATRState(period)
+        self.positive = RMAState(period)
+        self.negative = RMAState(period)
+        self.adx = RMAState(period)
+        self.prev_high = np.nan
+        self.prev_low = np.nan
+
+    def update(self, high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+        atr = self.atr.update(high, low, close)
+        up = high - np.concatenate(([self.prev_high], high[:-1]))
+        down = np.concatenate(([self.prev_low], low[:-1])) - low
+        if len(high):
+            self.prev_high, self.prev_low = high[-1], low[-1]
+        missing = np.isnan(up)
+        positive = np.where(missing, np.nan, np.where((up > down) & (up > 0), up, 0.0))
+        negative = np.where(missing, np.nan, np.where((down > up) & (down > 0), down, 0.0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            k = 100 / atr
+            dmp = k * self.positive.update(positive)
+            dmn = k * self.negative.update(negative)
+            dx = 100 * np.abs(dmp - dmn) / (dmp + dmn)
+        return self.adx.update(dx)
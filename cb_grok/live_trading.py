@@ -1,25 +1,40 @@
 import asyncio
-import websockets
 import json
+import time
 import pandas as pd
-from cb_grok.adapters.exchange_adapter import ExchangeAdapter
-from cb_grok.strategies.moving_average_strategy import moving_average_strategy
+from cb_grok.adapters.exchange_adapter import get_exchange_adapter
+from cb_grok.data.candle_store import CandleStore
+from cb_grok.utils.utils import timeframe_to_milliseconds
+from cb_grok.strategies.moving_average_strategy import last_signal_and_atr
 from cb_grok.utils.telegram_bot import TelegramBot
 import os
-from websockets.exceptions import ConnectionClosedOK, InvalidStatus
+from websockets.exceptions import InvalidStatus
+from cb_grok.adapters.kline_decoder import KlineDecoder
+from cb_grok.adapters.wss_adapter import ConnectionStats, supervised_messages
+from cb_grok.data.live_aggregator import CandleAggregator
+from cb_grok.utils.metrics_exporter import (CANDLES_PROCESSED, INTRABAR_UPDATES, WS_MESSAGES, DECISION_LATENCY,
+                                            BUFFER_SIZE, STRATEGY_COMPUTE, COMPUTE_SKIPPED, REOPTIMIZATIONS,
+                                            REOPTIMIZE_DURATION, WS_OUTAGE, start_metrics_server)
+from cb_grok.utils.compute_executor import create_compute_executor, run_compute, BACKPRESSURE_POLICIES
+from cb_grok.utils.log_pipeline import setup_logging, DEFAULT_SAMPLE_RATE
+from cb_grok.run_model import strategy_params_from_model
 import logging
 from datetime import datetime
 
-# Настройка логирования
-log_folder = "log"
-if not os.path.exists(log_folder):
-    os.makedirs(log_folder)
-timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-log_filename = f"{log_folder}/live_trading_{timestamp}.log"
-logging.basicConfig(filename=log_filename, level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Модуль стратегии, импортируемый процессами пула compute='process' при запуске
+STRATEGY_MODULE = "cb_grok.strategies.moving_average_strategy"
+
+
+def configure_logging(sample_rate=DEFAULT_SAMPLE_RATE):
+    """
+    Асинхронный лог JSONL в log/live_trading_*.jsonl (если процесс еще не настроил логирование, например
+    main.py): запись на диск идет в фоновом потоке и не добавляется к задержке решения.
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return setup_logging(f"log/live_trading_{timestamp}.jsonl", sample_rate=sample_rate)
+
 def load_model_params(filename):
     """Загрузка параметров модели из файла."""
     best_models_folder = "library/best_models_params"
@@ -39,213 +54,645 @@ def convert_timeframe_for_bybit(timeframe):
     }
     return mapping.get(timeframe, timeframe)
 
+def drop_unfinished_candles(data, timeframe, now=None):
+    """Удаляет свечи, которые еще не закрылись к моменту now (UTC); их пришлет поток."""
+    now = now if now is not None else pd.Timestamp(time.time(), unit='s')
+    return data[data.index + pd.Timedelta(milliseconds=timeframe_to_milliseconds(timeframe)) <= now]
+
+
+def warm_start_buffer(exchange, symbol, timeframe, size, source="rest", logger=None):
+    """
+    Предзаполнение буфера закрытыми свечами истории, чтобы стратегия принимала решения сразу после запуска.
+
+    :param exchange: ExchangeAdapter.
+    :param symbol: Символ торговой пары.
+    :param timeframe: Таймфрейм.
+    :param size: Количество свечей в буфере.
+    :param source: 'rest' — загрузка с биржи, 'store' — локальное хранилище минутных свечей (CandleStore)
+                   с дозагрузкой свечей после последней сохраненной через REST.
+    :param logger: Объект для логирования.
+    :return: DataFrame закрытых свечей без дубликатов, отсортированный по времени.
+    """
+    if source == "rest":
+        data = exchange.fetch_ohlcv(symbol, timeframe, limit=min(size + 1, 1000), total_limit=size + 1)
+    elif source == "store":
+        data = CandleStore(exchange).fetch_ohlcv(symbol, timeframe, total_limit=size)
+        if len(data):
+            since = data.index[-1] + pd.Timedelta(milliseconds=timeframe_to_milliseconds(timeframe))
+            recent = exchange.fetch_ohlcv_since(symbol, timeframe, int(since.value // 10**6))
+            data = pd.concat([data, recent])
+    else:
+        raise ValueError(f"Неизвестный источник истории: {source}. Используйте 'rest' или 'store'")
+    data = data[~data.index.duplicated(keep='last')].sort_index()
+    data = drop_unfinished_candles(data, timeframe).iloc[-size:]
+    if logger:
+        logger.info(f"Буфер предзаполнен из '{source}': {len(data)} свечей"
+                    + (f", последняя {data.index[-1]}" if len(data) else ""))
+    return data
+
+
+def gap_since(buffer, candle, timeframe):
+    """
+    Начало пропуска между последней свечой буфера и свечой потока candle.
+
+    :return: Время первой недостающей свечи в мс (аргумент since для fetch_ohlcv_since) или None без пропуска.
+    """
+    if len(buffer) == 0:
+        return None
+    step = pd.Timedelta(milliseconds=timeframe_to_milliseconds(timeframe))
+    last_time = buffer.index[-1]
+    if candle.time - last_time <= step:
+        return None
+    return int((last_time + step).value // 10**6)
+
+
+def splice_candle(buffer, candle, timeframe, size, missing=None, logger=None):
+    """
+    Добавляет свечу потока (Candle) в буфер без дубликатов и пропусков.
+
+    Свеча с уже известным временем заменяет прежнюю (обновление текущей свечи), свеча старше последней
+    отбрасывается. Пропуск между последней свечой буфера и новой (см. gap_since) заполняется свечами missing,
+    загруженными вызывающим кодом через REST: сама функция к бирже не обращается и не блокирует цикл событий.
+
+    :param missing: DataFrame дозагруженных свечей (лишние вне пропуска отбрасываются) или None.
+    :return: Кортеж (буфер, признак новой свечи).
+    """
+    candle_time = candle.time
+    if len(buffer) == 0:
+        return candle.to_frame(), True
+    last_time = buffer.index[-1]
+    if candle_time < last_time:
+        return buffer, False
+    if candle_time == last_time:
+        buffer.iloc[-1] = candle.values()
+        return buffer, False
+
+    if missing is not None:
+        missing = missing[(missing.index > last_time) & (missing.index < candle_time)]
+        if logger:
+            logger.info(f"Пропуск {last_time} - {candle_time}: дозагружено {len(missing)} свечей")
+        buffer = pd.concat([buffer, missing])
+    return pd.concat([buffer, candle.to_frame()]).iloc[-size:], True
+
+
+def stream_url(exchange_name, category='linear', symbol=None, timeframe=None):
+    """WebSocket URL публичного потока свечей биржи (для Binance — поток одного символа и таймфрейма)."""
+    if exchange_name == 'binance':
+        return f"wss://stream.binance.com:9443/ws/{symbol.lower().replace('/', '')}@kline_{timeframe}"
+    elif exchange_name == 'bybit':
+        if category in ('spot', 'linear', 'inverse', 'option'):
+            return f"wss://stream.bybit.com/v5/public/{category}"
+        raise ValueError(f"Неподдерживаемая категория для Bybit: {category}")
+    raise ValueError(f"Неподдерживаемая биржа: {exchange_name}")
+
+
+def kline_subscription(exchange_name, mode, symbol, timeframe):
+    """Корутина подписки на свечи символа после каждого (пере)подключения (нужна только для Bybit)."""
+    async def subscribe(websocket):
+        if exchange_name == 'bybit' and mode == "production":
+            subscription_message = {
+                "op": "subscribe",
+                "args": [f"kline.{convert_timeframe_for_bybit(timeframe)}.{symbol.replace('/', '')}"]
+            }
+            await websocket.send(json.dumps(subscription_message))
+            logger.info(f"Отправлена подписка: {subscription_message}")
+    return subscribe
+
+
+class LiveModel:
+    """
+    Одна модель в торговле: буфер свечей своего таймфрейма, позиция, стратегия и ордера.
+
+    Не зависит от источника свечей: live_trading передает свечи потока таймфрейма модели,
+    live_trading_multi — свечи, построенные из общего минутного потока символа. Стратегия запускается
+    только по закрытым свечам (on_candles); обновления незакрытой свечи (on_update) в буфер не попадают
+    и при intrabar_exits лишь проверяют стоп-лосс и тейк-профит.
+
+    С executor (пул потоков или процессов, см. create_compute_executor) расчет стратегии выполняется вне цикла
+    событий, а submit ставит закрытые свечи в обработку без ожидания: пока идет расчет, цикл читает сообщения,
+    отвечает на пинги и закрывает позиции по on_update. Если за время расчета закрылись новые свечи, решение
+    принимается только по последней из них (backpressure='coalesce'); при backpressure='drop' отбрасывается
+    и решение по уже рассчитанной свече, ставшей устаревшей.
+
+    swap_model заменяет параметры модели на лету (фоновая переоптимизация, см. Reoptimizer) без остановки потока.
+    """
+
+    def __init__(self, model_params, mode, exchange, telegram_bot, initial_capital=10000, symbol=None,
+                 timeframe='1h', warm_start=None, backfill=None, on_decision=None, intrabar_exits=False,
+                 executor=None, backpressure="coalesce"):
+        if backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Неизвестная политика backpressure: {backpressure}. "
+                             f"Используйте {', '.join(BACKPRESSURE_POLICIES)}")
+        self.mode = mode
+        self.executor = executor
+        self.backpressure = backpressure
+        self.intrabar_exits = intrabar_exits
+        self.exchange = exchange
+        self.telegram_bot = telegram_bot
+        self.on_decision = on_decision
+        # Корутина, вызываемая после обработки закрытой свечи (дозагрузка пропуска и решение); live_trading
+        # учитывает по ней время простоя после обрыва соединения
+        self.on_processed = None
+        self.symbol = symbol or model_params["symbol"]
+        self.timeframe = model_params.get("timeframe", timeframe)
+        self._apply_model(model_params)
+        warm_start = warm_start or ("rest" if mode == "production" else "none")
+        if warm_start != "none":
+            self.data_buffer = warm_start_buffer(exchange, self.symbol, self.timeframe, self.buffer_size, warm_start,
+                                                 logger)
+        else:
+            self.data_buffer = pd.DataFrame()
+        # Пропуски между историей и потоком и свечи, пропущенные за время обрыва соединения, дозагружаются
+        # через REST; симулятор по умолчанию шлет историю без пропусков
+        backfill = backfill if backfill is not None else mode == "production"
+        self.gap_exchange = exchange if backfill else None
+
+        self.cash = initial_capital
+        self.assets = 0.0
+        self.position_open = False
+        self.entry_price = 0.0
+        self.stop_loss = 0.0
+        self.take_profit = 0.0
+        # Свечи, еще не добавленные в буфер, последняя закрытая свеча, ожидающая расчета, и задача обработки (submit)
+        self._incoming = []
+        self._pending = None
+        self._task = None
+        # Открытие и закрытие позиции, включая запросы к бирже (см. _decide, on_update)
+        self._position_lock = asyncio.Lock()
+
+        # Дочерние метрики создаются один раз: обновление в on_candles — несколько сложений
+        self._candles_metric = CANDLES_PROCESSED.labels(self.symbol, self.timeframe)
+        self._updates_metric = INTRABAR_UPDATES.labels(self.symbol, self.timeframe)
+        self._latency_metric = DECISION_LATENCY.labels(self.symbol, self.timeframe)
+        self._buffer_metric = BUFFER_SIZE.labels(self.symbol, self.timeframe)
+        self._buffer_metric.set(len(self.data_buffer))
+        self._compute_metric = STRATEGY_COMPUTE.labels(self.symbol, self.timeframe)
+        self._skipped_metric = COMPUTE_SKIPPED.labels(self.symbol, self.timeframe, backpressure)
+
+    def _apply_model(self, model_params):
+        self.model_params = model_params
+        self.strategy_params = strategy_params_from_model(model_params)
+        self.stop_loss_multiplier = model_params.get("stop_loss_multiplier", 2)
+        self.take_profit_multiplier = model_params.get("take_profit_multiplier", 4)
+        self.required_candles = max(self.strategy_params.get("long_period", 50),
+                                    self.strategy_params.get("ema_long_period", 200))
+        self.buffer_size = max(model_params.get("limit", 100), self.required_candles)
+
+    def swap_model(self, model_params, history=None):
+        """
+        Заменяет параметры модели, не прерывая поток.
+
+        Замена выполняется без await, то есть целиком между обработкой сообщений цикла событий: решения
+        до нее принимаются по старым параметрам, после — по новым. Расчет, начатый до замены в исполнителе,
+        завершается со старыми параметрами (_decide берет их в начале). Буфер свечей сохраняется, поэтому
+        прогрев не начинается заново; если новой модели нужен буфер длиннее, он дополняется более старыми
+        свечами из history. Открытая позиция сохраняет стоп-лосс и тейк-профит, рассчитанные при входе.
+        Ордера отправляются в потоке, поэтому замена не ждет ответа биржи: решение, ожидающее ордер,
+        завершается с параметрами, взятыми в начале _decide.
+
+        :param model_params: Параметры новой модели (как в файле модели).
+        :param history: DataFrame закрытых свечей таймфрейма модели (например, окно переоптимизации).
+        """
+        self._apply_model(model_params)
+        buffer = self.data_buffer
+        if history is not None and len(history) and len(buffer) < self.buffer_size:
+            older = history[history.index < buffer.index[0]] if len(buffer) else history
+            buffer = pd.concat([older, buffer])
+        self.data_buffer = buffer.iloc[-self.buffer_size:]
+        self._buffer_metric.set(len(self.data_buffer))
+
+    async def on_candles(self, candles):
+        """
+        Добавляет закрытые свечи в буфер и принимает решение по последней.
+
+        :param candles: Список закрытых Candle таймфрейма модели.
+        :return: Решение или None, если данных для стратегии пока недостаточно.
+        """
+        started = time.perf_counter()
+        await self._append(candles)
+        decision = await self._decide(candles[-1], started)
+        if self.on_processed is not None:
+            await self.on_processed()
+        return decision
+
+    def submit(self, candles):
+        """
+        Ставит закрытые свечи в буфер и решение по последней в обработку, не дожидаясь расчета.
+
+        Свечи добавляются в буфер задачей обработки перед расчетом (вместе с дозагрузкой пропуска через REST).
+        Одновременно рассчитывается не больше одной свечи модели; свеча, ожидавшая расчета, заменяется
+        более новой (учитывается в метрике cbgrok_compute_skipped_total).
+
+        :param candles: Список закрытых Candle таймфрейма модели.
+        :return: Задача обработки (asyncio.Task).
+        """
+        self._incoming.extend(candles)
+        if self._pending is not None:
+            self._skipped_metric.inc()
+        self._pending = (candles[-1], time.perf_counter())
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._drain())
+        return self._task
+
+    async def flush(self):
+        """Дожидается решений по всем свечам, поставленным через submit."""
+        while self._task is not None and not self._task.done():
+            await self._task
+
+    async def _drain(self):
+        while self._pending is not None:
+            candle, started = self._pending
+            self._pending = None
+            # Все поставленные свечи, включая candle: пока идет дозагрузка или расчет, submit копит новые
+            candles, self._incoming = self._incoming, []
+            try:
+                await self._append(candles)
+                await self._decide(candle, started)
+                if self.on_processed is not None:
+                    await self.on_processed()
+            except Exception as e:
+                logger.error(f"Ошибка модели {self.symbol} {self.timeframe}: {e}")
+                await self.telegram_bot.send_message(f"Ошибка {self.symbol} {self.timeframe}: {e}")
+
+    async def _append(self, candles):
+        """Добавляет свечи в буфер; пропуск дозагружается через REST в потоке, не блокируя цикл событий."""
+        for candle in candles:
+            missing = None
+            since = gap_since(self.data_buffer, candle, self.timeframe) if self.gap_exchange is not None else None
+            if since is not None:
+                missing = await asyncio.to_thread(self.gap_exchange.fetch_ohlcv_since, self.symbol, self.timeframe,
+                                                  since)
+            self.data_buffer, _ = splice_candle(self.data_buffer, candle, self.timeframe, self.buffer_size,
+                                                missing, logger)
+        self._candles_metric.inc(len(candles))
+        self._buffer_metric.set(len(self.data_buffer))
+
+    async def _decide(self, candle, started):
+        """Рассчитывает стратегию по буферу и принимает решение по закрытой свече candle."""
+        symbol = self.symbol
+        if len(self.data_buffer) < self.required_candles:
+            return None
+        # Параметры модели на момент свечи: swap_model во время расчета не смешивает старую и новую модели
+        strategy_params = self.strategy_params
+        stop_loss_multiplier, take_profit_multiplier = self.stop_loss_multiplier, self.take_profit_multiplier
+
+        # Применение стратегии (в исполнителе — по копии буфера на момент свечи)
+        compute_started = time.perf_counter()
+        latest_signal, atr = await run_compute(self.executor, last_signal_and_atr, self.data_buffer.copy(),
+                                               strategy_params)
+        self._compute_metric.observe(time.perf_counter() - compute_started)
+        if self.backpressure == "drop" and self._pending is not None:
+            # За время расчета закрылась более новая свеча: решение по этой свече устарело
+            self._skipped_metric.inc()
+            logger.debug("Решение по свече %s отброшено: расчет отстал от потока", candle.time)
+            return None
+        current_price = candle.close
+        logger.debug("Текущая цена: %s", current_price)
+        decision = "Держать"
+        transaction_amount = 0.0
+
+        # Позиция меняется под блокировкой: пока ордер в пути (запрос к бирже выполняется в потоке, цикл событий
+        # продолжает обрабатывать сообщения), on_update и решения по другим свечам позицию не трогают
+        async with self._position_lock:
+            # Логика торговли в режиме production
+            if self.mode == "production" and self.position_open:
+                balance = await asyncio.to_thread(self.exchange.fetch_balance)
+                self.assets = balance['total'].get(symbol.split('/')[0], 0)
+                if current_price <= self.stop_loss or current_price >= self.take_profit or latest_signal == -1:
+                    decision, transaction_amount = await self._close_position(current_price, "сигнал")
+            elif self.mode == "production" and latest_signal == 1 and not self.position_open:
+                amount = self.cash / current_price
+                await asyncio.to_thread(self.exchange.create_order, symbol, 'buy', amount, stop_loss=self.stop_loss,
+                                        take_profit=self.take_profit)
+                decision = "Покупка"
+                transaction_amount = amount
+                self.assets = amount
+                self.cash = 0.0
+                self.position_open = True
+                self.entry_price = current_price
+                self.stop_loss = self.entry_price - atr * stop_loss_multiplier
+                self.take_profit = self.entry_price + atr * take_profit_multiplier
+
+            # Логика торговли в режиме simulation
+            elif self.mode == "simulation":
+                if self.position_open:
+                    if current_price <= self.stop_loss:
+                        decision, transaction_amount = await self._close_position(current_price, "стоп-лосс")
+                    elif current_price >= self.take_profit:
+                        decision, transaction_amount = await self._close_position(current_price, "тейк-профит")
+                    elif latest_signal == -1:
+                        decision, transaction_amount = await self._close_position(current_price, "сигнал")
+                else:
+                    if latest_signal == 1 and self.cash > 0:
+                        decision = "Покупка"
+                        transaction_amount = self.cash / current_price
+                        self.assets = transaction_amount
+                        self.cash = 0.0
+                        self.position_open = True
+                        self.entry_price = current_price
+                        self.stop_loss = self.entry_price - atr * stop_loss_multiplier
+                        self.take_profit = self.entry_price + atr * take_profit_multiplier
+
+        await self._report(candle, decision, current_price, transaction_amount, started)
+        return decision
+
+    async def on_update(self, candle):
+        """
+        Обновление еще не закрытой свечи потока.
+
+        Свеча не сохраняется и стратегия не запускается: решение по сигналу
+        принимается по закрытой свече в on_candles. При intrabar_exits открытая позиция закрывается, как
+        только текущая цена достигает стоп-лосса или тейк-профита, не дожидаясь закрытия свечи; проверка —
+        два сравнения, баланс запрашивается только при срабатывании. Запросы к бирже выполняются в потоке,
+        а обновления, пришедшие пока продажа в пути, пропускаются.
+
+        :param candle: Незакрытая Candle потока (в live_trading_multi — минутная свеча символа).
+        :return: Решение о закрытии позиции или None.
+        """
+        self._updates_metric.inc()
+        if not (self.intrabar_exits and self.position_open):
+            return None
+        current_price = candle.close
+        if self.stop_loss < current_price < self.take_profit:
+            return None
+
+        # Продажа по этой позиции уже в пути: повторные обновления цены ее не дублируют
+        if self._position_lock.locked():
+            return None
+        started = time.perf_counter()
+        async with self._position_lock:
+            if not self.position_open:
+                return None
+            if self.mode == "production":
+                balance = await asyncio.to_thread(self.exchange.fetch_balance)
+                self.assets = balance['total'].get(self.symbol.split('/')[0], 0)
+            reason = "стоп-лосс" if current_price <= self.stop_loss else "тейк-профит"
+            decision, transaction_amount = await self._close_position(current_price, reason)
+        await self._report(candle, decision, current_price, transaction_amount, started)
+        return decision
+
+    async def _close_position(self, current_price, reason):
+        """
+        Закрывает позицию (ордер на продажу в production) по цене current_price.
+
+        Вызывается под _position_lock; ордер отправляется в потоке, не блокируя цикл событий.
+
+        :param reason: 'стоп-лосс', 'тейк-профит' или 'сигнал' (в решении режима simulation).
+        :return: Кортеж (решение, проданное количество).
+        """
+        if self.mode == "production":
+            await asyncio.to_thread(self.exchange.create_order, self.symbol, 'sell', self.assets,
+                                    stop_loss=self.stop_loss, take_profit=self.take_profit)
+            decision = "Продажа"
+        else:
+            decision = f"Продажа ({reason})"
+        transaction_amount = self.assets
+        self.cash += self.assets * current_price
+        self.assets = 0.0
+        self.position_open = False
+        return decision, transaction_amount
+
+    async def _report(self, candle, decision, current_price, transaction_amount, started):
+        """Сообщение о решении: Telegram для сделок, лог, метрика задержки и on_decision."""
+        # Строка сообщения собирается только для сделки, удержание логируется с отложенным форматированием
+        # (в фоновом потоке записи лога)
+        symbol = self.symbol
+        candle_time = candle.time
+        portfolio_value = self.cash + self.assets * current_price
+        base = symbol.split('/')[0]
+        fields = {"symbol": symbol, "timeframe": self.timeframe, "candle": str(candle_time), "decision": decision,
+                  "price": current_price, "portfolio_value": portfolio_value, "closed": candle.closed}
+
+        self._latency_metric.observe(time.perf_counter() - started)
+        if decision != "Держать":
+            message = (f"[{candle_time}] Символ: {symbol}, Таймфрейм: {self.timeframe}, Решение: {decision}, "
+                       f"Цена: {current_price:.2f}, {decision}: {transaction_amount:.2f} {base}, "
+                       f"Портфель: {portfolio_value:.2f} USDT ({self.cash:.2f} USDT + {self.assets:.2f} {base})")
+            await self.telegram_bot.send_message(message)
+            logger.info(message, extra=dict(fields, amount=transaction_amount, sample=False))
+        else:
+            logger.info("[%s] Символ: %s, Таймфрейм: %s, Решение: %s, Цена: %.2f, Портфель: %.2f USDT "
+                        "(%.2f USDT + %.2f %s)", candle_time, symbol, self.timeframe, decision, current_price,
+                        portfolio_value, self.cash, self.assets, base, extra=fields)
+        if self.on_decision is not None:
+            self.on_decision(symbol, candle, decision)
+
+
+class Reoptimizer:
+    """
+    Периодическая переоптимизация моделей в фоне с горячей заменой.
+
+    Каждые interval секунд для каждой модели берется окно из window последних закрытых свечей (буфер модели
+    или, если он короче, история REST в отдельном потоке), и reoptimize_window выполняется в пуле процессов
+    с пониженным приоритетом: цикл событий продолжает обрабатывать свечи, а CPU достается прежде всего ему.
+    Кандидат, превзошедший текущую модель на свежей отложенной части окна (candidate_is_better), сохраняется
+    в library/best_models_params и заменяет модель через LiveModel.swap_model.
+    """
+
+    def __init__(self, models, interval, n_trials=100, window=3000, initial_capital=10000, commission=0.00075,
+                 min_improvement=0.1, min_orders=5, executor=None, niceness=10, save=True):
+        """
+        :param models: Модели LiveModel.
+        :param interval: Период переоптимизации в секундах.
+        :param n_trials: Количество испытаний Optuna на одну переоптимизацию.
+        :param window: Длина окна в свечах таймфрейма модели.
+        :param initial_capital: Начальный капитал бэктестов.
+        :param commission: Комиссия бэктестов.
+        :param min_improvement: Минимальный прирост Sharpe Ratio кандидата на отложенной части окна.
+        :param min_orders: Минимум ордеров кандидата на отложенной части окна.
+        :param executor: Готовый пул процессов (по умолчанию создается пул из одного процесса с niceness).
+        :param niceness: Понижение приоритета процесса переоптимизации.
+        :param save: Сохранять принятые модели в library/best_models_params.
+        """
+        self.models = models
+        self.interval = interval
+        self.n_trials = n_trials
+        self.window = window
+        self.initial_capital = initial_capital
+        self.commission = commission
+        self.min_improvement = min_improvement
+        self.min_orders = min_orders
+        self.executor = executor
+        self.niceness = niceness
+        self.save = save
+
+    async def run(self):
+        """Переоптимизирует модели по очереди каждые interval секунд, пока задачу не отменят."""
+        from cb_grok.optimization.reoptimizer import REOPTIMIZER_MODULE
+
+        own_executor = self.executor is None
+        if own_executor:
+            # Запуск процесса spawn занимает секунды, поэтому пул создается вне цикла событий
+            self.executor = await asyncio.to_thread(create_compute_executor, "process", 1, REOPTIMIZER_MODULE,
+                                                    self.niceness)
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                for model in self.models:
+                    await self.reoptimize(model)
+        finally:
+            if own_executor:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
+
+    async def _window(self, model):
+        if len(model.data_buffer) >= self.window or model.gap_exchange is None:
+            return model.data_buffer.iloc[-self.window:].copy()
+        return await asyncio.to_thread(warm_start_buffer, model.exchange, model.symbol, model.timeframe, self.window,
+                                       "rest", logger)
+
+    async def reoptimize(self, model):
+        """
+        Одна переоптимизация модели и замена при лучшем кандидате.
+
+        :return: Результат reoptimize_window или None при ошибке.
+        """
+        from cb_grok.optimization.reoptimizer import reoptimize_window, candidate_is_better
+        from cb_grok.optimization.optimization import save_best_params, MODEL_METRICS
+
+        symbol, timeframe = model.symbol, model.timeframe
+        current_params = model.model_params
+        started = time.perf_counter()
+        try:
+            data = await self._window(model)
+            result = await run_compute(self.executor, reoptimize_window, data, current_params, self.initial_capital,
+                                       self.commission, self.n_trials)
+        except Exception as e:
+            REOPTIMIZATIONS.labels(symbol, timeframe, "failed").inc()
+            logger.error(f"Ошибка переоптимизации {symbol} {timeframe}: {e}")
+            return None
+        REOPTIMIZE_DURATION.labels(symbol, timeframe).observe(time.perf_counter() - started)
+
+        candidate, current = result["candidate"], result["current"]
+        summary = (f"кандидат Sharpe Ratio = {candidate['sharpe_ratio']:.2f} ({candidate['num_orders']} ордеров)"
+                   if candidate else "кандидату не хватает окна")
+        summary += f", текущая модель {current['sharpe_ratio']:.2f}" if current else ""
+        if model.model_params is not current_params or not candidate_is_better(result, self.min_improvement,
+                                                                               self.min_orders):
+            REOPTIMIZATIONS.labels(symbol, timeframe, "kept").inc()
+            logger.info(f"Переоптимизация {symbol} {timeframe} на {len(data)} свечах: {summary}; модель сохранена")
+            return result
+
+        if self.save:
+            try:
+                best_params = {name: value for name, value in result["params"].items()
+                               if name not in ("symbol", "timeframe", *MODEL_METRICS)}
+                save_best_params(best_params, symbol, timeframe, candidate, candidate["num_orders"], logger)
+            except OSError as e:
+                logger.warning(f"Модель {symbol} {timeframe} не сохранена: {e}")
+        model.swap_model(result["params"], data)
+        REOPTIMIZATIONS.labels(symbol, timeframe, "swapped").inc()
+        message = f"Модель {symbol} {timeframe} заменена после переоптимизации на {len(data)} свечах: {summary}"
+        logger.info(message)
+        await model.telegram_bot.send_message(message)
+        return result
+
+
+async def _notify_resumed(connection_stats, telegram_bot, url):
+    """
+    Сообщает о возобновлении обработки после обрыва соединения и учитывает простой в WS_OUTAGE.
+
+    Вызывается после первой обработанной закрытой свечи (LiveModel.on_processed), то есть после дозагрузки
+    пропуска и решения, а не по первому сообщению нового соединения.
+    """
+    outage = connection_stats.resumed()
+    if outage is not None:
+        WS_OUTAGE.labels(url).observe(outage)
+        resume_message = (f"Обработка возобновлена через {outage:.1f} с после обрыва соединения "
+                          f"(переподключений: {connection_stats.reconnects})")
+        logger.info(resume_message)
+        await telegram_bot.send_message(resume_message)
+
+
 async def live_trading(filename, telegram_token, telegram_chat_id, mode="production", ws_url=None,
                       initial_capital=10000, exchange_name='binance', api_key=None, api_secret=None,
-                      category='linear', timeframe='1h'):
-    """Запуск торговли в реальном времени или симуляции."""
+                      category='linear', timeframe='1h', warm_start=None, reconnect=None, backfill=None,
+                      symbol=None, exchange=None, on_decision=None, intrabar_exits=False, compute="inline",
+                      compute_workers=None, backpressure="coalesce", executor=None, reoptimize_interval=None,
+                      reoptimize_trials=100, reoptimize_window=3000, commission=0.00075):
+    """
+    Запуск торговли в реальном времени или симуляции.
+
+    Биржи присылают обновления незакрытой свечи несколько раз в секунду (Bybit — с флагом confirm,
+    Binance — с флагом x). Стратегия запускается только по закрытой свече, а обновления незакрытой
+    в буфер не попадают; intrabar_exits включает закрытие позиции по стоп-лоссу и тейк-профиту
+    по текущей цене незакрытой свечи (LiveModel.on_update).
+
+    warm_start задает источник истории для предзаполнения буфера перед подключением к потоку: 'rest',
+    'store' (см. warm_start_buffer) или 'none'. По умолчанию 'rest' в режиме production и 'none' в режиме
+    simulation, где симулятор сам передает историю.
+
+    reconnect включает переподключение с экспоненциальной задержкой и повторной подпиской после обрыва
+    соединения, backfill — дозагрузку пропущенных свечей через REST перед возобновлением решений.
+    По умолчанию оба включены в режиме production и выключены в режиме simulation.
+
+    compute задает, где рассчитывается стратегия: 'inline' (в цикле событий), 'thread' или 'process'
+    (пул из compute_workers потоков или процессов, см. create_compute_executor); вне цикла событий закрытые
+    свечи обрабатываются с backpressure 'coalesce' или 'drop' (см. LiveModel). executor — готовый исполнитель,
+    общий для нескольких экземпляров (тогда compute не используется, и исполнитель не останавливается).
+
+    reoptimize_interval (секунды) включает фоновую переоптимизацию модели на окне из reoptimize_window свечей
+    (reoptimize_trials испытаний, комиссия commission) с заменой модели на лету, если кандидат лучше
+    (см. Reoptimizer).
+
+    symbol заменяет символ модели, exchange — готовый ExchangeAdapter (например, с MockExchange),
+    on_decision(symbol, candle, decision) вызывается после каждого решения (нагрузочный тест load_test.py).
+    ws_url в режиме production заменяет адрес потока биржи.
+    """
+    configure_logging()
+    telegram_bot = TelegramBot(telegram_token, telegram_chat_id, timeout=20)
+    own_executor = executor is None
+    reoptimize_task = None
     try:
         model_params = load_model_params(filename)
-        symbol = model_params["symbol"]
-        timeframe_from_file = model_params.get("timeframe", timeframe)
-        strategy_params = {k: v for k, v in model_params.items() if k not in ["symbol", "timeframe", "limit",
-                                                                             "stop_loss_multiplier",
-                                                                             "take_profit_multiplier"]}
-        stop_loss_multiplier = model_params.get("stop_loss_multiplier", 2)
-        take_profit_multiplier = model_params.get("take_profit_multiplier", 4)
-
-        telegram_bot = TelegramBot(telegram_token, telegram_chat_id, timeout=20)
-        exchange = ExchangeAdapter(exchange_name, api_key, api_secret)
-
-        # Преобразование timeframe для Bybit, если используется
-        ws_timeframe = timeframe_from_file
-        if exchange_name == 'bybit':
-            ws_timeframe = convert_timeframe_for_bybit(timeframe_from_file)
+        exchange = exchange or get_exchange_adapter(exchange_name, api_key, api_secret)
+        if own_executor:
+            executor = create_compute_executor(compute, compute_workers, preload=STRATEGY_MODULE)
+        model = LiveModel(model_params, mode, exchange, telegram_bot, initial_capital, symbol, timeframe,
+                          warm_start, backfill, on_decision, intrabar_exits, executor, backpressure)
+        if reoptimize_interval:
+            reoptimize_task = asyncio.create_task(Reoptimizer(
+                [model], reoptimize_interval, reoptimize_trials, reoptimize_window, initial_capital, commission).run())
 
         # Определение WebSocket URL
         if mode == "production":
-            if exchange_name == 'binance':
-                ws_url = f"wss://stream.binance.com:9443/ws/{symbol.lower().replace('/', '')}usdt@kline_{timeframe_from_file}"
-            elif exchange_name == 'bybit':
-                if category == 'spot':
-                    ws_url = "wss://stream.bybit.com/v5/public/spot"
-                elif category == 'linear':
-                    ws_url = "wss://stream.bybit.com/v5/public/linear"
-                elif category == 'inverse':
-                    ws_url = "wss://stream.bybit.com/v5/public/inverse"
-                elif category == 'option':
-                    ws_url = "wss://stream.bybit.com/v5/public/option"
-                else:
-                    raise ValueError(f"Неподдерживаемая категория для Bybit: {category}")
+            if ws_url:
+                logger.info(f"Используется заданный адрес потока: {ws_url}")
             else:
-                raise ValueError(f"Неподдерживаемая биржа: {exchange_name}")
+                ws_url = stream_url(exchange_name, category, model.symbol, model.timeframe)
         elif mode == "simulation":
             ws_url = ws_url or "ws://localhost:8765"
         else:
             raise ValueError("Неверный режим. Используйте 'production' или 'simulation'.")
 
-        data_buffer = pd.DataFrame()
-        cash = initial_capital
-        assets = 0.0
-        position_open = False
-        entry_price = 0.0
-        stop_loss = 0.0
-        take_profit = 0.0
-
-        required_candles = max(strategy_params.get("long_period", 50), strategy_params.get("ema_long_period", 200))
-
         logger.info(f"Подключение к {ws_url} в режиме {mode}")
         await telegram_bot.send_message(f"Подключение к {ws_url} в режиме {mode}")
 
-        async with websockets.connect(ws_url) as websocket:
-            if exchange_name == 'bybit' and mode == "production":
-                subscription_message = {
-                    "op": "subscribe",
-                    "args": [f"kline.{ws_timeframe}.{symbol.replace('/', '')}"]
-                }
-                await websocket.send(json.dumps(subscription_message))
-                logger.info(f"Отправлена подписка: {subscription_message}")
-
-            while True:
-                try:
-                    response = await websocket.recv()
-                    data = json.loads(response)
-
-                    # Обработка данных в зависимости от режима
-                    if mode == "simulation":
-                        # Ожидаем данные в формате {'open': ..., 'high': ..., 'low': ..., 'close': ..., 'volume': ..., 'timestamp': ...}
-                        candle_time = pd.to_datetime(data['timestamp'])
-                        df = pd.DataFrame([{
-                            'open': float(data['open']),
-                            'high': float(data['high']),
-                            'low': float(data['low']),
-                            'close': float(data['close']),
-                            'volume': float(data['volume']),
-                            'timestamp': candle_time
-                        }])
-                        df.set_index('timestamp', inplace=True)
-                        data_buffer = pd.concat([data_buffer, df])
-
-                    # Обработка данных от Bybit
-                    elif exchange_name == 'bybit' and 'topic' in data and data['topic'].startswith('kline'):
-                        candle = data['data'][0]
-                        candle_time = pd.to_datetime(candle['start'], unit='ms')
-                        df = pd.DataFrame([{
-                            'open': float(candle['open']),
-                            'high': float(candle['high']),
-                            'low': float(candle['low']),
-                            'close': float(candle['close']),
-                            'volume': float(candle['volume']),
-                            'timestamp': candle_time
-                        }])
-                        df.set_index('timestamp', inplace=True)
-                        data_buffer = pd.concat([data_buffer, df])
-
-                    # Обработка данных от Binance
-                    elif exchange_name == 'binance' and 'k' in data:
-                        candle = data['k']
-                        if candle['x']:  # Проверяем, закрыта ли свеча
-                            candle_time = pd.to_datetime(candle['t'], unit='ms')
-                            df = pd.DataFrame([{
-                                'open': float(candle['o']),
-                                'high': float(candle['h']),
-                                'low': float(candle['l']),
-                                'close': float(candle['c']),
-                                'volume': float(candle['v']),
-                                'timestamp': candle_time
-                            }])
-                            df.set_index('timestamp', inplace=True)
-                            data_buffer = pd.concat([data_buffer, df])
-
-                    # Ограничение буфера данных
-                    limit = model_params.get("limit", 100)
-                    if len(data_buffer) > limit:
-                        data_buffer = data_buffer.iloc[-limit:]
-
-                    if len(data_buffer) < required_candles:
-                        continue
-
-                    # Применение стратегии
-                    strategy_data = moving_average_strategy(data_buffer.copy(), **strategy_params, debug=False)
-                    latest_signal = strategy_data['signal'].iloc[-1]
-                    atr = strategy_data['atr'].iloc[-1]
-                    current_price = float(df['close'].iloc[0])
-                    logger.info(f"Текущая цена: {current_price}")
-                    decision = "Держать"
-                    transaction_amount = 0.0
-
-                    # Логика торговли в режиме production
-                    if mode == "production" and position_open:
-                        balance = exchange.fetch_balance()
-                        assets = balance['total'].get(symbol.split('/')[0], 0)
-                        if current_price <= stop_loss or current_price >= take_profit or latest_signal == -1:
-                            exchange.create_order(symbol, 'sell', assets, stop_loss=stop_loss, take_profit=take_profit)
-                            decision = "Продажа"
-                            transaction_amount = assets
-                            cash += assets * current_price
-                            assets = 0.0
-                            position_open = False
-                    elif mode == "production" and latest_signal == 1 and not position_open:
-                        amount = cash / current_price
-                        exchange.create_order(symbol, 'buy', amount, stop_loss=stop_loss, take_profit=take_profit)
-                        decision = "Покупка"
-                        transaction_amount = amount
-                        assets = amount
-                        cash = 0.0
-                        position_open = True
-                        entry_price = current_price
-                        stop_loss = entry_price - atr * stop_loss_multiplier
-                        take_profit = entry_price + atr * take_profit_multiplier
-
-                    # Логика торговли в режиме simulation
-                    elif mode == "simulation":
-                        if position_open:
-                            if current_price <= stop_loss:
-                                decision = "Продажа (стоп-лосс)"
-                                transaction_amount = assets
-                                cash += assets * current_price
-                                assets = 0.0
-                                position_open = False
-                            elif current_price >= take_profit:
-                                decision = "Продажа (тейк-профит)"
-                                transaction_amount = assets
-                                cash += assets * current_price
-                                assets = 0.0
-                                position_open = False
-                            elif latest_signal == -1:
-                                decision = "Продажа (сигнал)"
-                                transaction_amount = assets
-                                cash += assets * current_price
-                                assets = 0.0
-                                position_open = False
-                        else:
-                            if latest_signal == 1 and cash > 0:
-                                decision = "Покупка"
-                                transaction_amount = cash / current_price
-                                assets = transaction_amount
-                                cash = 0.0
-                                position_open = True
-                                entry_price = current_price
-                                stop_loss = entry_price - atr * stop_loss_multiplier
-                                take_profit = entry_price + atr * take_profit_multiplier
-
-                    # Формирование отчёта
-                    portfolio_value = cash + assets * current_price
-                    action_detail = (f"{decision}: {transaction_amount:.2f} {symbol.split('/')[0]}"
-                                    if decision != "Держать" else "")
-                    portfolio_detail = f"({cash:.2f} USDT + {assets:.2f} {symbol.split('/')[0]})"
-                    message = (f"[{candle_time}] Символ: {symbol}, Решение: {decision}, "
-                              f"Цена: {current_price:.2f}, {action_detail}, Портфель: {portfolio_value:.2f} USDT {portfolio_detail}")
-
-                    if decision != "Держать":
-                        await telegram_bot.send_message(message)
-                    logger.info(message)
-
-                except ConnectionClosedOK:
-                    logger.info("Соединение закрыто корректно.")
-                    break
-                except Exception as e:
-                    logger.error(f"Ошибка в цикле обработки: {e}")
-                    await telegram_bot.send_message(f"Ошибка: {e}")
+        subscribe = kline_subscription(exchange_name, mode, model.symbol, model.timeframe)
+        decoder = KlineDecoder("simulator" if mode == "simulation" else exchange_name)
+        connection_stats = ConnectionStats()
+        reconnect = reconnect if reconnect is not None else mode == "production"
+        messages_metric = WS_MESSAGES.labels(model.symbol)
+        model.on_processed = lambda: _notify_resumed(connection_stats, telegram_bot, ws_url)
+        async for response in supervised_messages(ws_url, subscribe, connection_stats, reconnect, logger=logger):
+            messages_metric.inc()
+            try:
+                candles = decoder.decode(response)
+                # Служебные сообщения (подтверждение подписки) не содержат свечей
+                if not candles:
+                    continue
+                # Решения по стратегии — только по закрытым свечам; из незакрытых важна лишь последняя
+                closed = [candle for candle in candles if candle.closed]
+                if closed and executor is not None:
+                    model.submit(closed)
+                elif closed:
+                    await model.on_candles(closed)
+                if not candles[-1].closed:
+                    await model.on_update(candles[-1])
+            except Exception as e:
+                logger.error(f"Ошибка в цикле обработки: {e}")
+                await telegram_bot.send_message(f"Ошибка: {e}")
+        await model.flush()
 
     except InvalidStatus as e:
         logger.error(f"Ошибка WebSocket: {e}")
@@ -255,11 +702,106 @@ async def live_trading(filename, telegram_token, telegram_chat_id, mode="product
         logger.error(f"Критическая ошибка: {e}")
         await telegram_bot.send_message(f"Критическая ошибка: {e}")
         raise
+    finally:
+        if reoptimize_task is not None:
+            reoptimize_task.cancel()
+        if own_executor and executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def live_trading_multi(filenames, telegram_token, telegram_chat_id, mode="production", ws_url=None,
+                             initial_capital=10000, exchange_name='binance', api_key=None, api_secret=None,
+                             category='linear', warm_start=None, reconnect=None, backfill=None, exchange=None,
+                             on_decision=None, intrabar_exits=False, compute="inline", compute_workers=None,
+                             backpressure="coalesce", reoptimize_interval=None, reoptimize_trials=100,
+                             reoptimize_window=3000, commission=0.00075):
+    """
+    Торговля несколькими моделями с одной минутной подпиской на символ.
+
+    Для каждого символа открывается одно соединение с потоком 1m; CandleAggregator строит из закрытых
+    минутных свечей закрытые свечи таймфреймов моделей этого символа (5m, 15m, 1h, 4h, ...), и каждая модель
+    получает свечи своего таймфрейма. Число соединений и сообщений растет с числом символов, а не
+    символов x таймфреймов. В режиме simulation симулятор должен отдавать минутные свечи. Незакрытые
+    минутные свечи передаются всем моделям символа в on_update (проверка стоп-лосса и тейк-профита
+    при intrabar_exits).
+
+    Параметры совпадают с live_trading; filenames — список файлов моделей, капитал выделяется каждой модели.
+    Пул compute общий для всех моделей: пока рассчитываются старшие таймфреймы, потоки символов продолжают
+    читать сообщения. Фоновая переоптимизация (reoptimize_interval) обходит модели по очереди в одном процессе.
+    """
+    configure_logging()
+    telegram_bot = TelegramBot(telegram_token, telegram_chat_id, timeout=20)
+    exchange = exchange or get_exchange_adapter(exchange_name, api_key, api_secret)
+    executor = create_compute_executor(compute, compute_workers, preload=STRATEGY_MODULE)
+    models_by_symbol = {}
+    for filename in filenames:
+        model = LiveModel(load_model_params(filename), mode, exchange, telegram_bot, initial_capital,
+                          warm_start=warm_start, backfill=backfill, on_decision=on_decision,
+                          intrabar_exits=intrabar_exits, executor=executor, backpressure=backpressure)
+        models_by_symbol.setdefault(model.symbol, []).append(model)
+    reconnect = reconnect if reconnect is not None else mode == "production"
+
+    async def run_symbol(symbol, models):
+        if mode == "production":
+            url = ws_url or stream_url(exchange_name, category, symbol, '1m')
+        else:
+            url = ws_url or "ws://localhost:8765"
+        aggregator = CandleAggregator([model.timeframe for model in models])
+        models_by_timeframe = {}
+        for model in models:
+            models_by_timeframe.setdefault(model.timeframe, []).append(model)
+        logger.info(f"Подключение к {url} для {symbol}: таймфреймы {aggregator.timeframes}, моделей {len(models)}")
+
+        decoder = KlineDecoder("simulator" if mode == "simulation" else exchange_name)
+        connection_stats = ConnectionStats()
+        subscribe = kline_subscription(exchange_name, mode, symbol, '1m')
+        messages_metric = WS_MESSAGES.labels(symbol)
+        for model in models:
+            model.on_processed = lambda: _notify_resumed(connection_stats, telegram_bot, url)
+        async for response in supervised_messages(url, subscribe, connection_stats, reconnect, logger=logger):
+            messages_metric.inc()
+            try:
+                for minute in decoder.decode(response):
+                    if not minute.closed:
+                        for model in models:
+                            await model.on_update(minute)
+                        continue
+                    for timeframe, candle in aggregator.update(minute):
+                        for model in models_by_timeframe[timeframe]:
+                            if executor is not None:
+                                model.submit([candle])
+                                continue
+                            try:
+                                await model.on_candles([candle])
+                            except Exception as e:
+                                logger.error(f"Ошибка модели {symbol} {timeframe}: {e}")
+                                await telegram_bot.send_message(f"Ошибка {symbol} {timeframe}: {e}")
+            except Exception as e:
+                logger.error(f"Ошибка в цикле обработки {symbol}: {e}")
+                await telegram_bot.send_message(f"Ошибка: {e}")
+        for model in models:
+            await model.flush()
+
+    await telegram_bot.send_message(f"Запуск {len(filenames)} моделей по {len(models_by_symbol)} символам "
+                                    f"в режиме {mode}")
+    reoptimize_task = None
+    if reoptimize_interval:
+        reoptimize_task = asyncio.create_task(Reoptimizer(
+            [model for models in models_by_symbol.values() for model in models], reoptimize_interval,
+            reoptimize_trials, reoptimize_window, initial_capital, commission).run())
+    try:
+        await asyncio.gather(*(run_symbol(symbol, models) for symbol, models in models_by_symbol.items()))
+    finally:
+        if reoptimize_task is not None:
+            reoptimize_task.cancel()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Запуск торговли в реальном времени или симуляции")
-    parser.add_argument("filename", help="Имя файла с параметрами модели")
+    parser.add_argument("filename", help="Имя файла с параметрами модели (несколько через запятую — "
+                                         "одна минутная подписка на символ для всех моделей)")
     parser.add_argument("telegram_token", help="Токен Telegram бота")
     parser.add_argument("telegram_chat_id", help="ID чата Telegram")
     parser.add_argument("--mode", default="production", help="Режим: production или simulation")
@@ -270,8 +812,48 @@ if __name__ == "__main__":
     parser.add_argument("--api_secret", help="API-секрет")
     parser.add_argument("--category", default="linear", help="Категория торговли для Bybit: spot, linear, inverse, option")
     parser.add_argument("--timeframe", default="1h", help="Таймфрейм (например, 1h, 5m)")
+    parser.add_argument("--warm_start", default=None,
+                        help="Источник истории для предзаполнения буфера: rest, store или none")
+    parser.add_argument("--reconnect", action=argparse.BooleanOptionalAction, default=None,
+                        help="Переподключение после обрыва соединения (по умолчанию только в production)")
+    parser.add_argument("--backfill", action=argparse.BooleanOptionalAction, default=None,
+                        help="Дозагрузка пропущенных свечей через REST (по умолчанию только в production)")
+    parser.add_argument("--intrabar_exits", action="store_true",
+                        help="Закрывать позицию по стоп-лоссу и тейк-профиту внутри незакрытой свечи")
+    parser.add_argument("--compute", default="inline", choices=["inline", "thread", "process"],
+                        help="Где рассчитывать стратегию: в цикле событий, в пуле потоков или процессов")
+    parser.add_argument("--compute_workers", type=int, default=None, help="Размер пула расчета стратегии")
+    parser.add_argument("--backpressure", default="coalesce", choices=["coalesce", "drop"],
+                        help="Свечи при отставании расчета: решение по последней (coalesce) или отбросить устаревшие (drop)")
+    parser.add_argument("--reoptimize_interval", type=float, default=None,
+                        help="Период фоновой переоптимизации модели в секундах (по умолчанию выключена)")
+    parser.add_argument("--reoptimize_trials", type=int, default=100, help="Испытаний Optuna на переоптимизацию")
+    parser.add_argument("--reoptimize_window", type=int, default=3000, help="Окно переоптимизации в свечах")
+    parser.add_argument("--commission", type=float, default=0.00075, help="Комиссия бэктестов переоптимизации")
+    parser.add_argument("--metrics_port", type=int, default=None,
+                        help="Порт HTTP-эндпоинта метрик Prometheus (/metrics); по умолчанию не запускается")
+    parser.add_argument("--log_sample_rate", type=float, default=DEFAULT_SAMPLE_RATE,
+                        help="Максимум частых записей лога в секунду на место вызова (0 — без ограничения)")
 
     args = parser.parse_args()
-    asyncio.run(live_trading(args.filename, args.telegram_token, args.telegram_chat_id, args.mode,
-                            args.ws_url, args.initial_capital, args.exchange_name, args.api_key,
-                            args.api_secret, args.category, args.timeframe))
\ No newline at end of file
+    configure_logging(args.log_sample_rate)
+    if args.metrics_port is not None:
+        start_metrics_server(args.metrics_port)
+    if ',' in args.filename:
+        asyncio.run(live_trading_multi(args.filename.split(','), args.telegram_token, args.telegram_chat_id,
+                                       args.mode, args.ws_url, args.initial_capital, args.exchange_name,
+                                       args.api_key, args.api_secret, args.category, args.warm_start,
+                                       args.reconnect, args.backfill, intrabar_exits=args.intrabar_exits,
+                                       compute=args.compute, compute_workers=args.compute_workers,
+                                       backpressure=args.backpressure, reoptimize_interval=args.reoptimize_interval,
+                                       reoptimize_trials=args.reoptimize_trials,
+                                       reoptimize_window=args.reoptimize_window, commission=args.commission))
+    else:
+        asyncio.run(live_trading(args.filename, args.telegram_token, args.telegram_chat_id, args.mode,
+                                 args.ws_url, args.initial_capital, args.exchange_name, args.api_key,
+                                 args.api_secret, args.category, args.timeframe, args.warm_start,
+                                 args.reconnect, args.backfill, intrabar_exits=args.intrabar_exits,
+                                 compute=args.compute, compute_workers=args.compute_workers,
+                                 backpressure=args.backpressure, reoptimize_interval=args.reoptimize_interval,
+                                 reoptimize_trials=args.reoptimize_trials, reoptimize_window=args.reoptimize_window,
+                                 commission=args.commission))
\ No newline at end of file
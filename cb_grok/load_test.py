@@ -0,0 +1,214 @@
+import asyncio
+import json
+import time
+import numpy as np
+import websockets
+from cb_grok.adapters.exchange_adapter import ExchangeAdapter
+from cb_grok.adapters.mock_exchange import MockExchange, synthetic_candles
+from cb_grok.live_trading import live_trading, load_model_params, convert_timeframe_for_bybit, STRATEGY_MODULE
+from cb_grok.utils.compute_executor import create_compute_executor
+from cb_grok.utils.utils import timeframe_to_milliseconds
+
+
+class ReplayServer:
+    """
+    Сервер воспроизведения свечей в формате публичного потока Bybit v5.
+
+    Клиент подписывается на топики kline.{interval}.{SYMBOL}; по каждому топику сервер отправляет свечи
+    символа с заданной частотой, перед отправкой открывая свечу на MockExchange (цена исполнения ордеров
+    совпадает с ценой свечи). Время отправки каждой свечи сохраняется для расчета задержки.
+    """
+
+    def __init__(self, exchange: MockExchange, replay: dict, interval: str, rate: float):
+        """
+        :param exchange: MockExchange, на котором открываются свечи.
+        :param replay: Словарь символ -> DataFrame свечей для воспроизведения.
+        :param interval: Интервал Bybit ('60', '240', ...).
+        :param rate: Частота свечей на символ в секунду.
+        """
+        self.exchange = exchange
+        self.replay = {symbol.replace('/', ''): (symbol, data) for symbol, data in replay.items()}
+        self.interval = interval
+        self.rate = rate
+        self.send_times = {}
+
+    async def _stream(self, websocket, topic):
+        symbol, data = self.replay[topic.split('.')[-1]]
+        timestamps = data.index.as_unit('ms').asi8
+        start = time.perf_counter()
+        for k, (timestamp, row) in enumerate(zip(timestamps, data.itertuples(index=False))):
+            delay = start + k / self.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.exchange.advance(symbol, int(timestamp))
+            message = json.dumps({
+                "topic": topic, "type": "snapshot", "ts": int(timestamp),
+                "data": [{"start": int(timestamp), "interval": self.interval, "open": str(row.open),
+                          "high": str(row.high), "low": str(row.low), "close": str(row.close),
+                          "volume": str(row.volume), "confirm": True}]})
+            self.send_times[(symbol, int(timestamp))] = time.perf_counter()
+            await websocket.send(message)
+
+    async def handler(self, websocket):
+        request = json.loads(await websocket.recv())
+        topics = [topic for topic in request.get("args", []) if topic.split('.')[-1] in self.replay]
+        await websocket.send(json.dumps({"success": True, "op": "subscribe", "ret_msg": ""}))
+        await asyncio.gather(*(self._stream(websocket, topic) for topic in topics))
+        await websocket.close(code=1000, reason="Replay complete")
+
+
+async def _probe_loop_lag(lags, interval=0.01):
+    """Задержки пробуждения цикла событий сверх interval (насколько цикл занят синхронной работой)."""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+async def run_step(model_file, n_symbols, rate, n_candles=200, latency=0.0, port=8790, initial_capital=10000,
+                   fee=0.0, seed=None, compute="inline", compute_workers=None, backpressure="coalesce"):
+    """
+    Один шаг нагрузки: n_symbols копий live_trading в одном цикле событий получают свечи с частотой rate
+    на символ от ReplayServer и торгуют на общем MockExchange.
+
+    :param model_file: Файл модели из library/best_models_params.
+    :param n_symbols: Количество символов (экземпляров live_trading).
+    :param rate: Частота свечей на символ в секунду.
+    :param n_candles: Количество воспроизводимых свечей на символ.
+    :param latency: Задержка приватных запросов MockExchange в секундах.
+    :param port: Порт сервера воспроизведения.
+    :param initial_capital: Капитал одного экземпляра.
+    :param fee: Комиссия MockExchange. live_trading учитывает кэш без комиссии, поэтому при fee > 0 покупка
+                после продажи отклоняется биржей из-за нехватки средств (видно по 'errors').
+    :param seed: Зерно генератора синтетических свечей.
+    :param compute: Где рассчитывается стратегия ('inline', 'thread', 'process'); пул общий для всех символов.
+    :param compute_workers: Размер пула.
+    :param backpressure: Политика при отставании расчета (см. LiveModel).
+    :return: Словарь: предложенная и достигнутая пропускная способность (свечей/с), перцентили задержки
+             от отправки свечи до принятого решения (мс), задержка цикла событий (p99 и максимум, мс — насколько
+             откладываются чтение сообщений и пинги), количество решений, ордеров и свечей без решения
+             из-за ошибок или backpressure ('errors').
+    """
+    model_params = load_model_params(model_file)
+    timeframe = model_params["timeframe"]
+    history = max(model_params.get("limit", 100), model_params.get("long_period", 50),
+                  model_params.get("ema_long_period", 200)) + 10
+    symbols = [f"S{i:03d}/USDT" for i in range(n_symbols)]
+    candles = synthetic_candles(symbols, history + n_candles, timeframe_to_milliseconds(timeframe), seed=seed)
+    exchange = MockExchange(candles, balance={"USDT": initial_capital * n_symbols}, latency=latency, fee=fee)
+    for symbol in symbols:
+        exchange.advance(symbol, int(candles[symbol].index[history - 1].value // 10**6))
+    adapter = ExchangeAdapter('bybit', client=exchange)
+    server = ReplayServer(exchange, {symbol: candles[symbol].iloc[history:] for symbol in symbols},
+                          convert_timeframe_for_bybit(timeframe), rate)
+
+    latencies = []
+    finished = []
+
+    def on_decision(symbol, candle, decision):
+        now = time.perf_counter()
+        latencies.append(now - server.send_times[(symbol, candle.timestamp)])
+        finished.append(now)
+
+    executor = create_compute_executor(compute, compute_workers, preload=STRATEGY_MODULE)
+    loop_lags = []
+    try:
+        async with websockets.serve(server.handler, "localhost", port, max_size=None):
+            start = time.perf_counter()
+            probe = asyncio.create_task(_probe_loop_lag(loop_lags))
+            await asyncio.gather(*(live_trading(model_file, None, None, mode="production",
+                                                ws_url=f"ws://localhost:{port}", initial_capital=initial_capital,
+                                                exchange_name='bybit', warm_start="rest", reconnect=False,
+                                                backfill=True, symbol=symbol, exchange=adapter,
+                                                on_decision=on_decision, backpressure=backpressure,
+                                                executor=executor)
+                                   for symbol in symbols))
+            probe.cancel()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    elapsed = (max(finished) if finished else time.perf_counter()) - start
+    latencies_ms = np.array(latencies) * 1000
+    loop_lags_ms = np.array(loop_lags) * 1000
+    return {
+        "n_symbols": n_symbols,
+        "rate_per_symbol": rate,
+        "offered_rate": rate * n_symbols,
+        "throughput": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "latency_p50_ms": float(np.percentile(latencies_ms, 50)) if len(latencies_ms) else float("nan"),
+        "latency_p95_ms": float(np.percentile(latencies_ms, 95)) if len(latencies_ms) else float("nan"),
+        "latency_p99_ms": float(np.percentile(latencies_ms, 99)) if len(latencies_ms) else float("nan"),
+        "latency_max_ms": float(latencies_ms.max()) if len(latencies_ms) else float("nan"),
+        "loop_lag_p99_ms": float(np.percentile(loop_lags_ms, 99)) if len(loop_lags_ms) else float("nan"),
+        "loop_lag_max_ms": float(loop_lags_ms.max()) if len(loop_lags_ms) else float("nan"),
+        "decisions": len(latencies),
+        "errors": n_candles * n_symbols - len(latencies),
+        "orders": exchange.calls["create_order"],
+    }
+
+
+def is_saturated(result, max_p99_ms=1000.0, min_efficiency=0.9):
+    """Шаг насыщен, если пропускная способность ниже min_efficiency от предложенной или p99 выше max_p99_ms."""
+    return result["throughput"] < min_efficiency * result["offered_rate"] or result["latency_p99_ms"] > max_p99_ms
+
+
+async def run_load_test(model_file, symbol_counts=(1, 2, 4, 8), rates=(1, 5, 10, 20, 50), n_candles=200,
+                        latency=0.0, max_p99_ms=1000.0, port=8790, seed=None, compute="inline", compute_workers=None,
+                        backpressure="coalesce", logger=None):
+    """
+    Нагрузочный тест live_trading без бирж: шаги с растущим числом символов и частотой свечей.
+
+    Для каждого числа символов частота увеличивается до первого насыщенного шага (is_saturated),
+    более высокие частоты для него не запускаются.
+
+    :return: Кортеж (список результатов run_step с признаком 'saturated', точки насыщения по числу символов:
+             словарь n_symbols -> предложенная частота первого насыщенного шага или None).
+    """
+    results = []
+    saturation = {}
+    for n_symbols in symbol_counts:
+        saturation[n_symbols] = None
+        for rate in rates:
+            result = await run_step(model_file, n_symbols, rate, n_candles, latency, port, seed=seed, compute=compute,
+                                    compute_workers=compute_workers, backpressure=backpressure)
+            result["saturated"] = is_saturated(result, max_p99_ms)
+            results.append(result)
+            if logger:
+                logger.info(f"Нагрузка {n_symbols} символов x {rate} свечей/с: {result}")
+            if result["saturated"]:
+                saturation[n_symbols] = result["offered_rate"]
+                break
+    return results, saturation
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Офлайн нагрузочный тест live_trading с MockExchange")
+    parser.add_argument("model_file", help="Имя файла с параметрами модели из library/best_models_params")
+    parser.add_argument("--symbols", default="1,2,4,8", help="Количество символов на шагах через запятую")
+    parser.add_argument("--rates", default="1,5,10,20,50", help="Частота свечей на символ в секунду через запятую")
+    parser.add_argument("--n_candles", type=int, default=200, help="Количество свечей на символ на шаге")
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка приватных запросов биржи в секундах")
+    parser.add_argument("--max_p99_ms", type=float, default=1000.0, help="Допустимая задержка p99 в мс")
+    parser.add_argument("--port", type=int, default=8790, help="Порт сервера воспроизведения")
+    parser.add_argument("--seed", type=int, default=None, help="Зерно генератора синтетических свечей")
+    parser.add_argument("--compute", default="inline", choices=["inline", "thread", "process"],
+                        help="Где рассчитывать стратегию: в цикле событий, в пуле потоков или процессов")
+    parser.add_argument("--compute_workers", type=int, default=None, help="Размер пула расчета стратегии")
+    parser.add_argument("--backpressure", default="coalesce", choices=["coalesce", "drop"],
+                        help="Свечи при отставании расчета: решение по последней или отбросить устаревшие")
+
+    args = parser.parse_args()
+    results, saturation = asyncio.run(run_load_test(
+        args.model_file, [int(x) for x in args.symbols.split(',')], [float(x) for x in args.rates.split(',')],
+        args.n_candles, args.latency, args.max_p99_ms, args.port, args.seed, args.compute, args.compute_workers,
+        args.backpressure))
+    print(f"{'символов':>8} {'предл./с':>9} {'факт./с':>9} {'p50 мс':>9} {'p95 мс':>9} {'p99 мс':>9} "
+          f"{'цикл мс':>8} {'решений':>8} {'ордеров':>8} {'ошибок':>7}")
+    for r in results:
+        print(f"{r['n_symbols']:>8} {r['offered_rate']:>9.1f} {r['throughput']:>9.1f} {r['latency_p50_ms']:>9.1f} "
+              f"{r['latency_p95_ms']:>9.1f} {r['latency_p99_ms']:>9.1f} "
+              f"{r['loop_lag_p99_ms']:>8.1f} {r['decisions']:>8} {r['orders']:>8} {r['errors']:>7}"
+              + ("  насыщение" if r["saturated"] else ""))
+    for n_symbols, rate in saturation.items():
+        print(f"{n_symbols} символов: " + (f"насыщение при {rate:.1f} свечей/с" if rate else "насыщение не достигнуто"))
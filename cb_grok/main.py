@@ -1,85 +1,183 @@
 import sys
 import pandas as pd
-import os
 import logging
 from datetime import datetime
-from cb_grok.adapters.exchange_adapter import ExchangeAdapter
+from cb_grok.utils.log_pipeline import setup_logging, DEFAULT_SAMPLE_RATE
+from cb_grok.adapters.exchange_adapter import get_exchange_adapter
+from cb_grok.data.candle_store import CandleStore
+from cb_grok.utils.utils import timeframe_to_minutes
 from cb_grok.optimization.optimization import optimize_backtest
+from cb_grok.optimization.worker import run_worker, default_study_name
+from cb_grok.optimization.trial_budget import TrialBudget
 from cb_grok.backtest.backtest import run_backtest
-from cb_grok.live_trading import live_trading
+from cb_grok.live_trading import live_trading, live_trading_multi
+from cb_grok.utils.metrics_exporter import start_metrics_server
 import asyncio
 
 def main(mode, exchange_name='binance', api_key=None, api_secret=None, symbols=None, timeframe='1h',
          initial_capital=10000, commission=0.00075, n_trials=100, model_file=None, telegram_token=None,
-         telegram_chat_id=None, category='linear', live_trading_mode="production"):
+         telegram_chat_id=None, category='linear', live_trading_mode="production", resample=False,
+         storage=None, study_name=None, requeue_running=False, warm_start=None, seed_top_k=0, narrow_margin=None,
+         metrics_port=None, log_sample_rate=DEFAULT_SAMPLE_RATE, intrabar_exits=False, compute="inline",
+         compute_workers=None, backpressure="coalesce", intrabar=False, trial_accounting=False,
+         trial_time_limit=None, trial_memory_limit_mb=None, reoptimize_interval=None, reoptimize_trials=100,
+         reoptimize_window=3000):
     """Запускает программу в указанном режиме."""
     if symbols is None:
         symbols = ['BNB/USDT']
 
-    # Настройка логирования
-    log_folder = "log"
-    if not os.path.exists(log_folder):
-        os.makedirs(log_folder)
+    # Настройка логирования: JSONL в фоновом потоке; в режимах оптимизации строки испытаний Optuna
+    # дублируются в консоль тем же потоком
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_filename = f"{log_folder}/main_{timestamp}.log"
+    setup_logging(f"log/main_{timestamp}.jsonl", sample_rate=log_sample_rate,
+                  console=mode in ('optimizer', 'worker'))
     logger = logging.getLogger(__name__)
-    logger.setLevel(logging.INFO)
-    file_handler = logging.FileHandler(log_filename)
-    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-    logger.addHandler(file_handler)
 
-    adapter = ExchangeAdapter(exchange_name, api_key, api_secret)
+    if metrics_port is not None:
+        server = start_metrics_server(metrics_port)
+        logger.info(f"Метрики Prometheus доступны на порту {server.server_port} (/metrics)")
+
+    adapter = get_exchange_adapter(exchange_name, api_key, api_secret)
+    # Учет ресурсов испытаний включается явно или любым из лимитов
+    trial_budget = None
+    if trial_accounting or trial_time_limit is not None or trial_memory_limit_mb is not None:
+        trial_budget = TrialBudget(trial_time_limit, trial_memory_limit_mb,
+                                   track_memory=trial_accounting or trial_memory_limit_mb is not None)
 
     if mode == 'optimizer':
-        results_df = pd.DataFrame(columns=["symbol", "final_value", "total_return_percent",
-                                           "max_drawdown_percent", "sharpe_ratio", "num_orders"])
+        # Несколько таймфреймов через запятую строятся из одной минутной истории;
+        # старшие идут первыми, чтобы минутная история загружалась один раз в полном объёме
+        timeframes = sorted(timeframe.split(','), key=timeframe_to_minutes, reverse=True)
+        data_fetcher = CandleStore(adapter) if resample or len(timeframes) > 1 else adapter
+        results_df = pd.DataFrame(columns=["symbol", "timeframe", "final_value", "total_return_percent",
+                                           "max_drawdown_percent", "sharpe_ratio", "sortino_ratio", "calmar_ratio",
+                                           "profit_factor", "win_rate", "num_orders"])
         for symbol in symbols:
-            logger.info(f"Начинаем оптимизацию для {symbol}")
-            backtest_data, orders, metrics, num_orders = optimize_backtest(
-                adapter, symbol, timeframe, initial_capital, commission, n_trials, logger)
-            new_row = pd.DataFrame([{
-                "symbol": symbol,
-                "final_value": metrics["final_value"],
-                "total_return_percent": metrics["total_return_percent"],
-                "max_drawdown_percent": metrics["max_drawdown_percent"],
-                "sharpe_ratio": metrics["sharpe_ratio"],
-                "num_orders": num_orders
-            }])
-            results_df = pd.concat([results_df, new_row], ignore_index=True)
-            logger.info(f"Завершена оптимизация для {symbol}: Sharpe Ratio = {metrics['sharpe_ratio']:.2f}, "
-                        f"Количество ордеров = {num_orders}")
+            for symbol_timeframe in timeframes:
+                logger.info(f"Начинаем оптимизацию для {symbol} ({symbol_timeframe})")
+                result = optimize_backtest(data_fetcher, symbol, symbol_timeframe, initial_capital, commission,
+                                           n_trials, logger, seed_top_k, narrow_margin, trial_budget)
+                if result is None:
+                    continue
+                backtest_data, orders, metrics, num_orders = result
+                new_row = pd.DataFrame([{
+                    "symbol": symbol,
+                    "timeframe": symbol_timeframe,
+                    "final_value": metrics["final_value"],
+                    "total_return_percent": metrics["total_return_percent"],
+                    "max_drawdown_percent": metrics["max_drawdown_percent"],
+                    "sharpe_ratio": metrics["sharpe_ratio"],
+                    "sortino_ratio": metrics.get("sortino_ratio", 0),
+                    "calmar_ratio": metrics.get("calmar_ratio", 0),
+                    "profit_factor": metrics.get("profit_factor", 0),
+                    "win_rate": metrics.get("win_rate", 0),
+                    "num_orders": num_orders
+                }])
+                results_df = pd.concat([results_df, new_row], ignore_index=True)
+                logger.info(f"Завершена оптимизация для {symbol} ({symbol_timeframe}): "
+                            f"Sharpe Ratio = {metrics['sharpe_ratio']:.2f}, Количество ордеров = {num_orders}")
         results_df.to_csv("backtest_results.csv", index=False)
         logger.info("Общие результаты оптимизации:")
         logger.info(results_df.to_string())
         logger.info(f"Exchange name: {adapter.exchange_name}")
 
+    elif mode == 'worker':
+        if not storage:
+            raise ValueError("Для режима worker требуется общее хранилище (--storage): URL SQLAlchemy или путь к журналу")
+        timeframes = sorted(timeframe.split(','), key=timeframe_to_minutes, reverse=True)
+        data_fetcher = CandleStore(adapter) if resample or len(timeframes) > 1 else adapter
+        for symbol in symbols:
+            for symbol_timeframe in timeframes:
+                logger.info(f"Воркер подключается к исследованию для {symbol} ({symbol_timeframe})")
+                # Заданное имя исследования дополняется символом и таймфреймом, если их несколько
+                name = study_name
+                if study_name and len(symbols) * len(timeframes) > 1:
+                    name = f"{study_name}_{default_study_name(symbol, symbol_timeframe)}"
+                result = run_worker(data_fetcher, storage, symbol, symbol_timeframe, initial_capital, commission,
+                                    n_trials, name, requeue_running, logger, seed_top_k, trial_budget)
+                if result is not None:
+                    _, _, metrics, num_orders = result
+                    logger.info(f"Исследование для {symbol} ({symbol_timeframe}) завершено: "
+                                f"Sharpe Ratio = {metrics['sharpe_ratio']:.2f}, Количество ордеров = {num_orders}")
+
     elif mode == 'backtest':
         if not model_file:
             raise ValueError("Для режима backtest требуется указать файл модели (--model_file)")
         from cb_grok.run_model import run_model
-        run_model(model_file, initial_capital, commission)
+        run_model(model_file, initial_capital, commission, intrabar)
         logger.info(f"Бэктест завершен для модели {model_file}")
 
+    elif mode == 'portfolio':
+        if not model_file:
+            raise ValueError("Для режима portfolio требуется список файлов моделей через запятую (--model_file)")
+        from cb_grok.run_model import run_portfolio
+        equity, attribution, metrics = run_portfolio(model_file.split(','), initial_capital, commission)
+        logger.info(f"Бэктест портфеля завершен: {attribution.to_dict('records')}, Sharpe Ratio = "
+                    f"{metrics['sharpe_ratio']:.2f}, Итоговый капитал = {metrics['final_value']:.2f}")
+
+    elif mode == 'robustness':
+        if not model_file:
+            raise ValueError("Для режима robustness требуется указать файл модели (--model_file)")
+        from cb_grok.backtest.robustness import run_robustness
+        report = run_robustness(model_file, initial_capital, commission, logger=logger)
+        logger.info(f"Анализ устойчивости завершен для модели {model_file}: "
+                    f"{ {key: report[key] for key in ('base', 'paths')} }")
+
+    elif mode == 'stability':
+        if not model_file:
+            raise ValueError("Для режима stability требуется указать файл модели (--model_file)")
+        from cb_grok.backtest.stability import run_stability
+        summary, _, _ = run_stability(model_file, initial_capital, commission, logger=logger)
+        logger.info(f"Карта устойчивости построена для модели {model_file}: "
+                    f"stability_score = {summary['stability_score']:.2f}")
+
+    elif mode == 'costs':
+        from cb_grok.backtest.cost_scenarios import run_cost_scenarios
+        table = run_cost_scenarios(model_file.split(',') if model_file else None, initial_capital, logger=logger)
+        logger.info(f"Сценарии издержек рассчитаны: {table['model'].nunique() if len(table) else 0} моделей, "
+                    f"{len(table)} строк")
+
     elif mode == 'live_trading':
         if not (model_file and telegram_token and telegram_chat_id):
             raise ValueError("Для live_trading требуется model_file, telegram_token и telegram_chat_id")
-        asyncio.run(live_trading(model_file, telegram_token, telegram_chat_id, mode=live_trading_mode,
-                                 initial_capital=initial_capital, exchange_name=exchange_name,
-                                 api_key=api_key, api_secret=api_secret, category=category, timeframe=timeframe))
+        if ',' in model_file:
+            # Несколько моделей: одна минутная подписка на символ, старшие таймфреймы строятся на лету
+            asyncio.run(live_trading_multi(model_file.split(','), telegram_token, telegram_chat_id,
+                                           mode=live_trading_mode, initial_capital=initial_capital,
+                                           exchange_name=exchange_name, api_key=api_key, api_secret=api_secret,
+                                           category=category, warm_start=warm_start,
+                                           intrabar_exits=intrabar_exits, compute=compute,
+                                           compute_workers=compute_workers, backpressure=backpressure,
+                                           reoptimize_interval=reoptimize_interval,
+                                           reoptimize_trials=reoptimize_trials,
+                                           reoptimize_window=reoptimize_window, commission=commission))
+        else:
+            asyncio.run(live_trading(model_file, telegram_token, telegram_chat_id, mode=live_trading_mode,
+                                     initial_capital=initial_capital, exchange_name=exchange_name,
+                                     api_key=api_key, api_secret=api_secret, category=category,
+                                     timeframe=timeframe, warm_start=warm_start,
+                                     intrabar_exits=intrabar_exits, compute=compute,
+                                     compute_workers=compute_workers, backpressure=backpressure,
+                                     reoptimize_interval=reoptimize_interval, reoptimize_trials=reoptimize_trials,
+                                     reoptimize_window=reoptimize_window, commission=commission))
         logger.info("Запущена торговля в реальном времени")
 
     else:
-        raise ValueError(f"Неверный режим: {mode}. Используйте 'optimizer', 'backtest' или 'live_trading'")
+        raise ValueError(f"Неверный режим: {mode}. Используйте 'optimizer', 'worker', 'backtest', 'portfolio', 'robustness', 'stability', 'costs' или 'live_trading'")
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("Usage: python main.py <mode> [--exchange_name] [--api_key] [--api_secret] [--symbols] "
               "[--timeframe] [--initial_capital] [--commission] [--n_trials] [--model_file] "
-              "[--telegram_token] [--telegram_chat_id] [--category] [--live_trading_mode]")
+              "[--telegram_token] [--telegram_chat_id] [--category] [--live_trading_mode] [--resample] "
+              "[--storage] [--study_name] [--requeue_running] [--warm_start] [--seed_top_k] [--narrow_margin] [--metrics_port] [--log_sample_rate] [--intrabar_exits] "
+              "[--compute] [--compute_workers] [--backpressure] [--intrabar] [--trial_accounting] "
+              "[--trial_time_limit] [--trial_memory_limit_mb] [--reoptimize_interval] [--reoptimize_trials] "
+              "[--reoptimize_window]")
         sys.exit(1)
 
     mode = sys.argv[1]
-    args = {arg.split('=')[0].strip('--'): arg.split('=')[1] for arg in sys.argv[2:] if '=' in arg}
+    args = {arg.split('=', 1)[0].strip('--'): arg.split('=', 1)[1] for arg in sys.argv[2:] if '=' in arg}
 
     exchange_name = args.get('exchange_name', 'bybit')
     api_key = args.get('api_key')
@@ -96,6 +194,29 @@ if __name__ == "__main__":
     telegram_chat_id = args.get('telegram_chat_id')
     category = args.get('category', 'linear')
     live_trading_mode = args.get('live_trading_mode', 'production')
+    resample = args.get('resample', '0').lower() in ('1', 'true', 'yes')
+    storage = args.get('storage')
+    study_name = args.get('study_name')
+    requeue_running = args.get('requeue_running', '0').lower() in ('1', 'true', 'yes')
+    warm_start = args.get('warm_start')
+    seed_top_k = int(args.get('seed_top_k', 0))
+    narrow_margin = float(args['narrow_margin']) if 'narrow_margin' in args else None
+    metrics_port = int(args['metrics_port']) if 'metrics_port' in args else None
+    log_sample_rate = float(args.get('log_sample_rate', DEFAULT_SAMPLE_RATE))
+    intrabar_exits = args.get('intrabar_exits', '0').lower() in ('1', 'true', 'yes')
+    compute = args.get('compute', 'inline')
+    compute_workers = int(args['compute_workers']) if 'compute_workers' in args else None
+    backpressure = args.get('backpressure', 'coalesce')
+    intrabar = args.get('intrabar', '0').lower() in ('1', 'true', 'yes')
+    trial_accounting = args.get('trial_accounting', '0').lower() in ('1', 'true', 'yes')
+    trial_time_limit = float(args['trial_time_limit']) if 'trial_time_limit' in args else None
+    trial_memory_limit_mb = float(args['trial_memory_limit_mb']) if 'trial_memory_limit_mb' in args else None
+    reoptimize_interval = float(args['reoptimize_interval']) if 'reoptimize_interval' in args else None
+    reoptimize_trials = int(args.get('reoptimize_trials', 100))
+    reoptimize_window = int(args.get('reoptimize_window', 3000))
 
     main(mode, exchange_name, api_key, api_secret, symbols, timeframe, initial_capital, commission,
-         n_trials, model_file, telegram_token, telegram_chat_id, category, live_trading_mode)
\ No newline at end of file
+         n_trials, model_file, telegram_token, telegram_chat_id, category, live_trading_mode, resample,
+         storage, study_name, requeue_running, warm_start, seed_top_k, narrow_margin, metrics_port,
+         log_sample_rate, intrabar_exits, compute, compute_workers, backpressure, intrabar, trial_accounting,
+         trial_time_limit, trial_memory_limit_mb, reoptimize_interval, reoptimize_trials, reoptimize_window)
\ No newline at end of file
@@ -1,31 +1,50 @@
 import optuna
 import pandas as pd
-from cb_grok.strategies.moving_average_strategy import moving_average_strategy
-from cb_grok.backtest.backtest import run_backtest
-from cb_grok.utils.utils import save_model_results
+from contextlib import nullcontext
+from cb_grok.strategies.moving_average_strategy import moving_average_strategy, moving_average_arrays
+from cb_grok.backtest.backtest import run_backtest, run_backtest_arrays
+from cb_grok.backtest.metrics import periods_per_year, DEFAULT_PERIODS_PER_YEAR
+from cb_grok.data.dataset import OHLCVDataset
+from cb_grok.utils.utils import save_model_results, timeframe_to_milliseconds
+from cb_grok.utils.metrics_exporter import OptunaMetricsCallback
+from cb_grok.optimization.trial_budget import log_worst_trials
 import os
 import json
 import hashlib
 from datetime import datetime
 
-def optimize_backtest(data_fetcher, symbol, timeframe, initial_capital, commission, n_trials=100, logger=None):
+# Метрики, которые save_best_params записывает в файл модели рядом с параметрами, и база аннуализации Sharpe
+MODEL_METRICS = ("sharpe_ratio", "num_orders", "periods_per_year")
+# Штраф целевой функции за каждый включенный фильтр в единицах Sharpe, аннуализированного по 252 периодам
+COMPLEXITY_PENALTY = 0.05
+
+def split_train_val(data_fetcher, symbol, timeframe, logger=None, data_range=None):
     """
-    Оптимизирует параметры стратегии с использованием Optuna на обучающем наборе и валидирует на валидационном наборе.
+    Загружает историю и делит её на обучающий и валидационный наборы.
 
     :param data_fetcher: Объект для загрузки данных.
     :param symbol: Символ торговой пары.
     :param timeframe: Таймфрейм.
-    :param initial_capital: Начальный капитал.
-    :param commission: Комиссия.
-    :param n_trials: Количество испытаний.
     :param logger: Объект для логирования.
-    :return: Кортеж (backtest_data, orders, metrics, num_orders) для лучших параметров на валидационном наборе.
+    :param data_range: Пара (первая, последняя свеча) — загрузить ровно этот диапазон, а не последние свечи
+                       (одни и те же данные для всех воркеров исследования, см. worker.run_worker).
+    :return: Кортеж (train_data, val_data).
     """
     # Определение даты разделения: 1 марта 2025 года
     split_date = pd.to_datetime("2025-02-23 00:00:00")
 
     # Загрузка данных для обучения и валидации
-    full_data = data_fetcher.fetch_ohlcv(symbol, timeframe, limit=10000)  # Увеличен лимит до 10,000 свечей
+    if data_range is None:
+        full_data = data_fetcher.fetch_ohlcv(symbol, timeframe, limit=10000)  # Увеличен лимит до 10,000 свечей
+    else:
+        start, end = (pd.Timestamp(value) for value in data_range)
+        # Сколько последних свечей нужно загрузить, чтобы история дошла до start
+        step = pd.Timedelta(milliseconds=timeframe_to_milliseconds(timeframe))
+        total_limit = int((pd.Timestamp.now(tz="UTC").tz_localize(None) - start) / step) + 2
+        full_data = data_fetcher.fetch_ohlcv(symbol, timeframe, limit=1000, total_limit=total_limit)
+        full_data = full_data[(full_data.index >= start) & (full_data.index <= end)]
+        if full_data.empty or full_data.index[0] > start or full_data.index[-1] < end:
+            raise ValueError(f"Биржа не вернула свечи {symbol} ({timeframe}) за весь диапазон {start} - {end}")
     train_data = full_data[full_data.index < split_date]
     val_data = full_data[full_data.index >= split_date]
 
@@ -39,147 +58,234 @@ def optimize_backtest(data_fetcher, symbol, timeframe, initial_capital, commissi
 
     if logger:
         logger.info(f"Обучающий набор: {len(train_data)} свечей, Валидационный набор: {len(val_data)} свечей")
+    return train_data, val_data
+
+def run_strategy(data, params, debug=False, logger=None):
+    """Применяет moving_average_strategy с параметрами trial или модели."""
+    return moving_average_strategy(
+        data,
+        short_period=params["short_period"],
+        long_period=params["long_period"],
+        rsi_period=params["rsi_period"],
+        atr_period=params["atr_period"],
+        buy_rsi_threshold=params["buy_rsi_threshold"],
+        sell_rsi_threshold=params["sell_rsi_threshold"],
+        ema_short_period=params["ema_short_period"],
+        ema_long_period=params["ema_long_period"],
+        use_trend_filter=params["use_trend_filter"],
+        use_rsi_filter=params["use_rsi_filter"],
+        adx_period=params["adx_period"],
+        use_adx_filter=params["use_adx_filter"],
+        adx_threshold=params["adx_threshold"],
+        atr_threshold=params["atr_threshold"],
+        debug=debug,
+        logger=logger
+    )
+
+def run_strategy_arrays(dataset, params, logger=None):
+    """Массивы moving_average_arrays (сигналы, ATR и индикаторы) с параметрами trial или модели."""
+    return moving_average_arrays(
+        dataset,
+        short_period=params["short_period"],
+        long_period=params["long_period"],
+        rsi_period=params["rsi_period"],
+        atr_period=params["atr_period"],
+        buy_rsi_threshold=params["buy_rsi_threshold"],
+        sell_rsi_threshold=params["sell_rsi_threshold"],
+        ema_short_period=params["ema_short_period"],
+        ema_long_period=params["ema_long_period"],
+        use_trend_filter=params["use_trend_filter"],
+        use_rsi_filter=params["use_rsi_filter"],
+        adx_period=params["adx_period"],
+        use_adx_filter=params["use_adx_filter"],
+        adx_threshold=params["adx_threshold"],
+        atr_threshold=params["atr_threshold"],
+        logger=logger
+    )
+
+# Пространство поиска: параметр -> ("int" | "float", нижняя граница, верхняя граница) или ("categorical", варианты)
+SEARCH_SPACE = {
+    "short_period": ("int", 5, 15),
+    "long_period": ("int", 20, 50),
+    "limit": ("categorical", [1000, 2000, 3000]),
+    "rsi_period": ("int", 8, 16),
+    "atr_period": ("int", 8, 16),
+    "buy_rsi_threshold": ("float", 15, 35),  # Расширен диапазон
+    "sell_rsi_threshold": ("float", 65, 85),  # Расширен диапазон
+    "stop_loss_multiplier": ("float", 0.8, 2.0),
+    "take_profit_multiplier": ("float", 1.5, 3.5),
+    "ema_short_period": ("int", 15, 40),
+    "ema_long_period": ("int", 80, 150),
+    "use_trend_filter": ("categorical", [True, False]),
+    "use_rsi_filter": ("categorical", [True, False]),
+    "adx_period": ("int", 8, 16),
+    "adx_threshold": ("float", 15, 30),
+    "use_adx_filter": ("categorical", [True, False]),
+    "atr_threshold": ("float", 0.0, 1.0),  # Расширен диапазон
+}
+
+def suggest_params(trial, search_space=None):
+    """
+    Предлагает параметры trial из пространства поиска.
+
+    :param trial: Испытание Optuna.
+    :param search_space: Пространство поиска в формате SEARCH_SPACE (по умолчанию SEARCH_SPACE).
+    :return: Словарь параметров.
+    """
+    params = {}
+    for name, (kind, *bounds) in (search_space or SEARCH_SPACE).items():
+        if kind == "int":
+            params[name] = trial.suggest_int(name, bounds[0], bounds[1])
+        elif kind == "float":
+            params[name] = trial.suggest_float(name, bounds[0], bounds[1])
+        else:
+            params[name] = trial.suggest_categorical(name, bounds[0])
+    return params
+
+def make_objective(train_data, val_data, symbol, initial_capital, commission, logger=None, timeframe=None,
+                   search_space=None, budget=None):
+    """
+    Создает целевую функцию Optuna: среднее Sharpe Ratio на обучении и валидации со штрафом за сложность
+    (COMPLEXITY_PENALTY за каждый включенный фильтр, в масштабе аннуализации таймфрейма).
+
+    Наборы один раз преобразуются в неизменяемые OHLCVDataset: испытания не копируют данные, а стратегия
+    и бэктест выделяют только собственные массивы (сигналы, индикаторы, стоимость портфеля).
+
+    :param train_data: Обучающий набор (DataFrame или OHLCVDataset).
+    :param val_data: Валидационный набор (DataFrame или OHLCVDataset).
+    :param symbol: Символ торговой пары.
+    :param initial_capital: Начальный капитал.
+    :param commission: Комиссия.
+    :param logger: Объект для логирования.
+    :param timeframe: Таймфрейм для аннуализации Sharpe Ratio.
+    :param search_space: Пространство поиска (по умолчанию SEARCH_SPACE).
+    :param budget: TrialBudget — учет времени и памяти этапов испытания и их лимиты (None — без учета).
+    :return: Функция objective(trial).
+    """
+    train_dataset = train_data if isinstance(train_data, OHLCVDataset) else OHLCVDataset.from_frame(train_data)
+    val_dataset = val_data if isinstance(val_data, OHLCVDataset) else OHLCVDataset.from_frame(val_data)
+    # Sharpe аннуализируется по таймфрейму (множитель sqrt(баров в году)); штраф масштабируется так же,
+    # чтобы сохранить вес относительно Sharpe, который он имел при аннуализации по 252 периодам
+    penalty_per_filter = COMPLEXITY_PENALTY * (periods_per_year(timeframe) / DEFAULT_PERIODS_PER_YEAR) ** 0.5
 
     def objective(trial):
-        # Определяем параметры для оптимизации с расширенными диапазонами
-        params = {
-            "short_period": trial.suggest_int("short_period", 5, 15),
-            "long_period": trial.suggest_int("long_period", 20, 50),
-            "limit": trial.suggest_categorical("limit", [1000, 2000, 3000]),
-            "rsi_period": trial.suggest_int("rsi_period", 8, 16),
-            "atr_period": trial.suggest_int("atr_period", 8, 16),
-            "buy_rsi_threshold": trial.suggest_float("buy_rsi_threshold", 15, 35),  # Расширен диапазон
-            "sell_rsi_threshold": trial.suggest_float("sell_rsi_threshold", 65, 85),  # Расширен диапазон
-            "stop_loss_multiplier": trial.suggest_float("stop_loss_multiplier", 0.8, 2.0),
-            "take_profit_multiplier": trial.suggest_float("take_profit_multiplier", 1.5, 3.5),
-            "ema_short_period": trial.suggest_int("ema_short_period", 15, 40),
-            "ema_long_period": trial.suggest_int("ema_long_period", 80, 150),
-            "use_trend_filter": trial.suggest_categorical("use_trend_filter", [True, False]),
-            "use_rsi_filter": trial.suggest_categorical("use_rsi_filter", [True, False]),
-            "adx_period": trial.suggest_int("adx_period", 8, 16),
-            "adx_threshold": trial.suggest_float("adx_threshold", 15, 30),
-            "use_adx_filter": trial.suggest_categorical("use_adx_filter", [True, False]),
-            "atr_threshold": trial.suggest_float("atr_threshold", 0.0, 1.0)  # Расширен диапазон
-        }
+        params = suggest_params(trial, search_space)
         # Штраф за сложность модели
         complexity_penalty = (int(params["use_trend_filter"]) + int(params["use_rsi_filter"]) +
-                              int(params["use_adx_filter"])) * -0.05
+                              int(params["use_adx_filter"])) * -penalty_per_filter
+        resources = budget.start(trial) if budget else None
+        stage = resources.stage if resources else lambda name: nullcontext()
 
         try:
             # Тестирование на обучающем наборе
-            strategy_data_train = moving_average_strategy(
-                train_data.copy(),
-                short_period=params["short_period"],
-                long_period=params["long_period"],
-                rsi_period=params["rsi_period"],
-                atr_period=params["atr_period"],
-                buy_rsi_threshold=params["buy_rsi_threshold"],
-                sell_rsi_threshold=params["sell_rsi_threshold"],
-                ema_short_period=params["ema_short_period"],
-                ema_long_period=params["ema_long_period"],
-                use_trend_filter=params["use_trend_filter"],
-                use_rsi_filter=params["use_rsi_filter"],
-                adx_period=params["adx_period"],
-                use_adx_filter=params["use_adx_filter"],
-                adx_threshold=params["adx_threshold"],
-                atr_threshold=params["atr_threshold"],
-                debug=False,
-                logger=logger
-            )
-            _, _, metrics_train, num_orders_train = run_backtest(
-                strategy_data_train,
-                initial_capital,
-                commission,
-                params["stop_loss_multiplier"],
-                params["take_profit_multiplier"]
-            )
+            with stage("train_strategy"):
+                strategy_train = run_strategy_arrays(train_dataset, params, logger=logger)
+            with stage("train_backtest"):
+                _, _, metrics_train, num_orders_train = run_backtest_arrays(
+                    train_dataset,
+                    strategy_train["signal"],
+                    strategy_train["atr"],
+                    initial_capital,
+                    commission,
+                    params["stop_loss_multiplier"],
+                    params["take_profit_multiplier"],
+                    timeframe=timeframe
+                )
             if num_orders_train < 10:
                 if logger:
-                    logger.debug(f"Trial {trial.number}: Недостаточно ордеров на обучении ({num_orders_train})")
+                    logger.debug("Trial %d: Недостаточно ордеров на обучении (%d)", trial.number, num_orders_train)
                 return -float('inf')
 
             # Тестирование на валидационном наборе
-            strategy_data_val = moving_average_strategy(
-                val_data.copy(),
-                short_period=params["short_period"],
-                long_period=params["long_period"],
-                rsi_period=params["rsi_period"],
-                atr_period=params["atr_period"],
-                buy_rsi_threshold=params["buy_rsi_threshold"],
-                sell_rsi_threshold=params["sell_rsi_threshold"],
-                ema_short_period=params["ema_short_period"],
-                ema_long_period=params["ema_long_period"],
-                use_trend_filter=params["use_trend_filter"],
-                use_rsi_filter=params["use_rsi_filter"],
-                adx_period=params["adx_period"],
-                use_adx_filter=params["use_adx_filter"],
-                adx_threshold=params["adx_threshold"],
-                atr_threshold=params["atr_threshold"],
-                debug=False,
-                logger=logger
-            )
-            _, _, metrics_val, num_orders_val = run_backtest(
-                strategy_data_val,
-                initial_capital,
-                commission,
-                params["stop_loss_multiplier"],
-                params["take_profit_multiplier"]
-            )
+            with stage("val_strategy"):
+                strategy_val = run_strategy_arrays(val_dataset, params, logger=logger)
+            with stage("val_backtest"):
+                _, _, metrics_val, num_orders_val = run_backtest_arrays(
+                    val_dataset,
+                    strategy_val["signal"],
+                    strategy_val["atr"],
+                    initial_capital,
+                    commission,
+                    params["stop_loss_multiplier"],
+                    params["take_profit_multiplier"],
+                    timeframe=timeframe
+                )
             if num_orders_val < 5:
                 if logger:
-                    logger.debug(f"Trial {trial.number}: Недостаточно ордеров на валидации ({num_orders_val})")
+                    logger.debug("Trial %d: Недостаточно ордеров на валидации (%d)", trial.number, num_orders_val)
                 return -float('inf')
 
             # Целевая функция: Среднее Sharpe Ratio с учетом числа сделок
             sharpe_combined = (metrics_train["sharpe_ratio"] + metrics_val["sharpe_ratio"]) / 2
             return sharpe_combined + complexity_penalty
 
+        except optuna.TrialPruned as e:
+            if logger:
+                logger.warning("Trial %d для %s прерван по бюджету: %s", trial.number, symbol, e)
+            raise
         except Exception as e:
             if logger:
-                logger.error(f"Ошибка в trial {trial.number} для {symbol}: {e}")
+                logger.error("Ошибка в trial %d для %s: %s", trial.number, symbol, e)
             return -float('inf')
+        finally:
+            if resources:
+                resources.finish()
+
+    return objective
+
+def configure_optuna_logging(logger=None):
+    """
+    Настройка логирования Optuna.
 
-    # Настройка логирования Optuna
+    С logger строки испытаний передаются в корневой логгер (асинхронный конвейер log_pipeline, который
+    настраивает main.py) вместо синхронной записи обработчиком Optuna в stderr на каждом испытании.
+    """
     optuna.logging.set_verbosity(optuna.logging.INFO)
     if logger:
-        optuna.logging.enable_default_handler()
+        optuna.logging.disable_default_handler()
         optuna.logging.enable_propagation()
 
-    # Создание и запуск оптимизации
-    study = optuna.create_study(direction="maximize")
-    study.optimize(objective, n_trials=n_trials)
+def save_best_params(best_params, symbol, timeframe, metrics, num_orders, logger=None):
+    """
+    Сохраняет лучшие параметры в library/best_models_params.
 
-    best_params = study.best_params
+    Вместе с Sharpe Ratio сохраняется periods_per_year — база его аннуализации (баров таймфрейма в году),
+    чтобы Sharpe моделей разных таймфреймов и версий можно было сравнивать.
+
+    :return: Путь к сохраненному файлу.
+    """
+    params_str = json.dumps(best_params, sort_keys=True)
+    hash_object = hashlib.sha256(params_str.encode())
+    hash_hex = hash_object.hexdigest()[:16]
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    best_model_filename = f"library/best_models_params/{hash_hex}_{timestamp}.json"
+    best_params_with_meta = best_params.copy()
+    best_params_with_meta["symbol"] = symbol
+    best_params_with_meta["timeframe"] = timeframe
+    best_params_with_meta["sharpe_ratio"] = metrics["sharpe_ratio"]
+    best_params_with_meta["num_orders"] = num_orders
+    best_params_with_meta["periods_per_year"] = periods_per_year(timeframe)
+    with open(best_model_filename, 'w') as f:
+        json.dump(best_params_with_meta, f, indent=4)
     if logger:
-        logger.info(f"Лучшие параметры для {symbol}: {best_params}, Лучшее значение: {study.best_value:.2f}")
+        logger.info(f"Лучшие параметры сохранены в {best_model_filename}")
+    return best_model_filename
 
-    # Финальная валидация на валидационном наборе
+def validate_best_params(best_params, val_data, symbol, timeframe, initial_capital, commission, logger=None):
+    """
+    Финальная валидация лучших параметров на валидационном наборе и их сохранение.
+
+    :return: Кортеж (backtest_data, orders, metrics, num_orders).
+    """
     try:
-        strategy_data_val = moving_average_strategy(
-            val_data.copy(),
-            short_period=best_params["short_period"],
-            long_period=best_params["long_period"],
-            rsi_period=best_params["rsi_period"],
-            atr_period=best_params["atr_period"],
-            buy_rsi_threshold=best_params["buy_rsi_threshold"],
-            sell_rsi_threshold=best_params["sell_rsi_threshold"],
-            ema_short_period=best_params["ema_short_period"],
-            ema_long_period=best_params["ema_long_period"],
-            use_trend_filter=best_params["use_trend_filter"],
-            use_rsi_filter=best_params["use_rsi_filter"],
-            adx_period=best_params["adx_period"],
-            use_adx_filter=best_params["use_adx_filter"],
-            adx_threshold=best_params["adx_threshold"],
-            atr_threshold=best_params["atr_threshold"],
-            debug=True,  # Включен дебаг для анализа
-            logger=logger
-        )
+        strategy_data_val = run_strategy(val_data, best_params, debug=True, logger=logger)  # Включен дебаг для анализа
         backtest_data, orders, metrics, num_orders = run_backtest(
             strategy_data_val,
             initial_capital,
             commission,
             best_params["stop_loss_multiplier"],
-            best_params["take_profit_multiplier"]
+            best_params["take_profit_multiplier"],
+            timeframe=timeframe
         )
         if logger:
             logger.info(f"Результаты на валидационном наборе: Sharpe Ratio = {metrics['sharpe_ratio']:.2f}, "
@@ -187,20 +293,7 @@ def optimize_backtest(data_fetcher, symbol, timeframe, initial_capital, commissi
 
         # Сохранение параметров даже при нулевом Sharpe Ratio для анализа
         if num_orders >= 5:
-            params_str = json.dumps(best_params, sort_keys=True)
-            hash_object = hashlib.sha256(params_str.encode())
-            hash_hex = hash_object.hexdigest()[:16]
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            best_model_filename = f"library/best_models_params/{hash_hex}_{timestamp}.json"
-            best_params_with_meta = best_params.copy()
-            best_params_with_meta["symbol"] = symbol
-            best_params_with_meta["timeframe"] = timeframe
-            best_params_with_meta["sharpe_ratio"] = metrics["sharpe_ratio"]
-            best_params_with_meta["num_orders"] = num_orders
-            with open(best_model_filename, 'w') as f:
-                json.dump(best_params_with_meta, f, indent=4)
-            if logger:
-                logger.info(f"Лучшие параметры сохранены в {best_model_filename}")
+            save_best_params(best_params, symbol, timeframe, metrics, num_orders, logger)
         else:
             if logger:
                 logger.warning(f"Параметры не сохранены: Количество ордеров ({num_orders}) < 5")
@@ -210,4 +303,63 @@ def optimize_backtest(data_fetcher, symbol, timeframe, initial_capital, commissi
     except Exception as e:
         if logger:
             logger.error(f"Ошибка при валидации для {symbol}: {e}")
-        raise
\ No newline at end of file
+        raise
+
+def has_completed_trials(study):
+    """Есть ли в исследовании завершенные испытания (иначе study.best_params выбрасывает ValueError)."""
+    return bool(study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,)))
+
+def optimize_backtest(data_fetcher, symbol, timeframe, initial_capital, commission, n_trials=100, logger=None,
+                      seed_top_k=0, narrow_margin=None, budget=None):
+    """
+    Оптимизирует параметры стратегии с использованием Optuna на обучающем наборе и валидирует на валидационном наборе.
+
+    :param data_fetcher: Объект для загрузки данных.
+    :param symbol: Символ торговой пары.
+    :param timeframe: Таймфрейм.
+    :param initial_capital: Начальный капитал.
+    :param commission: Комиссия.
+    :param n_trials: Количество испытаний.
+    :param logger: Объект для логирования.
+    :param seed_top_k: Сколько лучших прошлых наборов параметров символа и таймфрейма поставить в очередь
+                       первыми испытаниями (0 — холодный старт, см. warm_start.warm_start_study).
+    :param narrow_margin: Если задан, числовые диапазоны сужаются вокруг прошлых наборов с этим запасом
+                          (см. warm_start.narrow_search_space).
+    :param budget: TrialBudget — учет ресурсов испытаний и лимиты времени и памяти; по завершении в лог
+                   выводятся самые долгие и самые затратные по памяти испытания.
+    :return: Кортеж (backtest_data, orders, metrics, num_orders) для лучших параметров на валидационном наборе
+             или None, если ни одно испытание не завершилось (например, все прерваны по бюджету).
+    """
+    from cb_grok.optimization.warm_start import load_seeds, narrow_search_space, warm_start_study
+
+    train_data, val_data = split_train_val(data_fetcher, symbol, timeframe, logger)
+    search_space = SEARCH_SPACE
+    # Одни и те же начальные точки для сужения пространства и очереди исследования
+    seeds = load_seeds(symbol, timeframe, seed_top_k, initial_capital, logger=logger) if seed_top_k else []
+    if seeds and narrow_margin is not None:
+        search_space = narrow_search_space(seeds, margin=narrow_margin)
+        if logger:
+            logger.info(f"Суженное пространство поиска для {symbol}: {search_space}")
+    objective = make_objective(train_data, val_data, symbol, initial_capital, commission, logger, timeframe,
+                               search_space, budget)
+    configure_optuna_logging(logger)
+
+    # Создание и запуск оптимизации
+    study = optuna.create_study(direction="maximize")
+    if seed_top_k:
+        warm_start_study(study, symbol, timeframe, logger=logger, seeds=seeds)
+    with budget or nullcontext():
+        study.optimize(objective, n_trials=n_trials, callbacks=[OptunaMetricsCallback(f"{symbol}_{timeframe}")])
+    if budget:
+        log_worst_trials(study, logger)
+    if not has_completed_trials(study):
+        if logger:
+            logger.error(f"Оптимизация {symbol} ({timeframe}): нет завершенных испытаний из {len(study.trials)}")
+        return None
+
+    best_params = study.best_params
+    if logger:
+        logger.info(f"Лучшие параметры для {symbol}: {best_params}, Лучшее значение: {study.best_value:.2f}")
+
+    # Финальная валидация на валидационном наборе
+    return validate_best_params(best_params, val_data, symbol, timeframe, initial_capital, commission, logger)
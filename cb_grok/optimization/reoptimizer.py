@@ -0,0 +1,97 @@
+import warnings
+import optuna
+from cb_grok.backtest.backtest import run_backtest_arrays
+from cb_grok.data.dataset import OHLCVDataset
+from cb_grok.optimization.optimization import make_objective, MODEL_METRICS
+from cb_grok.optimization.warm_start import seed_params
+from cb_grok.run_model import strategy_params_from_model
+from cb_grok.strategies.moving_average_strategy import moving_average_arrays
+
+# Модуль, импортируемый процессами пула переоптимизации при запуске
+REOPTIMIZER_MODULE = "cb_grok.optimization.reoptimizer"
+
+
+def split_window(dataset, val_fraction=0.2, holdout_fraction=0.2):
+    """
+    Делит окно на обучение, валидацию и отложенную часть (самые свежие свечи) без копирования.
+
+    :return: Кортеж (train, val, holdout_start): наборы OHLCVDataset и индекс начала отложенной части.
+    """
+    n = len(dataset)
+    holdout_start = n - int(n * holdout_fraction)
+    val_start = holdout_start - int(n * val_fraction)
+    return dataset[:val_start], dataset[val_start:holdout_start], holdout_start
+
+
+def evaluate_holdout(dataset, model_params, holdout_start, initial_capital, commission):
+    """
+    Метрики модели на отложенной части окна.
+
+    Индикаторы считаются по всему окну (прогреты к началу отложенной части), а сделки моделируются только
+    на свечах начиная с holdout_start.
+
+    :return: Словарь метрик run_backtest с 'num_orders' или None, если окна не хватает для модели.
+    """
+    try:
+        arrays = moving_average_arrays(dataset, **strategy_params_from_model(model_params))
+    except ValueError:
+        return None
+    _, _, metrics, num_orders = run_backtest_arrays(
+        dataset[holdout_start:], arrays["signal"][holdout_start:], arrays["atr"][holdout_start:], initial_capital,
+        commission, model_params["stop_loss_multiplier"], model_params["take_profit_multiplier"],
+        timeframe=model_params.get("timeframe"))
+    return dict(metrics, num_orders=num_orders)
+
+
+def reoptimize_window(data, model_params, initial_capital=10000, commission=0.00075, n_trials=100,
+                      val_fraction=0.2, holdout_fraction=0.2, seed=None):
+    """
+    Переоптимизация модели на скользящем окне свечей (выполняется в процессе пула).
+
+    Исследование Optuna с той же целевой функцией, что optimize_backtest, идет на обучающей и валидационной
+    частях окна; текущие параметры ставятся в очередь первым испытанием. Лучший кандидат и текущая модель
+    затем сравниваются на отложенной части, которую оптимизация не видела.
+
+    :param data: DataFrame закрытых свечей окна.
+    :param model_params: Параметры текущей модели (как в файле модели).
+    :param initial_capital: Начальный капитал.
+    :param commission: Комиссия.
+    :param n_trials: Количество испытаний.
+    :param val_fraction: Доля окна для валидации.
+    :param holdout_fraction: Доля окна (самые свежие свечи) для сравнения кандидата с текущей моделью.
+    :param seed: Seed сэмплера Optuna.
+    :return: Словарь 'params' (параметры кандидата в формате файла модели, с символом и таймфреймом, но без
+             метрик MODEL_METRICS), 'best_value', 'candidate' и 'current' (метрики evaluate_holdout).
+    """
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    # Текущие параметры вне диапазонов пространства поиска ставятся в очередь как есть (см. seed_params)
+    warnings.filterwarnings("ignore", message="Fixed parameter", category=UserWarning)
+    dataset = OHLCVDataset.from_frame(data)
+    train, val, holdout_start = split_window(dataset, val_fraction, holdout_fraction)
+    study = optuna.create_study(direction="maximize", sampler=optuna.samplers.TPESampler(seed=seed))
+    study.enqueue_trial(seed_params(model_params))
+    study.optimize(make_objective(train, val, model_params.get("symbol"), initial_capital, commission,
+                                  timeframe=model_params.get("timeframe")), n_trials=n_trials)
+    # Размер буфера (limit) модели в торговле сохраняется: целевая функция от него не зависит.
+    # Метрики текущей модели к кандидату не относятся и не переносятся
+    candidate = {name: value for name, value in model_params.items() if name not in MODEL_METRICS}
+    candidate.update({name: value for name, value in study.best_params.items() if name != "limit"})
+    return {
+        "params": candidate,
+        "best_value": study.best_value,
+        "candidate": evaluate_holdout(dataset, candidate, holdout_start, initial_capital, commission),
+        "current": evaluate_holdout(dataset, model_params, holdout_start, initial_capital, commission),
+    }
+
+
+def candidate_is_better(result, min_improvement=0.1, min_orders=5):
+    """
+    Принимается ли кандидат reoptimize_window: не меньше min_orders ордеров на отложенной части и Sharpe Ratio
+    выше текущей модели не менее чем на min_improvement.
+    """
+    candidate, current = result["candidate"], result["current"]
+    if candidate is None or candidate["num_orders"] < min_orders:
+        return False
+    if current is None:
+        return True
+    return candidate["sharpe_ratio"] >= current["sharpe_ratio"] + min_improvement
@@ -0,0 +1,194 @@
+import signal
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+import optuna
+import pandas as pd
+
+MB = 1024 * 1024
+# Атрибуты испытания Optuna, которые записывает TrialResources
+RESOURCE_ATTRS = ("wall_time", "cpu_time", "peak_memory_mb")
+
+
+class TrialBudgetExceeded(optuna.TrialPruned):
+    """Испытание прервано: превышен бюджет времени или памяти (Optuna помечает его как PRUNED)."""
+
+
+class TrialBudget:
+    """
+    Учет ресурсов испытаний оптимизации и бюджеты времени и памяти.
+
+    Для каждого испытания в пользовательские атрибуты Optuna записываются wall_time и cpu_time (секунды),
+    peak_memory_mb (пик выделенной памяти сверх занятой в начале испытания, по tracemalloc — учитывает
+    и массивы NumPy/pandas) и 'stages' — то же по этапам (стратегия и бэктест на обучении и валидации).
+    Бюджеты проверяются внутри этапов таймером (SIGALRM каждые check_interval секунд) и после каждого этапа:
+    испытание, превысившее лимит, прерывается исключением TrialBudgetExceeded с причиной в атрибуте
+    'budget_exceeded', и исследование продолжается. Таймер работает только в главном потоке на Unix; иначе
+    бюджеты проверяются лишь между этапами. Обработчик сигнала выполняется между инструкциями Python, поэтому
+    одна долгая операция NumPy прерывается после ее завершения.
+
+    tracemalloc замедляет выделение памяти, поэтому память отслеживается только при track_memory
+    (по умолчанию — если задан лимит памяти) и только внутри блока with TrialBudget. Пик памяти общий
+    на процесс: испытания нужно запускать последовательно (study.optimize без n_jobs).
+    """
+
+    def __init__(self, time_limit=None, memory_limit_mb=None, track_memory=None, check_interval=0.1):
+        """
+        :param time_limit: Лимит времени испытания в секундах (None — без лимита).
+        :param memory_limit_mb: Лимит пика памяти испытания в МБ (None — без лимита).
+        :param track_memory: Отслеживать пик памяти (по умолчанию — если задан memory_limit_mb).
+        :param check_interval: Период проверки бюджетов внутри этапа в секундах.
+        """
+        self.time_limit = time_limit
+        self.memory_limit_mb = memory_limit_mb
+        self.track_memory = memory_limit_mb is not None if track_memory is None else track_memory
+        self.check_interval = check_interval
+        self._started_tracing = False
+        self._previous_handler = None
+        # Этап, который сейчас выполняется: (TrialResources, имя этапа) — его проверяет обработчик таймера
+        self._active = None
+
+    def __enter__(self):
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        limited = self.time_limit is not None or self.memory_limit_mb is not None
+        if limited and hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread():
+            self._previous_handler = signal.signal(signal.SIGALRM, self._on_timer)
+            signal.setitimer(signal.ITIMER_REAL, self.check_interval, self.check_interval)
+        return self
+
+    def __exit__(self, *exc):
+        if self._previous_handler is not None:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, self._previous_handler)
+            self._previous_handler = None
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def _on_timer(self, signum, frame):
+        active = self._active
+        if active is not None:
+            resources, stage = active
+            resources.check(stage)
+
+    def start(self, trial):
+        """Начинает учет испытания. :return: TrialResources."""
+        return TrialResources(trial, self)
+
+
+class TrialResources:
+    """Ресурсы одного испытания: этапы учитываются блоками with resources.stage(name)."""
+
+    def __init__(self, trial, budget):
+        self.trial = trial
+        self.budget = budget
+        self.stages = {}
+        self.exceeded = None
+        self.peak_memory = 0
+        self.memory = budget.track_memory and tracemalloc.is_tracing()
+        self.baseline = tracemalloc.get_traced_memory()[0] if self.memory else 0
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Учитывает время и пик памяти блока; бюджеты испытания проверяются во время блока (см. TrialBudget)
+        и после него. Этап, прерванный по бюджету, тоже попадает в 'stages'.
+        """
+        if self.memory:
+            tracemalloc.reset_peak()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            self.budget._active = (self, name)
+            yield
+        finally:
+            self.budget._active = None
+            record = {"wall_time": time.perf_counter() - wall, "cpu_time": time.process_time() - cpu}
+            if self.memory:
+                peak = self._stage_peak()
+                self.peak_memory = max(self.peak_memory, peak)
+                record["peak_memory_mb"] = peak / MB
+            self.stages[name] = record
+        self.check(name)
+
+    def _stage_peak(self):
+        return max(tracemalloc.get_traced_memory()[1] - self.baseline, 0)
+
+    def check(self, stage):
+        """Прерывает испытание TrialBudgetExceeded, если превышен лимит времени или памяти."""
+        if self.exceeded:
+            raise TrialBudgetExceeded(self.exceeded)
+        if self.memory and self.budget._active is not None:
+            # Во время этапа пик еще не учтен в peak_memory
+            self.peak_memory = max(self.peak_memory, self._stage_peak())
+        elapsed = time.perf_counter() - self.wall_start
+        if self.budget.time_limit is not None and elapsed > self.budget.time_limit:
+            self.exceeded = f"time: {elapsed:.2f} с > {self.budget.time_limit} с на этапе {stage}"
+        elif self.budget.memory_limit_mb is not None and self.peak_memory / MB > self.budget.memory_limit_mb:
+            self.exceeded = (f"memory: {self.peak_memory / MB:.1f} МБ > {self.budget.memory_limit_mb} МБ "
+                             f"на этапе {stage}")
+        if self.exceeded:
+            raise TrialBudgetExceeded(self.exceeded)
+
+    def finish(self):
+        """Записывает ресурсы испытания в его пользовательские атрибуты."""
+        self.trial.set_user_attr("wall_time", time.perf_counter() - self.wall_start)
+        self.trial.set_user_attr("cpu_time", time.process_time() - self.cpu_start)
+        if self.memory:
+            self.trial.set_user_attr("peak_memory_mb", self.peak_memory / MB)
+        self.trial.set_user_attr("stages", self.stages)
+        if self.exceeded:
+            self.trial.set_user_attr("budget_exceeded", self.exceeded)
+
+
+def trial_resources_frame(study):
+    """
+    Ресурсы испытаний исследования, записанные TrialResources.
+
+    :return: DataFrame с колонками 'number', 'state', 'value', 'wall_time', 'cpu_time', 'peak_memory_mb',
+             'slowest_stage', 'budget_exceeded'.
+    """
+    rows = []
+    for trial in study.get_trials(deepcopy=False):
+        attrs = trial.user_attrs
+        if "wall_time" not in attrs:
+            continue
+        stages = attrs.get("stages", {})
+        rows.append({
+            "number": trial.number,
+            "state": trial.state.name.lower(),
+            "value": trial.value,
+            **{name: attrs.get(name) for name in RESOURCE_ATTRS},
+            "slowest_stage": max(stages, key=lambda stage: stages[stage]["wall_time"]) if stages else None,
+            "budget_exceeded": attrs.get("budget_exceeded"),
+        })
+    return pd.DataFrame(rows, columns=["number", "state", "value", *RESOURCE_ATTRS, "slowest_stage",
+                                       "budget_exceeded"])
+
+
+def log_worst_trials(study, logger=None, k=5):
+    """
+    Сводка ресурсов по завершении исследования: итоги и k худших испытаний по времени и по памяти.
+
+    :param study: Исследование Optuna.
+    :param logger: Объект для логирования.
+    :param k: Количество худших испытаний в сводке.
+    :return: DataFrame trial_resources_frame.
+    """
+    frame = trial_resources_frame(study)
+    if not logger or frame.empty:
+        return frame
+    aborted = int(frame["budget_exceeded"].notna().sum())
+    logger.info(f"Ресурсы испытаний: {len(frame)} испытаний, время {frame['wall_time'].sum():.1f} с "
+                f"(CPU {frame['cpu_time'].sum():.1f} с), медиана {frame['wall_time'].median():.2f} с, "
+                f"прервано по бюджету: {aborted}")
+    columns = ["number", "state", "value", *RESOURCE_ATTRS, "slowest_stage"]
+    logger.info(f"Самые долгие испытания:\n{frame.nlargest(k, 'wall_time')[columns].to_string(index=False)}")
+    if frame["peak_memory_mb"].notna().any():
+        logger.info(f"Испытания с наибольшим пиком памяти:\n"
+                    f"{frame.nlargest(k, 'peak_memory_mb')[columns].to_string(index=False)}")
+    return frame
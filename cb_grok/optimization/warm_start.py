@@ -0,0 +1,266 @@
+import glob
+import json
+import os
+import time
+import numpy as np
+import optuna
+from optuna.trial import TrialState
+from cb_grok.backtest.metrics import periods_per_year
+from cb_grok.optimization.optimization import SEARCH_SPACE, split_train_val, make_objective
+
+BEST_MODELS_FOLDER = "library/best_models_params"
+ORDER_BIN_FOLDER = "order_bin"
+
+
+def load_history(symbol, timeframe, initial_capital=10000, best_models_folder=BEST_MODELS_FOLDER,
+                 order_bin_folder=ORDER_BIN_FOLDER, logger=None):
+    """
+    Собирает прошлые наборы параметров для символа и таймфрейма.
+
+    Модели из library/best_models_params ранжируются по сохраненному Sharpe Ratio на валидации, приведенному
+    к аннуализации таймфрейма по сохраненной базе periods_per_year. Sharpe файлов без базы (сохраненных до ее
+    появления — с аннуализацией по 252 периодам или по таймфрейму) не сопоставим с остальными, поэтому такие
+    модели, как и файлы без Sharpe, идут после. Результаты бэктестов из order_bin ранжируются по доходности
+    относительно initial_capital и идут после моделей; учитываются только записи с тем же таймфреймом
+    (записи без таймфрейма пропускаются). Повторяющиеся наборы параметров сводятся к одному.
+
+    :param symbol: Символ торговой пары.
+    :param timeframe: Таймфрейм.
+    :param initial_capital: Начальный капитал бэктестов order_bin.
+    :param best_models_folder: Папка сохраненных моделей.
+    :param order_bin_folder: Папка результатов бэктестов.
+    :param logger: Объект для логирования.
+    :return: Список словарей {'params', 'score', 'source'} от лучшего к худшему ('score' — None, если метрика
+             файла не сопоставима с остальными).
+    """
+    ranked = []
+    for path in glob.glob(os.path.join(best_models_folder, "*.json")):
+        try:
+            with open(path, 'r') as f:
+                model = json.load(f)
+        except (OSError, ValueError) as e:
+            if logger:
+                logger.warning(f"Пропущен файл модели {path}: {e}")
+            continue
+        if model.get("symbol") != symbol or model.get("timeframe") != timeframe:
+            continue
+        score = model.get("sharpe_ratio")
+        basis = model.get("periods_per_year")
+        score = score * (periods_per_year(timeframe) / basis) ** 0.5 if score is not None and basis else None
+        ranked.append(((0, score is None, -(score or 0.0)), model, score, path))
+    for path in glob.glob(os.path.join(order_bin_folder, "*.json")):
+        try:
+            with open(path, 'r') as f:
+                result = json.load(f)
+        except (OSError, ValueError) as e:
+            if logger:
+                logger.warning(f"Пропущен файл результатов {path}: {e}")
+            continue
+        model = result.get("model_params", {})
+        if result.get("symbol") != symbol or result.get("timeframe") != timeframe:
+            continue
+        score = (result["final_capital"] / initial_capital - 1) * 100 if "final_capital" in result else None
+        ranked.append(((1, score is None, -(score or 0.0)), model, score, path))
+    ranked.sort(key=lambda item: item[0])
+
+    history = []
+    seen = set()
+    for _, model, score, path in ranked:
+        params = {name: model[name] for name in SEARCH_SPACE if name in model}
+        key = json.dumps(params, sort_keys=True)
+        if not params or key in seen:
+            continue
+        seen.add(key)
+        history.append({"params": params, "score": score, "source": path})
+    if logger:
+        logger.info(f"Найдено {len(history)} прошлых наборов параметров для {symbol} ({timeframe})")
+    return history
+
+
+def seed_params(params, search_space=None):
+    """
+    Приводит прошлые параметры к пространству поиска для enqueue_trial.
+
+    Категориальные значения вне списка вариантов отбрасываются (Optuna не принимает их), и такие параметры
+    сэмплируются заново; числовые значения вне диапазона передаются как есть.
+    """
+    search_space = search_space or SEARCH_SPACE
+    seeded = {}
+    for name, value in params.items():
+        if name not in search_space:
+            continue
+        kind, *bounds = search_space[name]
+        if kind == "categorical":
+            if value in bounds[0]:
+                seeded[name] = value
+        elif kind == "int":
+            seeded[name] = int(round(value))
+        else:
+            seeded[name] = float(value)
+    return seeded
+
+
+def load_seeds(symbol, timeframe, top_k=10, initial_capital=10000, search_space=None, logger=None):
+    """
+    Начальные точки исследования: top_k лучших различных прошлых наборов параметров (load_history),
+    приведенных к пространству поиска (seed_params).
+
+    Одни и те же точки передаются в narrow_search_space и warm_start_study, чтобы суженное пространство
+    строилось по тем наборам, которые ставятся в очередь.
+
+    :return: Список словарей параметров от лучшего к худшему.
+    """
+    seeds = []
+    for record in load_history(symbol, timeframe, initial_capital, logger=logger):
+        if len(seeds) >= top_k:
+            break
+        params = seed_params(record["params"], search_space)
+        if params and params not in seeds:
+            seeds.append(params)
+    return seeds
+
+
+def narrow_search_space(seeds, search_space=None, margin=0.25):
+    """
+    Сужает числовые диапазоны до области вокруг начальных точек.
+
+    Новый диапазон охватывает значения начальных точек с запасом margin от ширины исходного диапазона
+    с каждой стороны и не выходит за объединение исходного диапазона и значений точек (прошлые модели могли
+    искаться в других диапазонах). Категориальные параметры не меняются.
+
+    :param seeds: Список словарей параметров начальных точек.
+    :param search_space: Исходное пространство поиска (по умолчанию SEARCH_SPACE).
+    :param margin: Запас в долях ширины исходного диапазона.
+    :return: Новое пространство поиска в формате SEARCH_SPACE.
+    """
+    search_space = search_space or SEARCH_SPACE
+    narrowed = {}
+    for name, (kind, *bounds) in search_space.items():
+        values = [seed[name] for seed in seeds if name in seed]
+        if kind == "categorical" or not values:
+            narrowed[name] = (kind, *bounds)
+            continue
+        low, high = bounds
+        pad = margin * (high - low)
+        new_low = max(min(low, min(values)), min(values) - pad)
+        new_high = min(max(high, max(values)), max(values) + pad)
+        if kind == "int":
+            new_low, new_high = int(np.floor(new_low)), int(np.ceil(new_high))
+        narrowed[name] = (kind, new_low, new_high)
+    return narrowed
+
+
+def warm_start_study(study, symbol, timeframe, top_k=10, initial_capital=10000, search_space=None, logger=None,
+                     seeds=None):
+    """
+    Ставит в очередь исследования top_k лучших прошлых наборов параметров символа и таймфрейма.
+
+    Набор, уже поставленный в очередь или испытанный в исследовании, повторно не добавляется, поэтому вызов
+    безопасен для общего исследования нескольких воркеров.
+
+    :param study: Исследование Optuna.
+    :param symbol: Символ торговой пары.
+    :param timeframe: Таймфрейм.
+    :param top_k: Количество начальных точек.
+    :param initial_capital: Начальный капитал бэктестов order_bin (см. load_history).
+    :param search_space: Пространство поиска исследования (по умолчанию SEARCH_SPACE).
+    :param logger: Объект для логирования.
+    :param seeds: Готовые начальные точки (load_seeds), например уже использованные для narrow_search_space;
+                  тогда top_k, initial_capital и search_space не используются.
+    :return: Список поставленных в очередь наборов параметров.
+    """
+    if seeds is None:
+        seeds = load_seeds(symbol, timeframe, top_k, initial_capital, search_space, logger)
+    for params in seeds:
+        study.enqueue_trial(params, skip_if_exists=True)
+    if logger:
+        logger.info(f"В очередь исследования поставлено {len(seeds)} прошлых наборов параметров для {symbol} ({timeframe})")
+    return seeds
+
+
+def trials_to_target(study, target):
+    """Количество испытаний (включая неудачные) до первого значения не ниже target или None."""
+    trials = study.get_trials(deepcopy=False, states=(TrialState.COMPLETE,))
+    reached = [trial.number + 1 for trial in trials if trial.value is not None and trial.value >= target]
+    return min(reached) if reached else None
+
+
+def benchmark_warm_start(data_fetcher, symbol, timeframe, initial_capital, commission, target_sharpe=1.0,
+                         n_trials=100, n_repeats=3, top_k=10, margin=0.25, seed=None, logger=None):
+    """
+    Сравнивает число испытаний до целевого значения целевой функции (среднего Sharpe Ratio обучения и валидации
+    со штрафом за сложность) для холодного старта, старта с прошлых параметров и старта с прошлых параметров
+    в суженном пространстве поиска.
+
+    Каждый вариант повторяется n_repeats раз с одинаковыми зернами TPESampler, испытания прекращаются
+    при достижении цели.
+
+    :return: Кортеж (список прогонов {'variant', 'repeat', 'trials_to_target', 'best_value', 'seconds'},
+             сводка variant -> {'reached', 'median_trials', 'mean_best_value'}).
+    """
+    train_data, val_data = split_train_val(data_fetcher, symbol, timeframe, logger)
+    seeds = load_seeds(symbol, timeframe, top_k, initial_capital, logger=logger)
+    variants = {
+        "cold": (SEARCH_SPACE, []),
+        "warm": (SEARCH_SPACE, seeds),
+        "warm_narrow": (narrow_search_space(seeds, margin=margin) if seeds else SEARCH_SPACE, seeds),
+    }
+
+    def stop_at_target(study, trial):
+        if trial.value is not None and trial.value >= target_sharpe:
+            study.stop()
+
+    runs = []
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    for variant, (search_space, variant_seeds) in variants.items():
+        objective = make_objective(train_data, val_data, symbol, initial_capital, commission, None, timeframe,
+                                   search_space)
+        for repeat in range(n_repeats):
+            sampler = optuna.samplers.TPESampler(seed=None if seed is None else seed + repeat)
+            study = optuna.create_study(direction="maximize", sampler=sampler)
+            for params in variant_seeds:
+                study.enqueue_trial(params, skip_if_exists=True)
+            start = time.perf_counter()
+            study.optimize(objective, n_trials=n_trials, callbacks=[stop_at_target])
+            run = {"variant": variant, "repeat": repeat, "trials_to_target": trials_to_target(study, target_sharpe),
+                   "best_value": study.best_value, "seconds": time.perf_counter() - start}
+            runs.append(run)
+            if logger:
+                logger.info(f"Бенчмарк {variant} #{repeat}: {run}")
+
+    summary = {}
+    for variant in variants:
+        reached = [run["trials_to_target"] for run in runs if run["variant"] == variant and run["trials_to_target"]]
+        best_values = [run["best_value"] for run in runs if run["variant"] == variant]
+        summary[variant] = {
+            "reached": f"{len(reached)}/{n_repeats}",
+            "median_trials": float(np.median(reached)) if reached else None,
+            "mean_best_value": float(np.mean(best_values)),
+        }
+    return runs, summary
+
+if __name__ == "__main__":
+    import argparse
+    from cb_grok.adapters.exchange_adapter import get_exchange_adapter
+
+    parser = argparse.ArgumentParser(description="Бенчмарк оптимизации с прошлыми параметрами и без них")
+    parser.add_argument("symbol", help="Символ торговой пары, например BNB/USDT")
+    parser.add_argument("--timeframe", default="1h", help="Таймфрейм")
+    parser.add_argument("--exchange_name", default="bybit", help="Биржа для загрузки данных")
+    parser.add_argument("--initial_capital", type=float, default=10000, help="Начальный капитал")
+    parser.add_argument("--commission", type=float, default=0.00075, help="Комиссия")
+    parser.add_argument("--target_sharpe", type=float, default=1.0, help="Целевое значение целевой функции")
+    parser.add_argument("--n_trials", type=int, default=100, help="Максимум испытаний на прогон")
+    parser.add_argument("--n_repeats", type=int, default=3, help="Повторов каждого варианта")
+    parser.add_argument("--top_k", type=int, default=10, help="Количество прошлых наборов параметров")
+    parser.add_argument("--margin", type=float, default=0.25, help="Запас суженного пространства поиска")
+    parser.add_argument("--seed", type=int, default=None, help="Зерно TPESampler")
+
+    args = parser.parse_args()
+    runs, summary = benchmark_warm_start(get_exchange_adapter(args.exchange_name), args.symbol, args.timeframe,
+                                         args.initial_capital, args.commission, args.target_sharpe, args.n_trials,
+                                         args.n_repeats, args.top_k, args.margin, args.seed)
+    print(f"{'вариант':<12} {'достигли':>9} {'медиана испытаний':>18} {'среднее лучшее':>15}")
+    for variant, row in summary.items():
+        median = f"{row['median_trials']:.0f}" if row["median_trials"] is not None else "-"
+        print(f"{variant:<12} {row['reached']:>9} {median:>18} {row['mean_best_value']:>15.2f}")
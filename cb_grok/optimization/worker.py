@@ -0,0 +1,180 @@
+import os
+import socket
+from contextlib import nullcontext
+import optuna
+from optuna.storages import JournalStorage, RDBStorage, RetryFailedTrialCallback
+from optuna.storages.journal import JournalFileBackend
+from optuna.study import MaxTrialsCallback
+from optuna.trial import TrialState, create_trial
+from cb_grok.optimization.optimization import (split_train_val, make_objective, configure_optuna_logging,
+                                               validate_best_params, has_completed_trials)
+from cb_grok.optimization.warm_start import warm_start_study
+from cb_grok.optimization.trial_budget import log_worst_trials
+from cb_grok.utils.metrics_exporter import OptunaMetricsCallback
+
+
+def create_storage(storage, heartbeat_interval=60, grace_period=180, max_retry=3):
+    """
+    Создает общее хранилище исследования Optuna.
+
+    URL SQLAlchemy (sqlite:///optuna.db, postgresql://..., mysql://...) открывается как RDBStorage с heartbeat:
+    испытания упавших или убитых воркеров помечаются FAIL и повторяются с теми же параметрами.
+    Путь к файлу открывается как журнальное хранилище (JournalFileBackend), которое работает без сервера БД,
+    в том числе на общем сетевом диске.
+
+    :param storage: URL базы данных или путь к файлу журнала.
+    :param heartbeat_interval: Период heartbeat воркера в секундах (только для RDBStorage).
+    :param grace_period: Время без heartbeat, после которого испытание считается прерванным.
+    :param max_retry: Сколько раз повторять прерванное испытание.
+    :return: Объект хранилища Optuna.
+    """
+    if "://" in storage:
+        return RDBStorage(storage, heartbeat_interval=heartbeat_interval, grace_period=grace_period,
+                          failed_trial_callback=RetryFailedTrialCallback(max_retry=max_retry))
+    return JournalStorage(JournalFileBackend(storage))
+
+
+def default_study_name(symbol, timeframe):
+    """Имя исследования по умолчанию: одно исследование на символ и таймфрейм."""
+    return f"{symbol.replace('/', '')}_{timeframe}"
+
+
+# Пользовательский атрибут испытаний-заявок claim_study_value
+CLAIM_ATTR = "claim"
+
+
+def claim_study_value(study, name, value):
+    """
+    Атомарно выбирает одно значение name на все воркеры исследования.
+
+    Пользовательские атрибуты исследования перезаписываются без проверки, поэтому выбор идет через номера
+    испытаний, которые хранилище выдает атомарно: воркер добавляет испытание-заявку (состояние FAIL, в поиске
+    и подсчете испытаний не участвует) со своим значением, и побеждает заявка с наименьшим номером. Если заявка
+    уже есть, новая не добавляется.
+
+    :param study: Исследование Optuna.
+    :param name: Имя выбираемого значения.
+    :param value: Значение этого воркера (JSON-сериализуемое).
+    :return: Выбранное значение — свое или другого воркера.
+    """
+    def claims():
+        return [trial for trial in study.get_trials(deepcopy=False, states=(TrialState.FAIL,))
+                if trial.user_attrs.get(CLAIM_ATTR) == name]
+
+    if not claims():
+        study.add_trial(create_trial(state=TrialState.FAIL, user_attrs={CLAIM_ATTR: name, "value": value}))
+    return min(claims(), key=lambda trial: trial.number).user_attrs["value"]
+
+
+def data_range(train_data, val_data):
+    """Первая и последняя свечи обучающего и валидационного наборов (строки ISO для атрибутов Optuna)."""
+    index = train_data.index.append(val_data.index)
+    return [index[0].isoformat(), index[-1].isoformat()]
+
+
+def requeue_running_trials(study, logger=None):
+    """
+    Помечает незавершенные испытания как FAIL и ставит их параметры в очередь заново.
+
+    Нужно для журнального хранилища, где нет heartbeat. Вызывать только когда ни один воркер не запущен,
+    иначе будут сброшены испытания, которые еще выполняются.
+    """
+    running = study.get_trials(deepcopy=False, states=(TrialState.RUNNING,))
+    for trial in running:
+        study._storage.set_trial_state_values(trial._trial_id, state=TrialState.FAIL)
+        study.enqueue_trial(trial.params, skip_if_exists=True)
+    if logger and running:
+        logger.info(f"Повторно поставлено в очередь {len(running)} прерванных испытаний")
+    return len(running)
+
+
+def run_worker(data_fetcher, storage, symbol, timeframe, initial_capital, commission, n_trials=100,
+               study_name=None, requeue_running=False, logger=None, seed_top_k=0, budget=None):
+    """
+    Воркер распределенной оптимизации: подключается к общему исследованию и добавляет в него испытания.
+
+    Любое число воркеров на любых хостах может работать с одним исследованием. Все воркеры исследования
+    оптимизируют на одних и тех же свечах: диапазон данных первого воркера закрепляется за исследованием
+    (claim_study_value), а остальные загружают ровно его, а не последние свечи. Каждый воркер останавливается,
+    когда в исследовании набирается n_trials завершенных испытаний, поэтому перезапуск после сбоя продолжает
+    с места остановки. Один из воркеров, завершивших исследование (выбирается атомарно через claim_study_value),
+    валидирует лучшие параметры и сохраняет их в library/best_models_params, после чего отмечает исследование
+    атрибутом exported. Если выбранный воркер упал до сохранения, параметры сохраняет воркер, запущенный
+    для уже завершенного исследования.
+
+    :param data_fetcher: Объект для загрузки данных.
+    :param storage: URL SQLAlchemy или путь к файлу журнала (см. create_storage).
+    :param symbol: Символ торговой пары.
+    :param timeframe: Таймфрейм.
+    :param initial_capital: Начальный капитал.
+    :param commission: Комиссия.
+    :param n_trials: Общее количество испытаний в исследовании (на все воркеры).
+    :param study_name: Имя исследования (по умолчанию символ и таймфрейм).
+    :param requeue_running: Повторить прерванные испытания журнального хранилища (см. requeue_running_trials).
+    :param logger: Объект для логирования.
+    :param seed_top_k: Сколько лучших прошлых наборов параметров поставить в очередь нового исследования
+                       (см. warm_start.warm_start_study).
+    :param budget: TrialBudget — учет ресурсов испытаний воркера и лимиты времени и памяти
+                   (см. trial_budget.TrialBudget).
+    :return: Кортеж (backtest_data, orders, metrics, num_orders) или None, если исследование еще не завершено,
+             лучшие параметры уже сохранены другим воркером или ни одно испытание не завершилось.
+    """
+    study_name = study_name or default_study_name(symbol, timeframe)
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    study = optuna.create_study(study_name=study_name, storage=create_storage(storage), direction="maximize",
+                                load_if_exists=True)
+    study.set_user_attr("symbol", symbol)
+    study.set_user_attr("timeframe", timeframe)
+    if requeue_running:
+        requeue_running_trials(study, logger)
+
+    finished_states = (TrialState.COMPLETE, TrialState.PRUNED)
+    done = len(study.get_trials(deepcopy=False, states=finished_states))
+    if seed_top_k and not done:
+        warm_start_study(study, symbol, timeframe, seed_top_k, initial_capital, logger=logger)
+    if logger:
+        logger.info(f"Воркер {worker_id} подключен к исследованию {study_name}: завершено {done} из {n_trials} испытаний")
+
+    train_data, val_data = split_train_val(data_fetcher, symbol, timeframe, logger)
+    study_range = claim_study_value(study, "data_range", data_range(train_data, val_data))
+    if study_range != data_range(train_data, val_data):
+        if logger:
+            logger.info(f"Данные исследования {study_name} закреплены за диапазоном "
+                        f"{study_range[0]} - {study_range[1]}")
+        train_data, val_data = split_train_val(data_fetcher, symbol, timeframe, logger, study_range)
+    if done < n_trials:
+        objective = make_objective(train_data, val_data, symbol, initial_capital, commission, logger, timeframe,
+                                   budget=budget)
+        configure_optuna_logging(logger)
+        with budget or nullcontext():
+            study.optimize(objective, callbacks=[MaxTrialsCallback(n_trials, states=finished_states),
+                                                 OptunaMetricsCallback(study_name)])
+        if budget:
+            log_worst_trials(study, logger)
+
+    finished = len(study.get_trials(deepcopy=False, states=finished_states))
+    # Лучшие параметры сохраняет один воркер, дошедший до конца исследования; при увеличении n_trials
+    # дозапущенное исследование сохраняется повторно. exported ставится только после сохранения
+    if finished < n_trials or study.user_attrs.get("exported", 0) >= n_trials:
+        return None
+    exporter = claim_study_value(study, f"export_{n_trials}", worker_id)
+    if exporter != worker_id:
+        # Воркер, завершавший испытания вместе с выбранным, ему не мешает; воркер, запущенный для уже
+        # завершенного исследования, сохраняет параметры вместо выбранного, не сохранившего их (например, упавшего)
+        if done < n_trials:
+            return None
+        if logger:
+            logger.warning(f"Воркер {exporter} не сохранил параметры исследования {study_name}: сохраняет {worker_id}")
+    if not has_completed_trials(study):
+        if logger:
+            logger.error(f"Исследование {study_name} завершено без успешных испытаний: параметры не сохранены")
+        return None
+
+    best_params = study.best_params
+    if logger:
+        logger.info(f"Исследование {study_name} завершено. Лучшие параметры для {symbol}: {best_params}, "
+                    f"Лучшее значение: {study.best_value:.2f}")
+    result = validate_best_params(best_params, val_data, symbol, timeframe, initial_capital, commission, logger)
+    study.set_user_attr("exported", n_trials)
+    study.set_user_attr("exported_by", worker_id)
+    return result
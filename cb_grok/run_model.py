@@ -1,17 +1,39 @@
 import json
 import argparse
-from cb_grok.adapters.exchange_adapter import ExchangeAdapter
+from cb_grok.adapters.exchange_adapter import get_exchange_adapter
 from cb_grok.strategies.moving_average_strategy import moving_average_strategy
 from cb_grok.backtest.backtest import run_backtest
-from cb_grok.utils.utils import save_model_results
+from cb_grok.backtest.portfolio import align_strategy_frames, run_portfolio_backtest
+from cb_grok.data.candle_store import CandleStore
+from cb_grok.utils.utils import save_model_results, timeframe_to_minutes
 
-def run_model(filename, initial_capital, commission):
+# Параметры файла модели, которые принимает moving_average_strategy
+STRATEGY_PARAMS = ["short_period", "long_period", "rsi_period", "atr_period", "buy_rsi_threshold",
+                   "sell_rsi_threshold", "ema_short_period", "ema_long_period", "use_trend_filter",
+                   "use_rsi_filter", "adx_period", "use_adx_filter", "adx_threshold", "atr_threshold"]
+
+# Количество свечей модели для бэктеста (limit модели — размер страницы запроса к бирже)
+BACKTEST_CANDLES = 5000
+
+def load_model(filename):
+    """Загружает параметры модели из library/best_models_params."""
+    with open(f"library/best_models_params/{filename}", 'r') as f:
+        return json.load(f)
+
+def strategy_params_from_model(model_params):
+    """Отбирает из параметров модели аргументы moving_average_strategy."""
+    return {k: model_params[k] for k in STRATEGY_PARAMS if k in model_params}
+
+def run_model(filename, initial_capital, commission, intrabar=False):
     """
     Запускает бэктест для модели с параметрами из файла.
 
     :param filename: Имя файла с параметрами модели (например, 4a5b6c7d8e9f0a1b_20250316_183512.json).
     :param initial_capital: Начальный капитал.
     :param commission: Комиссия за сделку.
+    :param intrabar: Проверять стоп-лосс и тейк-профит по минутным свечам внутри бара; свечи модели тогда
+                     строятся из минутной истории CandleStore. В обоих случаях бэктест идет на BACKTEST_CANDLES
+                     последних свечах модели.
     """
     # Путь к файлу с параметрами
     best_models_folder = "library/best_models_params"
@@ -29,12 +51,18 @@ def run_model(filename, initial_capital, commission):
     model_params = {k: v for k, v in model_params_with_meta.items() if k not in ["symbol", "timeframe"]}
 
     # Загружаем данные
-    adapter = ExchangeAdapter()
-    data = adapter.fetch_ohlcv(symbol, timeframe, model_params["limit"])
+    adapter = get_exchange_adapter()
+    minute_data = None
+    if intrabar:
+        store = CandleStore(adapter)
+        data = store.fetch_ohlcv(symbol, timeframe, total_limit=BACKTEST_CANDLES)
+        minute_data = store.get_base(symbol, BACKTEST_CANDLES * timeframe_to_minutes(timeframe))
+    else:
+        data = adapter.fetch_ohlcv(symbol, timeframe, model_params["limit"], total_limit=BACKTEST_CANDLES)
 
     # Применяем стратегию
     strategy_data = moving_average_strategy(
-        data.copy(),
+        data,
         short_period=model_params["short_period"],
         long_period=model_params["long_period"],
         rsi_period=model_params["rsi_period"],
@@ -54,19 +82,64 @@ def run_model(filename, initial_capital, commission):
         initial_capital,
         commission,
         model_params["stop_loss_multiplier"],
-        model_params["take_profit_multiplier"]
+        model_params["take_profit_multiplier"],
+        timeframe=timeframe,
+        minute_data=minute_data
     )
 
     # Сохраняем результаты в order_bin с теми же параметрами
-    save_model_results(model_params, metrics["final_value"], orders, symbol, initial_capital)
+    save_model_results(model_params, metrics["final_value"], orders, symbol, initial_capital, timeframe=timeframe)
 
     print(f"Бэктест завершён для {symbol}. Итоговый капитал: {metrics['final_value']:.2f}, Количество ордеров: {num_orders}")
 
+def run_portfolio(filenames, initial_capital, commission, sizing='equal', max_positions=None, fraction=0.1):
+    """
+    Запускает бэктест портфеля из нескольких моделей с общим капиталом.
+
+    :param filenames: Список файлов моделей из library/best_models_params (по одной модели на символ).
+    :param initial_capital: Начальный капитал портфеля.
+    :param commission: Комиссия за сделку.
+    :param sizing: Правило размера позиции ('equal', 'fixed_fraction', 'atr_risk').
+    :param max_positions: Максимальное число одновременно открытых позиций.
+    :param fraction: Доля капитала для 'fixed_fraction' и 'atr_risk'.
+    :return: Кортеж (equity, attribution, metrics).
+    """
+    adapter = get_exchange_adapter()
+    frames = {}
+    stop_loss_multipliers = []
+    take_profit_multipliers = []
+    timeframes = set()
+    for filename in filenames:
+        model_params = load_model(filename)
+        symbol = model_params["symbol"]
+        if symbol in frames:
+            raise ValueError(f"В портфеле уже есть модель для {symbol}")
+        data = adapter.fetch_ohlcv(symbol, model_params["timeframe"], model_params["limit"])
+        frames[symbol] = moving_average_strategy(data, **strategy_params_from_model(model_params), debug=False)
+        timeframes.add(model_params["timeframe"])
+        stop_loss_multipliers.append(model_params["stop_loss_multiplier"])
+        take_profit_multipliers.append(model_params["take_profit_multiplier"])
+
+    matrices = align_strategy_frames(frames)
+    equity, attribution, metrics = run_portfolio_backtest(
+        matrices['open'], matrices['close'], matrices['atr'], matrices['signal'], initial_capital, commission,
+        stop_loss_multipliers, take_profit_multipliers, sizing=sizing, max_positions=max_positions,
+        fraction=fraction, symbols=matrices['symbols'], index=matrices['index'],
+        timeframe=timeframes.pop() if len(timeframes) == 1 else None)
+
+    attribution.to_csv("portfolio_results.csv", index=False)
+    print(attribution.to_string())
+    print(f"Бэктест портфеля завершён. Итоговый капитал: {metrics['final_value']:.2f}, "
+          f"Sharpe Ratio: {metrics['sharpe_ratio']:.2f}, Максимальная просадка: {metrics['max_drawdown_percent']:.2f}%")
+    return equity, attribution, metrics
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Запуск бэктеста для модели из best_models_params")
     parser.add_argument("filename", type=str, help="Имя файла с параметрами модели (например, 4a5b6c7d8e9f0a1b_20250316_183512.json)")
     parser.add_argument("initial_capital", type=float, help="Начальный капитал")
     parser.add_argument("commission", type=float, help="Комиссия за сделку")
+    parser.add_argument("--intrabar", action="store_true",
+                        help="Стоп-лосс и тейк-профит по минутным свечам внутри бара")
 
     args = parser.parse_args()
-    run_model(args.filename, args.initial_capital, args.commission)
\ No newline at end of file
+    run_model(args.filename, args.initial_capital, args.commission, args.intrabar)
\ No newline at end of file
@@ -3,7 +3,8 @@ import websockets
 import json
 import pandas as pd
 from datetime import datetime, timedelta
-from cb_grok.adapters.exchange_adapter import ExchangeAdapter
+from cb_grok.adapters.exchange_adapter import get_exchange_adapter
+from cb_grok.utils.utils import timeframe_to_minutes
 import logging
 import os
 
@@ -20,28 +21,49 @@ file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(mes
 logger.addHandler(file_handler)
 
 class Simulator:
-    def __init__(self, symbol, timeframe, limit=500, port=8765):
+    def __init__(self, symbol, timeframe, limit=500, port=8765, drop_every=None, drop_gap=0):
+        """
+        :param drop_every: Намеренно обрывать соединение после каждых drop_every свечей (проверка
+                           переподключения live_trading). Новое подключение продолжает с места обрыва.
+        :param drop_gap: Сколько свечей пропустить при обрыве (имитация свечей, потерянных за время простоя).
+        """
         self.symbol = symbol
         self.timeframe = timeframe
         self.limit = limit
         self.port = port
-        self.adapter = ExchangeAdapter(exchange_name="bybit")
+        self.drop_every = drop_every
+        self.drop_gap = drop_gap
+        self.adapter = get_exchange_adapter("bybit")
+        self.data = None
+        self.position = 0
 
     async def handler(self, connection):
         """Обработчик подключений для WebSocket-сервера."""
         websocket = connection
 
-        # Загружаем данные за последние 1500 часов
-        data = self.adapter.fetch_ohlcv(self.symbol, self.timeframe, limit=self.limit, total_limit=self.limit)
+        # Загружаем данные за последние 1500 часов; после обрыва продолжаем с той же свечи
+        if self.data is None or self.position >= len(self.data):
+            self.data = self.adapter.fetch_ohlcv(self.symbol, self.timeframe, limit=self.limit,
+                                                 total_limit=self.limit)
+            self.position = 0
 
-        logger.info(f"Отправка {len(data)} свечей для {self.symbol} ({self.timeframe})")
+        logger.info(f"Отправка {len(self.data) - self.position} свечей для {self.symbol} ({self.timeframe})")
 
-        for _, row in data.iterrows():
+        sent = 0
+        while self.position < len(self.data):
+            row = self.data.iloc[self.position]
             message_data = row.to_dict()
             message_data['timestamp'] = row.name.isoformat()
             message = json.dumps(message_data)
             await websocket.send(message)
+            self.position += 1
+            sent += 1
             await asyncio.sleep(0.001)
+            if self.drop_every and sent >= self.drop_every and self.position < len(self.data):
+                self.position += self.drop_gap
+                logger.info(f"Намеренный обрыв соединения после {sent} свечей, пропущено {self.drop_gap}")
+                await websocket.close(code=1011, reason="Simulated outage")
+                return
 
         await websocket.close(code=1000, reason="Simulation complete")
 
@@ -53,14 +75,7 @@ class Simulator:
 
     def _timeframe_to_minutes(self, timeframe):
         """Преобразование таймфрейма в минуты."""
-        if timeframe == '1m':
-            return 1
-        elif timeframe == '1h':
-            return 60
-        elif timeframe == '1d':
-            return 1440
-        else:
-            raise ValueError(f"Неподдерживаемый таймфрейм: {timeframe}")
+        return timeframe_to_minutes(timeframe)
 
 if __name__ == "__main__":
     import argparse
@@ -69,7 +84,11 @@ if __name__ == "__main__":
     parser.add_argument("symbol", type=str, help="Символ валютной пары (например, BTC/USDT)")
     parser.add_argument("timeframe", type=str, help="Таймфрейм (например, 1h)")
     parser.add_argument("--port", type=int, default=8765, help="Порт для WebSocket-сервера")
+    parser.add_argument("--drop_every", type=int, default=None,
+                        help="Обрывать соединение после каждых N свечей (проверка переподключения)")
+    parser.add_argument("--drop_gap", type=int, default=0, help="Сколько свечей пропускать при обрыве")
 
     args = parser.parse_args()
-    simulator = Simulator(args.symbol, args.timeframe, port=args.port)
+    simulator = Simulator(args.symbol, args.timeframe, port=args.port, drop_every=args.drop_every,
+                          drop_gap=args.drop_gap)
     asyncio.run(simulator.start_server())
\ No newline at end of file
@@ -1,6 +1,8 @@
+import numpy as np
 import pandas as pd
 import pandas_ta as ta
 from cb_grok.indicators.indicators import calculate_moving_averages, calculate_rsi, calculate_atr, calculate_emas
+from cb_grok.indicators.incremental import RollingMeanState, EMAState, RSIState, ATRState, ADXState
 
 def trend_filter(data: pd.DataFrame) -> pd.Series:
     """Определяет тренд на основе пересечения EMA."""
@@ -45,26 +47,56 @@ def generate_signals(data: pd.DataFrame, buy_rsi_threshold: float, sell_rsi_thre
     data['positions'] = data['signal'].diff()
     return data
 
-def moving_average_strategy(data: pd.DataFrame, short_period: int, long_period: int, rsi_period: int,
-                            atr_period: int = 14, buy_rsi_threshold: float = 45, sell_rsi_threshold: float = 55,
-                            ema_short_period: int = 50, ema_long_period: int = 200, use_trend_filter: bool = True,
-                            use_rsi_filter: bool = True, adx_period: int = 14, use_adx_filter: bool = False,
-                            adx_threshold: float = 25.0, atr_threshold: float = 0.0, debug: bool = False, logger=None) -> pd.DataFrame:
-    """Применяет стратегию с фильтром волатильности."""
+# Колонки, которые стратегия добавляет к данным
+STRATEGY_COLUMNS = ("short_ma", "long_ma", "rsi", "atr", "ema_short", "ema_long", "adx", "signal", "positions")
+
+def moving_average_arrays(data, short_period: int, long_period: int, rsi_period: int, atr_period: int = 14,
+                          buy_rsi_threshold: float = 45, sell_rsi_threshold: float = 55, ema_short_period: int = 50,
+                          ema_long_period: int = 200, use_trend_filter: bool = True, use_rsi_filter: bool = True,
+                          adx_period: int = 14, use_adx_filter: bool = False, adx_threshold: float = 25.0,
+                          atr_threshold: float = 0.0, logger=None) -> dict:
+    """
+    Индикаторы и сигналы moving_average_strategy отдельными массивами; входные данные не изменяются.
+
+    Индикаторы считаются теми же функциями по рабочему DataFrame из представлений колонок 'high', 'low',
+    'close' (без копирования), поэтому новыми выделяются только рассчитанные массивы.
+
+    :param data: OHLCVDataset или DataFrame с колонками 'high', 'low', 'close'.
+    :return: Словарь массивов NumPy с ключами STRATEGY_COLUMNS ('adx' — только при use_adx_filter).
+    """
     required_candles = max(long_period, ema_long_period, adx_period if use_adx_filter else 0)
     if len(data) < required_candles:
         if logger:
             logger.warning(f"Недостаточно данных: требуется {required_candles}, доступно {len(data)}")
         raise ValueError(f"Недостаточно данных: требуется минимум {required_candles} свечей")
 
-    data = calculate_moving_averages(data, short_period, long_period)
-    data = calculate_rsi(data, rsi_period)
-    data = calculate_atr(data, atr_period)
-    data = calculate_emas(data, ema_short_period, ema_long_period)
+    frame = pd.DataFrame({column: np.asarray(data[column], dtype=np.float64) for column in ('high', 'low', 'close')},
+                         copy=False)
+    frame = calculate_moving_averages(frame, short_period, long_period)
+    frame = calculate_rsi(frame, rsi_period)
+    frame = calculate_atr(frame, atr_period)
+    frame = calculate_emas(frame, ema_short_period, ema_long_period)
     if use_adx_filter:
-        data = calculate_adx(data, adx_period)
-    data = generate_signals(data, buy_rsi_threshold, sell_rsi_threshold, use_trend_filter, use_rsi_filter,
-                            use_adx_filter, adx_threshold, atr_threshold)
+        frame = calculate_adx(frame, adx_period)
+    frame = generate_signals(frame, buy_rsi_threshold, sell_rsi_threshold, use_trend_filter, use_rsi_filter,
+                             use_adx_filter, adx_threshold, atr_threshold)
+    return {column: frame[column].to_numpy() for column in STRATEGY_COLUMNS if column in frame.columns}
+
+def moving_average_strategy(data: pd.DataFrame, short_period: int, long_period: int, rsi_period: int,
+                            atr_period: int = 14, buy_rsi_threshold: float = 45, sell_rsi_threshold: float = 55,
+                            ema_short_period: int = 50, ema_long_period: int = 200, use_trend_filter: bool = True,
+                            use_rsi_filter: bool = True, adx_period: int = 14, use_adx_filter: bool = False,
+                            adx_threshold: float = 25.0, atr_threshold: float = 0.0, debug: bool = False, logger=None) -> pd.DataFrame:
+    """
+    Применяет стратегию с фильтром волатильности.
+
+    Возвращает новый DataFrame: колонки data и массивы moving_average_arrays; сам data не изменяется,
+    поэтому копировать его перед вызовом не нужно.
+    """
+    data = data.assign(**moving_average_arrays(
+        data, short_period, long_period, rsi_period, atr_period, buy_rsi_threshold, sell_rsi_threshold,
+        ema_short_period, ema_long_period, use_trend_filter, use_rsi_filter, adx_period, use_adx_filter,
+        adx_threshold, atr_threshold, logger))
 
     if debug and logger:
         logger.info("Отладка стратегии:")
@@ -76,4 +108,68 @@ def moving_average_strategy(data: pd.DataFrame, short_period: int, long_period:
                         f"ema_long={row['ema_long']:.2f}{adx_info}, signal={row['signal']}")
         logger.info(f"Сигналы покупки: {(data['signal'] == 1).sum()}, Сигналы продажи: {(data['signal'] == -1).sum()}")
 
-    return data
\ No newline at end of file
+    return data
+
+def last_signal_and_atr(data: pd.DataFrame, strategy_params: dict):
+    """Сигнал и ATR последней свечи данных (расчет live_trading в пуле потоков или процессов)."""
+    result = moving_average_arrays(data, **strategy_params)
+    return int(result['signal'][-1]), float(result['atr'][-1])
+
+def signals_from_indicators(short_ma, long_ma, rsi, ema_short, ema_long, atr, adx, buy_rsi_threshold: float,
+                            sell_rsi_threshold: float, use_trend_filter: bool = True, use_rsi_filter: bool = True,
+                            use_adx_filter: bool = False, adx_threshold: float = 25.0,
+                            atr_threshold: float = 0.0) -> np.ndarray:
+    """Те же правила, что в generate_signals, для массивов NumPy. Возвращает массив сигналов int8."""
+    with np.errstate(invalid='ignore'):
+        trend = ema_short > ema_long if use_trend_filter else np.ones(len(short_ma), dtype=bool)
+        buy_condition = (short_ma > long_ma) & trend & (atr > atr_threshold)
+        sell_condition = (short_ma < long_ma) & (~trend) & (atr > atr_threshold)
+        if use_rsi_filter:
+            buy_condition &= rsi < buy_rsi_threshold
+            sell_condition &= rsi > sell_rsi_threshold
+        if use_adx_filter:
+            buy_condition &= adx > adx_threshold
+            sell_condition &= adx > adx_threshold
+    return np.where(sell_condition, -1, np.where(buy_condition, 1, 0)).astype(np.int8)
+
+class StreamingMovingAverageStrategy:
+    """
+    Потоковая версия moving_average_strategy: данные подаются порциями, состояние индикаторов
+    переносится между ними, и сигналы совпадают с расчётом по всей истории сразу.
+    """
+
+    def __init__(self, short_period: int, long_period: int, rsi_period: int, atr_period: int = 14,
+                 buy_rsi_threshold: float = 45, sell_rsi_threshold: float = 55, ema_short_period: int = 50,
+                 ema_long_period: int = 200, use_trend_filter: bool = True, use_rsi_filter: bool = True,
+                 adx_period: int = 14, use_adx_filter: bool = False, adx_threshold: float = 25.0,
+                 atr_threshold: float = 0.0):
+        self.required_candles = max(long_period, ema_long_period, adx_period if use_adx_filter else 0)
+        self.short_ma = RollingMeanState(short_period)
+        self.long_ma = RollingMeanState(long_period)
+        self.rsi = RSIState(rsi_period)
+        self.atr = ATRState(atr_period)
+        self.ema_short = EMAState(ema_short_period)
+        self.ema_long = EMAState(ema_long_period)
+        self.adx = ADXState(adx_period) if use_adx_filter else None
+        self.signal_params = dict(buy_rsi_threshold=buy_rsi_threshold, sell_rsi_threshold=sell_rsi_threshold,
+                                  use_trend_filter=use_trend_filter, use_rsi_filter=use_rsi_filter,
+                                  use_adx_filter=use_adx_filter, adx_threshold=adx_threshold,
+                                  atr_threshold=atr_threshold)
+
+    def update(self, high: np.ndarray, low: np.ndarray, close: np.ndarray):
+        """
+        Обрабатывает очередную порцию свечей.
+
+        :param high: Массив максимумов.
+        :param low: Массив минимумов.
+        :param close: Массив цен закрытия.
+        :return: Кортеж (signal, atr) для свечей порции.
+        """
+        # Индикаторы считаются в float64 даже для компактного float32-хранилища
+        high, low, close = (np.asarray(a, dtype=np.float64) for a in (high, low, close))
+        atr = self.atr.update(high, low, close)
+        adx = self.adx.update(high, low, close) if self.adx is not None else None
+        signal = signals_from_indicators(self.short_ma.update(close), self.long_ma.update(close),
+                                         self.rsi.update(close), self.ema_short.update(close),
+                                         self.ema_long.update(close), atr, adx, **self.signal_params)
+        return signal, atr
@@ -1,14 +1,14 @@
 
 from datetime import datetime, timedelta
-from cb_grok.adapters.exchange_adapter import ExchangeAdapter
+from cb_grok.adapters.exchange_adapter import get_exchange_adapter
 import logging
 import os
 
 
 
 
-bybit_exchanger = ExchangeAdapter(exchange_name="bybit")
-binance_exchanger = ExchangeAdapter(exchange_name="binance")
+bybit_exchanger = get_exchange_adapter("bybit")
+binance_exchanger = get_exchange_adapter("binance")
 
 
 bybit_data = bybit_exchanger.fetch_ohlcv("BTCUSDT", "1h", limit=10, total_limit=10)
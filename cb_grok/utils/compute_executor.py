@@ -0,0 +1,55 @@
+import asyncio
+import importlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+COMPUTE_KINDS = ("inline", "thread", "process")
+BACKPRESSURE_POLICIES = ("coalesce", "drop")
+
+
+def _init_worker(preload, niceness):
+    if niceness and hasattr(os, "nice"):
+        os.nice(niceness)
+    if preload:
+        importlib.import_module(preload)
+
+
+def create_compute_executor(kind="inline", max_workers=None, preload=None, niceness=0):
+    """
+    Исполнитель для вычисления стратегии вне цикла событий.
+
+    'thread' — пул потоков: цикл событий получает управление, пока идет расчет, но pandas и pandas_ta
+    большую часть времени держат GIL, поэтому расчет нескольких моделей не ускоряется. 'process' — пул
+    процессов: расчет не конкурирует с циклом событий за GIL, буфер свечей передается в процесс сериализацией.
+    Процессы запускаются методом spawn (в родительском процессе работают потоки лога и метрик, с которыми
+    fork небезопасен) и создаются сразу, чтобы первая свеча не ждала запуска интерпретатора; запускающий
+    скрипт должен создавать пул под защитой if __name__ == "__main__".
+
+    :param kind: 'inline' (расчет в цикле событий), 'thread' или 'process'.
+    :param max_workers: Количество потоков или процессов (по умолчанию min(4, число CPU)).
+    :param preload: Модуль, импортируемый в каждом процессе пула при запуске (например, модуль стратегии).
+    :param niceness: Понижение приоритета процессов пула (os.nice), чтобы фоновые расчеты вроде
+                     переоптимизации не отнимали CPU у обработки свечей (только для 'process').
+    :return: Executor или None для 'inline'.
+    """
+    if kind not in COMPUTE_KINDS:
+        raise ValueError(f"Неизвестный исполнитель: {kind}. Используйте {', '.join(COMPUTE_KINDS)}")
+    if kind == "inline":
+        return None
+    max_workers = max_workers or min(4, os.cpu_count() or 1)
+    if kind == "thread":
+        return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="strategy")
+    executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_worker if preload or niceness else None,
+                                   initargs=(preload, niceness) if preload or niceness else ())
+    for future in [executor.submit(os.getpid) for _ in range(max_workers)]:
+        future.result()
+    return executor
+
+
+async def run_compute(executor, function, *args):
+    """Вызывает function(*args) в исполнителе, не блокируя цикл событий; без исполнителя — напрямую."""
+    if executor is None:
+        return function(*args)
+    return await asyncio.get_running_loop().run_in_executor(executor, function, *args)
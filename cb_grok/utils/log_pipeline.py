@@ -0,0 +1,159 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Атрибуты LogRecord, которые не относятся к полям extra; 'sample' управляет SamplingFilter
+_RECORD_ATTRIBUTES = (set(vars(logging.LogRecord("", 0, "", 0, "", (), None)))
+                      | {"message", "asctime", "taskName", "sample"})
+
+# Частота записей в секунду на место вызова по умолчанию (см. SamplingFilter)
+DEFAULT_SAMPLE_RATE = 20.0
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def _json_default(value):
+    # Запись форматируется в фоновом потоке: объект extra к этому моменту может быть недоступен
+    # (например, weakref.proxy соединения websockets)
+    try:
+        return str(value)
+    except Exception:
+        return f"<{type(value).__name__}>"
+
+
+class JsonlFormatter(logging.Formatter):
+    """
+    Запись лога одной строкой JSON: время, уровень, логгер, сообщение и поля extra.
+
+    Поля extra (logger.info("...", extra={"symbol": ..., "decision": ...})) попадают в запись как есть,
+    поэтому лог можно разбирать без регулярных выражений.
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=_json_default)
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    QueueHandler, который не форматирует сообщение в вызывающем потоке.
+
+    Стандартный QueueHandler.prepare подставляет аргументы в сообщение до постановки в очередь; здесь
+    запись передается как есть, и подстановка (record.getMessage) выполняется в фоновом потоке записи.
+    Очередь находится в памяти процесса, поэтому аргументы не сериализуются; изменяемые объекты
+    в аргументах логировать не следует — сообщение увидит их состояние на момент записи.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Ограничение частоты частых сообщений: не более rate записей в секунду на место вызова (логгер, файл,
+    строка) с запасом burst. Записи уровня WARNING и выше и записи с extra={"sample": False} (например,
+    сделки) не отбрасываются. Число отброшенных записей добавляется к следующей пропущенной записи этого
+    места в поле 'sampled_dropped'.
+    """
+
+    def __init__(self, rate=10.0, burst=20, min_level=logging.WARNING):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.min_level = min_level
+        self._buckets = {}
+
+    def filter(self, record):
+        if record.levelno >= self.min_level or getattr(record, "sample", True) is False:
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        tokens, updated, dropped = self._buckets.get(key, (self.burst, now, 0))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now, dropped + 1)
+            return False
+        if dropped:
+            record.sampled_dropped = dropped
+        self._buckets[key] = (tokens - 1, now, 0)
+        return True
+
+
+def setup_logging(filename, level=logging.INFO, sample_rate=None, sample_burst=20, console=False):
+    """
+    Включает асинхронный структурированный лог процесса.
+
+    Корневой логгер получает LazyQueueHandler; запись в файл JSONL (и в консоль при console=True)
+    выполняет QueueListener в фоновом потоке, поэтому вызов logger.info в цикле событий или в целевой функции
+    Optuna стоит одной постановки в очередь и не ждет диска. Повторный вызов возвращает уже запущенный
+    конвейер (например, live_trading, запущенный из main.py, пишет в лог main.py).
+
+    :param filename: Путь к файлу JSONL (папка создается).
+    :param level: Уровень корневого логгера.
+    :param sample_rate: Если задан, сообщения ниже WARNING ограничиваются sample_rate записями в секунду
+                        на место вызова (см. SamplingFilter).
+    :param sample_burst: Запас записей SamplingFilter.
+    :param console: Дублировать записи в stderr в текстовом виде.
+    :return: QueueListener.
+    """
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            return _listener
+        folder = os.path.dirname(filename)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        file_handler = logging.FileHandler(filename, encoding="utf-8")
+        file_handler.setFormatter(JsonlFormatter())
+        handlers = [file_handler]
+        if console:
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+            handlers.append(console_handler)
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = LazyQueueHandler(log_queue)
+        if sample_rate:
+            queue_handler.addFilter(SamplingFilter(sample_rate, sample_burst))
+        root = logging.getLogger()
+        root.addHandler(queue_handler)
+        root.setLevel(level)
+
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        # Остаток очереди дописывается при завершении процесса
+        atexit.register(stop_logging)
+        return _listener
+
+
+def stop_logging():
+    """Останавливает фоновую запись, дописав очередь, и снимает обработчик с корневого логгера."""
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            return
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            if isinstance(handler, LazyQueueHandler):
+                root.removeHandler(handler)
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
@@ -0,0 +1,323 @@
+import math
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Границы корзин гистограмм по умолчанию в секундах
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount=1.0):
+        self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1.0):
+        self.value += amount
+
+    def dec(self, amount=1.0):
+        self.value -= amount
+
+    def set_function(self, function):
+        """Значение вычисляется функцией без аргументов при каждом запросе метрик."""
+        self.function = function
+
+    def get(self):
+        return self.function() if self.function is not None else self.value
+
+
+class _HistogramChild:
+    __slots__ = ("upper_bounds", "counts", "sum", "count")
+
+    def __init__(self, upper_bounds):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self):
+        """Контекстный менеджер: наблюдает длительность блока в секундах."""
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ("child", "start")
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.start)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """
+        Дочерняя метрика для значений меток.
+
+        В горячем пути ссылку на дочернюю метрику стоит сохранить: обновление самой дочерней метрики —
+        одно сложение без блокировок.
+        """
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"Метрика {self.name} ожидает метки {self.labelnames}, получено {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Монотонный счетчик; скорость (например, сообщений в секунду) считается в Prometheus через rate()."""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield self.name, _format_labels(self.labelnames, values), child.value
+
+
+class Gauge(_Metric):
+    """Текущее значение: размер буфера, лучшее значение исследования и т.п."""
+
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            try:
+                value = child.get()
+            except Exception:
+                value = float("nan")
+            if value is not None:
+                yield self.name, _format_labels(self.labelnames, values), value
+
+
+class Histogram(_Metric):
+    """Гистограмма длительностей с фиксированными корзинами (задержка решения, время ордера)."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.upper_bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            counts = list(child.counts)
+            cumulative = 0
+            for upper_bound, count in zip(self.upper_bounds + (float("inf"),), counts):
+                cumulative += count
+                yield (f"{self.name}_bucket",
+                       _format_labels(self.labelnames, values, [("le", _format_value(upper_bound))]), cumulative)
+            yield f"{self.name}_sum", _format_labels(self.labelnames, values), child.sum
+            yield f"{self.name}_count", _format_labels(self.labelnames, values), cumulative
+
+
+class Registry:
+    """Набор метрик процесса, отдаваемый в текстовом формате Prometheus."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, documentation, labelnames, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Метрика {name} уже зарегистрирована с другим типом или метками")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+# Метрики процесса; модули обновляют их напрямую, сервер start_metrics_server только читает
+CANDLES_PROCESSED = REGISTRY.counter("cbgrok_candles_processed_total", "Свечи, обработанные моделью",
+                                     ("symbol", "timeframe"))
+WS_MESSAGES = REGISTRY.counter("cbgrok_ws_messages_total", "Сообщения WebSocket потока свечей", ("symbol",))
+WS_RECONNECTS = REGISTRY.counter("cbgrok_ws_reconnects_total", "Переподключения WebSocket", ("url",))
+WS_OUTAGE = REGISTRY.histogram("cbgrok_ws_outage_seconds", "Время от обрыва WebSocket до возобновления решений",
+                               ("url",), buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 900.0))
+INTRABAR_UPDATES = REGISTRY.counter("cbgrok_intrabar_updates_total",
+                                    "Обновления незакрытых свечей (без запуска стратегии)", ("symbol", "timeframe"))
+DECISION_LATENCY = REGISTRY.histogram("cbgrok_decision_latency_seconds",
+                                      "Время от получения свечи моделью до решения", ("symbol", "timeframe"))
+STRATEGY_COMPUTE = REGISTRY.histogram("cbgrok_strategy_compute_seconds", "Время расчета стратегии по буферу",
+                                      ("symbol", "timeframe"))
+COMPUTE_SKIPPED = REGISTRY.counter("cbgrok_compute_skipped_total",
+                                   "Закрытые свечи без решения из-за отставания расчета стратегии",
+                                   ("symbol", "timeframe", "policy"))
+ORDER_ROUND_TRIP = REGISTRY.histogram("cbgrok_order_round_trip_seconds", "Время запроса create_order к бирже",
+                                      ("exchange", "side"))
+BUFFER_SIZE = REGISTRY.gauge("cbgrok_buffer_candles", "Свечей в буфере модели", ("symbol", "timeframe"))
+OPTUNA_TRIALS = REGISTRY.counter("cbgrok_optuna_trials_total", "Завершенные испытания Optuna", ("study", "state"))
+OPTUNA_TRIAL_DURATION = REGISTRY.histogram("cbgrok_optuna_trial_duration_seconds", "Длительность испытания Optuna",
+                                           ("study",), buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+OPTUNA_BEST_VALUE = REGISTRY.gauge("cbgrok_optuna_best_value", "Лучшее значение исследования", ("study",))
+REOPTIMIZATIONS = REGISTRY.counter("cbgrok_reoptimizations_total",
+                                  "Фоновые переоптимизации модели (result: swapped, kept или failed)",
+                                  ("symbol", "timeframe", "result"))
+REOPTIMIZE_DURATION = REGISTRY.histogram("cbgrok_reoptimize_duration_seconds", "Длительность фоновой переоптимизации",
+                                         ("symbol", "timeframe"), buckets=(1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0,
+                                                                           600.0, 1800.0))
+CACHE_REQUESTS = REGISTRY.counter("cbgrok_cache_requests_total", "Обращения к кэшам (result: hit или miss)",
+                                  ("cache", "result"))
+CACHE_HIT_RATIO = REGISTRY.gauge("cbgrok_cache_hit_ratio", "Доля попаданий в кэш", ("cache",))
+
+
+def record_cache(cache, hit):
+    """Учитывает обращение к кэшу и регистрирует долю попаданий для него."""
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+    if (str(cache),) not in CACHE_HIT_RATIO._children:
+        hits, misses = CACHE_REQUESTS.labels(cache, "hit"), CACHE_REQUESTS.labels(cache, "miss")
+        CACHE_HIT_RATIO.labels(cache).set_function(
+            lambda: hits.value / (hits.value + misses.value) if hits.value + misses.value else float("nan"))
+
+
+class OptunaMetricsCallback:
+    """
+    Callback study.optimize: счетчик испытаний по состояниям, длительность испытания и лучшее значение.
+
+    Испытаний в секунду — rate(cbgrok_optuna_trials_total[1m]).
+    """
+
+    def __init__(self, study_name):
+        self.study_name = study_name
+        self._duration = OPTUNA_TRIAL_DURATION.labels(study_name)
+        self._best_value = OPTUNA_BEST_VALUE.labels(study_name)
+
+    def __call__(self, study, trial):
+        OPTUNA_TRIALS.labels(self.study_name, trial.state.name.lower()).inc()
+        if trial.datetime_start is not None and trial.datetime_complete is not None:
+            self._duration.observe((trial.datetime_complete - trial.datetime_start).total_seconds())
+        try:
+            self._best_value.set(study.best_value)
+        except ValueError:
+            # Еще нет ни одного завершенного испытания
+            pass
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, address="0.0.0.0", registry=REGISTRY):
+    """
+    Запускает HTTP-сервер метрик (GET /metrics) в фоновом потоке.
+
+    Сервер только читает значения метрик при запросе, поэтому не влияет на цикл обработки свечей.
+
+    :param port: Порт (0 — свободный порт).
+    :param address: Адрес прослушивания.
+    :param registry: Набор метрик.
+    :return: Объект сервера (server.server_port — фактический порт, server.shutdown() — остановка).
+    """
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((address, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    return server
@@ -4,13 +4,15 @@ from telegram.request import HTTPXRequest  # Используем правиль
 
 class TelegramBot:
     def __init__(self, token, chat_id, timeout=20):
-        # Используем HTTPXRequest для настройки тайм-аута
-        self.bot = telegram.Bot(token=token, request=HTTPXRequest(read_timeout=timeout))
+        # Используем HTTPXRequest для настройки тайм-аута; без токена сообщения не отправляются
+        self.bot = telegram.Bot(token=token, request=HTTPXRequest(read_timeout=timeout)) if token else None
         self.chat_id = chat_id
         self.logger = logging.getLogger(__name__)
 
     async def send_message(self, message):
         """Отправка сообщения в Telegram с обработкой исключений."""
+        if self.bot is None:
+            return
         try:
             await self.bot.send_message(chat_id=self.chat_id, text=message)
         except telegram.error.TimedOut:
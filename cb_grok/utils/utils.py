@@ -3,7 +3,8 @@ import os
 from datetime import datetime
 import hashlib
 
-def save_model_results(model_params, final_capital, orders, symbol, initial_capital, folder="order_bin"):
+def save_model_results(model_params, final_capital, orders, symbol, initial_capital, folder="order_bin",
+                       timeframe=None):
     """
     Сохраняет результаты модели в JSON-файл с меткой POS_ или NEG_, хэшем параметров и временной меткой.
 
@@ -13,6 +14,7 @@ def save_model_results(model_params, final_capital, orders, symbol, initial_capi
     :param symbol: Символ валютной пары (например, 'BTC/USDT').
     :param initial_capital: Начальный капитал для сравнения.
     :param folder: Папка для сохранения файлов (по умолчанию 'order_bin').
+    :param timeframe: Таймфрейм бэктеста (по нему warm_start.load_history отбирает результаты).
     """
     # Создаём папку, если её нет
     if not os.path.exists(folder):
@@ -39,11 +41,32 @@ def save_model_results(model_params, final_capital, orders, symbol, initial_capi
         "model_params": model_params,
         "final_capital": final_capital,
         "orders": orders,
-        "symbol": symbol
+        "symbol": symbol,
+        "timeframe": timeframe
     }
 
     # Записываем данные в JSON-файл
     with open(filename, 'w') as f:
         json.dump(data, f, indent=4)
 
-    print(f"Результаты сохранены в {filename}")
\ No newline at end of file
+    print(f"Результаты сохранены в {filename}")
+
+# Длительность единицы таймфрейма в минутах (формат ccxt: 1m, 5m, 1h, 4h, 1d, 1w)
+TIMEFRAME_UNITS = {'m': 1, 'h': 60, 'd': 1440, 'w': 10080}
+
+def timeframe_to_minutes(timeframe):
+    """
+    Преобразует таймфрейм в формате ccxt (например, '15m', '4h', '1d') в минуты.
+
+    :param timeframe: Строка таймфрейма.
+    :return: Количество минут в одной свече.
+    """
+    unit = timeframe[-1:]
+    amount = timeframe[:-1]
+    if unit not in TIMEFRAME_UNITS or not amount.isdigit() or int(amount) <= 0:
+        raise ValueError(f"Неподдерживаемый таймфрейм: {timeframe}")
+    return int(amount) * TIMEFRAME_UNITS[unit]
+
+def timeframe_to_milliseconds(timeframe):
+    """Преобразует таймфрейм в миллисекунды."""
+    return timeframe_to_minutes(timeframe) * 60 * 1000